@@ -2,26 +2,27 @@ from __future__ import annotations
 
 import argparse
 import sys
-import time
 from pathlib import Path
 from typing import List
 
 from colorama import Fore, Style
-from tqdm import tqdm
 
+from pmbrief.archive import archive_brief, get_archive
 from pmbrief.config import (
+	configure_logging,
 	ensure_dirs,
-	get_env_str,
 	get_generation_settings,
+	get_rag_retention_settings,
 	load_env,
 )
 from pmbrief.db import init_db, load_profile, save_feedback, save_profile, get_engine
-from pmbrief.news_fetcher import fetch_news
+from pmbrief.pipeline import BriefError, prepare_brief
 from pmbrief.playback import play_audio
-from pmbrief.rag_store import RAGStore
+from pmbrief.rag_store import RAGStore, SharedRAGStore, stored_summary_ids
+from pmbrief.scheduler import BriefScheduler
 from pmbrief.summarizer import extract_section_titles, generate_brief
 from pmbrief.tts_engine import synthesize_to_mp3
-from pmbrief.utils import parse_interests, timestamp_string, write_text
+from pmbrief.utils import brief_stem, parse_interests, timestamp_string, write_text
 
 
 def onboard_interests(auto: bool) -> List[str]:
@@ -59,25 +60,21 @@ def run_once(auto: bool, no_play: bool) -> None:
 		print(f"{Fore.RED}No interests provided. Exiting.{Style.RESET_ALL}")
 		return
 
-	# Fetch news
-	print(f"{Fore.GREEN}Fetching recent news...{Style.RESET_ALL}")
-	articles = fetch_news(
-		interests=interests,
-		hours=settings["lookback_hours"],
-		max_articles=settings["max_articles"],
-	)
-	if not articles:
-		print(f"{Fore.YELLOW}No recent articles found; expanding window to 48h...{Style.RESET_ALL}")
-		articles = fetch_news(interests=interests, hours=48, max_articles=settings["max_articles"])
-	if not articles:
-		print(f"{Fore.RED}Still no articles found. Try adjusting interests or API key limits.{Style.RESET_ALL}")
-		return
-
-	# RAG load and retrieve
+	# Fetch, rank and retrieve RAG context
 	vs = RAGStore(Path(dirs["vector_dir"]))
 	vs.load()
-	rag_docs = vs.retrieve(", ".join(interests), k=6)
-	rag_context = "\n".join([d.page_content for d in rag_docs])
+
+	def progress(stage: str) -> None:
+		if stage == "fetch":
+			print(f"{Fore.GREEN}Fetching recent news...{Style.RESET_ALL}")
+		elif stage == "rank":
+			print(f"{Fore.GREEN}Selecting the most relevant articles...{Style.RESET_ALL}")
+
+	try:
+		articles, rag_context = prepare_brief(interests, vs, progress)
+	except BriefError:
+		print(f"{Fore.RED}No articles found. Try adjusting interests or API key limits.{Style.RESET_ALL}")
+		return
 
 	# Generate brief with Gemini
 	print(f"{Fore.GREEN}Generating your morning brief with Gemini...{Style.RESET_ALL}")
@@ -93,15 +90,16 @@ def run_once(auto: bool, no_play: bool) -> None:
 
 	# Persist: save text, add to vector store
 	ts = timestamp_string()
-	txt_path = Path(dirs["summaries_dir"]) / f"brief_{ts}.txt"
+	txt_path = Path(dirs["summaries_dir"]) / f"{brief_stem(ts, summary_id)}.txt"
 	write_text(txt_path, summary_text)
 	vs.add_texts([summary_text], metadatas=[{"type": "summary", "summary_id": summary_id, "timestamp": ts}])
 	vs.save()
 
 	# TTS
 	print(f"{Fore.GREEN}Synthesizing audio...{Style.RESET_ALL}")
-	mp3_path = Path(dirs["summaries_dir"]) / f"brief_{ts}.mp3"
+	mp3_path = Path(dirs["summaries_dir"]) / f"{brief_stem(ts, summary_id)}.mp3"
 	synthesize_to_mp3(summary_text, mp3_path)
+	archive_brief(summary_id, summary_text, ts, sections=extract_section_titles(summary_text), audio_file=mp3_path.name)
 	print(f"{Fore.CYAN}Saved audio:{Style.RESET_ALL} {mp3_path}")
 
 	# Playback
@@ -129,7 +127,8 @@ def run_once(auto: bool, no_play: bool) -> None:
 	if dislikes:
 		feedback_docs.append(f"USER_FEEDBACK_DISLIKES: {dislikes}")
 	if feedback_docs:
-		vs.add_texts(feedback_docs, metadatas=[{"type": "feedback", "summary_id": summary_id}] * len(feedback_docs))
+		metadata = {"type": "feedback", "summary_id": summary_id, "timestamp": timestamp_string()}
+		vs.add_texts(feedback_docs, metadatas=[metadata] * len(feedback_docs))
 		vs.save()
 
 	# Optionally adjust interests (simple heuristic)
@@ -144,24 +143,122 @@ def run_once(auto: bool, no_play: bool) -> None:
 	print(f"{Fore.GREEN}Done.{Style.RESET_ALL}")
 
 
+def _print_report(report: dict) -> None:
+	print(
+		f"{Fore.GREEN}Batch done:{Style.RESET_ALL} {report['profiles']} profile(s), "
+		f"{report['distinct_queries']} distinct queries; "
+		f"on time {report['on_time']}, late {report['late']}, failed {report['failed']}"
+	)
+	for entry in report["results"]:
+		if entry["status"] == "failed":
+			print(f"{Fore.RED}  profile {entry['profile_id']}: {entry.get('error')}{Style.RESET_ALL}")
+	totals = report["totals"]
+	print(
+		f"{Fore.CYAN}Totals:{Style.RESET_ALL} on time {totals['on_time']}, "
+		f"late {totals['late']}, failed {totals['failed']}"
+	)
+
+
+def run_scheduler() -> None:
+	load_env()
+	dirs = ensure_dirs()
+	init_db(get_engine())
+	store = SharedRAGStore(Path(dirs["vector_dir"]))
+	store.start()
+	scheduler = BriefScheduler(store)
+	print(f"{Fore.GREEN}Scheduler started; waiting for the next delivery window...{Style.RESET_ALL}")
+	try:
+		scheduler.run_forever(on_report=_print_report)
+	except KeyboardInterrupt:
+		print("\nExiting loop.")
+	finally:
+		store.close()
+	sys.exit(0)
+
+
+def run_compaction() -> None:
+	load_env()
+	dirs = ensure_dirs()
+	settings = get_rag_retention_settings()
+	store = RAGStore(Path(dirs["vector_dir"]))
+	report = store.compact(
+		settings["retention_days"],
+		settings["hot_days"],
+		rollup_feedback=settings["rollup_feedback"],
+	)
+	print(
+		f"{Fore.GREEN}Compacted vector store:{Style.RESET_ALL} "
+		f"{report['moved_to_cold']} moved to cold, {report['dropped']} dropped, "
+		f"{report['rolled_up']} feedback rolled up"
+	)
+	for tier in ("hot", "cold"):
+		before, after = report["before"][tier], report["after"][tier]
+		print(
+			f"{Fore.CYAN}{tier}:{Style.RESET_ALL} "
+			f"docs {before['documents']} -> {after['documents']}, "
+			f"vectors {before['vectors']} -> {after['vectors']} (orphans {before['orphans']} -> {after['orphans']}), "
+			f"{before['bytes'] / 1024:.1f} KiB -> {after['bytes'] / 1024:.1f} KiB"
+		)
+
+
+def run_archive_import(remove: bool) -> None:
+	load_env()
+	dirs = ensure_dirs()
+	archive = get_archive()
+	if archive is None:
+		print(f"{Fore.RED}The brief archive is disabled (ARCHIVE_ENABLED).{Style.RESET_ALL}")
+		return
+	report = archive.import_loose(
+		Path(dirs["summaries_dir"]),
+		stored_summary_ids(Path(dirs["vector_dir"])),
+		remove=remove,
+	)
+	stats = archive.stats()
+	print(
+		f"{Fore.GREEN}Imported loose briefs:{Style.RESET_ALL} "
+		f"{report['imported']} imported, {report['skipped']} already archived, {report['removed']} text files removed"
+	)
+	print(
+		f"{Fore.CYAN}archive:{Style.RESET_ALL} "
+		f"{stats['entries']} briefs in {stats['packs']} packs, "
+		f"{stats['chars'] / 1024:.1f} KiB text -> {stats['pack_bytes'] / 1024:.1f} KiB"
+	)
+
+
 def main():
 	parser = argparse.ArgumentParser(prog="Personalized Morning Brief")
 	parser.add_argument("--auto", action="store_true", help="Non-interactive; use saved interests.")
 	parser.add_argument("--no-play", action="store_true", help="Skip audio playback.")
 	parser.add_argument(
-		"--loop", action="store_true", help="Run daily (simple 24h loop)."
+		"--loop",
+		action="store_true",
+		help="Run the scheduler: generate every saved profile's brief ahead of its delivery time.",
+	)
+	parser.add_argument(
+		"--compact",
+		action="store_true",
+		help="Compact the vector store (tier, expire and roll up old documents) and exit.",
+	)
+	parser.add_argument(
+		"--import-archive",
+		action="store_true",
+		help="Import loose brief_*.txt files from the summaries directory into the brief archive and exit.",
+	)
+	parser.add_argument(
+		"--remove-loose",
+		action="store_true",
+		help="With --import-archive, delete each text file once it is archived.",
 	)
 	args = parser.parse_args()
+	load_env()
+	configure_logging()
 
-	if args.loop:
-		while True:
-			try:
-				run_once(auto=args.auto, no_play=args.no_play)
-			except KeyboardInterrupt:
-				print("\nExiting loop.")
-				sys.exit(0)
-			# Sleep ~24 hours
-			time.sleep(24 * 60 * 60)
+	if args.import_archive:
+		run_archive_import(remove=args.remove_loose)
+	elif args.compact:
+		run_compaction()
+	elif args.loop:
+		run_scheduler()
 	else:
 		run_once(auto=args.auto, no_play=args.no_play)
 
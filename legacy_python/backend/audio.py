@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import os
+from email.utils import formatdate
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+from pmbrief.config import ensure_dirs, get_audio_delivery_settings
+
+
+router = APIRouter()
+
+CHUNK_BYTES = 64 * 1024
+MEDIA_TYPES = {
+	".mp3": "audio/mpeg",
+	".m3u8": "application/vnd.apple.mpegurl",
+	".json": "application/json",
+	".txt": "text/plain; charset=utf-8",
+}
+# rewritten while a brief is being voiced, so always revalidated
+MUTABLE_SUFFIXES = (".m3u8", ".json")
+
+
+def _resolve(path: str) -> Path:
+	root = Path(ensure_dirs()["summaries_dir"]).resolve()
+	target = (root / path).resolve()
+	# no escaping the summaries dir, and no half-written files
+	if root not in target.parents or target.name.endswith(".tmp") or not target.is_file():
+		raise HTTPException(status_code=404, detail="Not found")
+	return target
+
+
+def _etag(stat: os.stat_result) -> str:
+	# files are replaced (os.replace / hardlinks), never edited in place
+	return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+	"""
+	If-None-Match semantics: weak comparison against a list of tags or `*`.
+	"""
+	if header.strip() == "*":
+		return True
+	tags = (t.strip() for t in header.split(","))
+	return etag in (t[2:] if t.startswith("W/") else t for t in tags)
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+	"""
+	(first, last) byte of a single `bytes=` range, clamped to the file.
+	None means serve the whole file: no usable range, or one this endpoint
+	ignores, such as a multi-range request. Raises ValueError if the range
+	cannot be satisfied.
+	"""
+	unit, _, spec = header.partition("=")
+	if unit.strip().lower() != "bytes" or "," in spec:
+		return None
+	first, sep, last = (part.strip() for part in spec.partition("-"))
+	if not sep or not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+		# malformed ranges are ignored, not rejected
+		return None
+	if not first:
+		# suffix range: the final `last` bytes
+		if int(last) == 0 or size == 0:
+			raise ValueError("empty suffix range")
+		return max(0, size - int(last)), size - 1
+	start = int(first)
+	if start >= size:
+		raise ValueError("range starts past the end")
+	end = int(last) if last else size - 1
+	if start > end:
+		return None
+	return start, min(end, size - 1)
+
+
+def _read(path: Path, start: int, length: int) -> Iterator[bytes]:
+	with path.open("rb") as f:
+		f.seek(start)
+		while length > 0:
+			data = f.read(min(CHUNK_BYTES, length))
+			if not data:
+				break
+			length -= len(data)
+			yield data
+
+
+@router.api_route("/audio/{path:path}", methods=["GET", "HEAD"])
+def serve_audio(path: str, request: Request):
+	"""
+	Brief audio, chunk parts, HLS playlists and manifests from SUMMARIES_DIR.
+	Supports single byte ranges (Range / If-Range) so players can start
+	and seek without downloading the whole file, and ETag revalidation
+	(If-None-Match) so unchanged files are not sent again.
+	"""
+	target = _resolve(path)
+	stat = target.stat()
+	size = stat.st_size
+	etag = _etag(stat)
+	last_modified = formatdate(stat.st_mtime, usegmt=True)
+	mutable = target.suffix in MUTABLE_SUFFIXES
+	headers = {
+		"ETag": etag,
+		"Last-Modified": last_modified,
+		"Accept-Ranges": "bytes",
+		"Cache-Control": "no-cache" if mutable else f"public, max-age={get_audio_delivery_settings()['max_age']}",
+	}
+
+	if_none_match = request.headers.get("if-none-match")
+	if if_none_match and _etag_matches(if_none_match, etag):
+		return Response(status_code=304, headers=headers)
+
+	byte_range = None
+	range_header = request.headers.get("range")
+	if_range = request.headers.get("if-range")
+	# If-Range: only honour the range if the client's copy is still current
+	if range_header and (not if_range or if_range.strip() in (etag, last_modified)):
+		try:
+			byte_range = _parse_range(range_header, size)
+		except ValueError:
+			return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+	status = 200
+	start, length = 0, size
+	if byte_range is not None:
+		start, end = byte_range
+		length = end - start + 1
+		status = 206
+		headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+	headers["Content-Length"] = str(length)
+	media_type = MEDIA_TYPES.get(target.suffix, "application/octet-stream")
+
+	if request.method == "HEAD":
+		return Response(status_code=status, headers=headers, media_type=media_type)
+	return StreamingResponse(_read(target, start, length), status_code=status, headers=headers, media_type=media_type)
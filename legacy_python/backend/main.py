@@ -1,26 +1,51 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional
+from typing import AsyncIterator, Deque, List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
-from pmbrief.config import ensure_dirs, get_generation_settings, load_env
+from pmbrief.config import (
+	configure_logging,
+	ensure_dirs,
+	get_feedback_settings,
+	get_generation_settings,
+	get_job_settings,
+	get_tts_settings,
+	load_env,
+)
 from pmbrief.db import (
+	dispose_engine,
 	get_engine,
 	init_db,
 	load_profile,
+	pool_stats,
 	save_feedback,
 	save_profile,
 )
-from pmbrief.news_fetcher import fetch_news
-from pmbrief.rag_store import RAGStore
-from pmbrief.summarizer import extract_section_titles, generate_brief
-from pmbrief.tts_engine import synthesize_to_mp3
-from pmbrief.utils import timestamp_string, write_text
+from pmbrief import metrics
+from pmbrief.archive import archive_brief, get_archive
+from pmbrief.feedback_log import FeedbackIngestor, FeedbackLog
+from pmbrief.http_clients import aclose_clients
+from pmbrief.rag_store import SharedRAGStore
+from pmbrief.jobs import JobQueue, MemoryJobStore, QueueFull, SQLiteJobStore
+from pmbrief.pipeline import BriefError, aprepare_brief, arun_brief_pipeline, run_brief_pipeline
+from pmbrief.summarizer import astream_brief, extract_section_titles
+from pmbrief.tts_engine import SpeechSegmenter, concat_mp3, playlist_path_for, synthesize_to_mp3, write_playlist
+from pmbrief.utils import brief_stem, timestamp_string, write_text
+
+from backend.audio import router as audio_router
 
 
 class ProfileIn(BaseModel):
@@ -48,16 +73,139 @@ app.add_middleware(
 	allow_methods=["*"],
 	allow_headers=["*"],
 )
+# Generated audio (and playlists/manifests) under /audio, with Range and ETag support
+app.include_router(audio_router)
+
+
+@app.middleware("http")
+async def _stage_timings(request: Request, call_next):
+	"""
+	Time each request and report its pipeline stages in a Server-Timing
+	header (e.g. `fetch;dur=412.0, generate;dur=2210.5`).
+	"""
+	start = time.perf_counter()
+	with metrics.trace() as breakdown:
+		response = await call_next(request)
+	route = getattr(request.scope.get("route"), "path", "other")
+	metrics.HTTP_SECONDS.observe(time.perf_counter() - start, request.method, route, str(response.status_code))
+	if breakdown:
+		response.headers["Server-Timing"] = metrics.format_breakdown(breakdown)
+	return response
+
+
+_rag_lock = threading.Lock()
+_rag: Optional[SharedRAGStore] = None
+
+
+def _rag_samples(field: str):
+	def collect():
+		with _rag_lock:
+			store = _rag
+		return [(("hot",), store.stats()[field])] if store is not None else []
+
+	return collect
+
+
+def get_rag() -> SharedRAGStore:
+	"""
+	The process-wide vector store, loaded once and kept warm between requests.
+	"""
+	global _rag
+	with _rag_lock:
+		if _rag is None:
+			dirs = ensure_dirs()
+			store = SharedRAGStore(Path(dirs["vector_dir"]))
+			store.start()
+			_rag = store
+			metrics.register_gauge(
+				"pmbrief_rag_documents", "Documents in the vector store.", ("tier",), _rag_samples("documents")
+			)
+			metrics.register_gauge(
+				"pmbrief_rag_vectors", "Vectors in the FAISS index.", ("tier",), _rag_samples("vectors")
+			)
+			metrics.register_gauge("pmbrief_rag_bytes", "Vector store size on disk.", ("tier",), _rag_samples("bytes"))
+		return _rag
+
+
+def _warm_rag() -> None:
+	try:
+		get_rag()
+	except Exception:
+		# e.g. GEMINI_API_KEY missing; retried on first request that needs it
+		pass
+
+
+_feedback_lock = threading.Lock()
+_feedback: Optional[FeedbackIngestor] = None
+
+
+def get_feedback() -> FeedbackIngestor:
+	"""
+	The feedback log and its background flusher; starting it replays any
+	entries a previous run logged but did not apply.
+	"""
+	global _feedback
+	with _feedback_lock:
+		if _feedback is None:
+			settings = get_feedback_settings()
+			log = FeedbackLog(Path(ensure_dirs()["data_dir"]) / "feedback.wal")
+			ingestor = FeedbackIngestor(
+				log,
+				get_rag,
+				save_feedback,
+				batch_size=settings["batch_size"],
+				max_delay=settings["max_delay"],
+				max_attempts=settings["max_attempts"],
+			)
+			ingestor.start()
+			_feedback = ingestor
+			metrics.register_gauge(
+				"pmbrief_feedback_pending", "Logged feedback not yet indexed.", (), lambda: [((), log.pending_count)]
+			)
+		return _feedback
 
 
 @app.on_event("startup")
 def _startup() -> None:
 	load_env()
-	dirs = ensure_dirs()
+	configure_logging()
+	ensure_dirs()
 	engine = get_engine()
 	init_db(engine)
-	# Serve generated audio files
-	app.mount("/audio", StaticFiles(directory=str(dirs["summaries_dir"])), name="audio")
+	# Loading the store (faiss, langchain, the index itself) is the slow part of
+	# startup; warm it in the background so /health answers at once. Requests
+	# that need it wait on get_rag's lock.
+	threading.Thread(target=_warm_rag, name="rag-warmup", daemon=True).start()
+	get_jobs()
+	get_feedback()
+
+
+@app.on_event("shutdown")
+def _shutdown() -> None:
+	global _rag, _tts_pool, _jobs, _feedback
+	with _jobs_lock:
+		if _jobs is not None:
+			_jobs.stop()
+			_jobs = None
+	with _feedback_lock:
+		if _feedback is not None:
+			# applies what it can before the store closes; the rest stays logged
+			_feedback.close()
+			_feedback = None
+	with _rag_lock:
+		if _rag is not None:
+			_rag.close()
+			_rag = None
+	with _tts_pool_lock:
+		if _tts_pool is not None:
+			_tts_pool.shutdown(wait=False, cancel_futures=True)
+			_tts_pool = None
+	dispose_engine()
+
+
+@app.on_event("shutdown")
+async def _close_http_clients() -> None:
+	await aclose_clients()
 
 
 @app.get("/health")
@@ -65,6 +213,20 @@ def health():
 	return {"ok": True}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+	"""
+	Stage latency histograms, external call counts, cache hit rates and
+	index size in the Prometheus text format.
+	"""
+	return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/stats/db")
+def db_stats():
+	return pool_stats()
+
+
 @app.get("/profile")
 def get_profile():
 	return load_profile()
@@ -76,83 +238,281 @@ def set_profile(body: ProfileIn):
 	return load_profile()
 
 
-@app.post("/brief/generate")
-def generate(body: GenerateIn):
-	load_env()
-	dirs = ensure_dirs()
-	settings = get_generation_settings()
-
+def _resolve_interests(body: GenerateIn) -> List[str]:
 	profile = load_profile()
 	interests = body.interests if body.interests is not None else profile.get("interests", [])
 	if not interests:
 		raise HTTPException(status_code=400, detail="No interests provided or saved.")
+	return interests
 
-	articles = fetch_news(
-		interests=interests,
-		hours=settings["lookback_hours"],
-		max_articles=settings["max_articles"],
-	)
-	if not articles:
-		articles = fetch_news(interests=interests, hours=48, max_articles=settings["max_articles"])
-	if not articles:
-		raise HTTPException(status_code=404, detail="No recent articles found.")
-
-	vs = RAGStore(Path(dirs["vector_dir"]))
-	vs.load()
-	rag_docs = vs.retrieve(", ".join(interests), k=6)
-	rag_context = "\n".join([d.page_content for d in rag_docs])
-
-	summary_text, summary_id = generate_brief(
-		articles=articles,
-		interests=interests,
-		rag_context=rag_context,
-		target_words=settings["brief_target_words"],
-	)
-	if not summary_text:
-		raise HTTPException(status_code=500, detail="Summary generation failed.")
 
+@app.post("/brief/generate")
+async def generate(body: GenerateIn):
+	"""
+	Runs on the event loop: while a brief waits on NewsAPI, Gemini or TTS,
+	the worker serves other requests instead of holding a pool thread.
+	"""
+	load_env()
+	interests = await asyncio.to_thread(_resolve_interests, body)
+	vs = await asyncio.to_thread(get_rag)
+	try:
+		return await arun_brief_pipeline(interests, vs, no_audio=body.no_audio)
+	except BriefError as exc:
+		raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+
+
+_jobs_lock = threading.Lock()
+_jobs: Optional[JobQueue] = None
+
+
+def _run_job(payload: dict, progress) -> dict:
+	with metrics.trace() as breakdown:
+		result = run_brief_pipeline(payload["interests"], get_rag(), no_audio=payload["no_audio"], progress=progress)
+	# no response headers for polled jobs: keep the breakdown with the result
+	result["timings_ms"] = {stage: round(seconds * 1000, 1) for stage, seconds in breakdown.items()}
+	return result
+
+
+def get_jobs() -> JobQueue:
+	global _jobs
+	with _jobs_lock:
+		if _jobs is None:
+			settings = get_job_settings()
+			if settings["store"] == "sqlite":
+				store = SQLiteJobStore(Path(ensure_dirs()["data_dir"]) / "jobs.sqlite3")
+			else:
+				store = MemoryJobStore()
+			queue = JobQueue(
+				_run_job,
+				store,
+				workers=settings["workers"],
+				max_depth=settings["max_depth"],
+				timeout=settings["timeout"],
+				result_ttl=settings["result_ttl"],
+			)
+			queue.start()
+			_jobs = queue
+			metrics.register_gauge("pmbrief_job_queue_depth", "Queued and running brief jobs.", (), lambda: [((), queue.depth())])
+		return _jobs
+
+
+@app.post("/brief/jobs", status_code=202)
+def submit_job(body: GenerateIn):
+	"""
+	Queue a brief for background generation; poll GET /brief/jobs/{job_id}.
+	"""
+	load_env()
+	interests = _resolve_interests(body)
+	try:
+		job = get_jobs().submit({"interests": interests, "no_audio": body.no_audio})
+	except QueueFull as exc:
+		raise HTTPException(status_code=503, detail=str(exc))
+	return {"job_id": job.id, "status": job.status, "queue_depth": get_jobs().depth()}
+
+
+@app.get("/brief/jobs/{job_id}")
+def get_job(job_id: str):
+	job = get_jobs().get(job_id)
+	if job is None:
+		raise HTTPException(status_code=404, detail="Unknown job.")
+	return job.to_dict()
+
+
+_tts_pool_lock = threading.Lock()
+_tts_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _get_tts_pool() -> ThreadPoolExecutor:
+	global _tts_pool
+	with _tts_pool_lock:
+		if _tts_pool is None:
+			_tts_pool = ThreadPoolExecutor(max_workers=get_tts_settings()["workers"], thread_name_prefix="tts")
+		return _tts_pool
+
+
+def _sse(event: str, data: dict) -> str:
+	return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/brief/stream")
+async def generate_stream(body: GenerateIn):
+	"""
+	Server-Sent Events variant of /brief/generate. Emits `meta`, then `text`
+	deltas as Gemini writes, `audio` events (in playback order) as each
+	section or sentence group finishes synthesizing, and finally `done`.
+	"""
+	load_env()
+	dirs = ensure_dirs()
+	settings = get_generation_settings()
+	tts_settings = get_tts_settings()
+
+	interests = await asyncio.to_thread(_resolve_interests, body)
+	vs = await asyncio.to_thread(get_rag)
+	try:
+		articles, rag_context = await aprepare_brief(interests, vs)
+	except BriefError as exc:
+		raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+	summaries_dir = Path(dirs["summaries_dir"])
+	summary_id = uuid.uuid4().hex
 	ts = timestamp_string()
-	txt_path = Path(dirs["summaries_dir"]) / f"brief_{ts}.txt"
-	write_text(txt_path, summary_text)
-	vs.add_texts(
-		[summary_text],
-		metadatas=[{"type": "summary", "summary_id": summary_id, "timestamp": ts}],
+
+	async def events() -> AsyncIterator[str]:
+		loop = asyncio.get_running_loop()
+		pool = _get_tts_pool()
+		segmenter = SpeechSegmenter(tts_settings["segment_min_chars"], tts_settings["segment_max_chars"])
+		pending: Deque[Tuple[int, str, "asyncio.Future[Path]"]] = deque()
+		audio_urls: List[str] = []
+		parts: List[str] = []
+		stem = brief_stem(ts, summary_id)
+		mp3_path = summaries_dir / f"{stem}.mp3"
+		playlist_url: Optional[str] = None
+
+		def part_paths() -> List[Path]:
+			return [summaries_dir / u.rsplit("/", 1)[-1] for u in audio_urls]
+
+		def submit(segments: List[str]) -> None:
+			if body.no_audio:
+				return
+			for segment in segments:
+				index = len(pending) + len(audio_urls)
+				filename = f"{stem}_part{index:03d}.mp3"
+				# one playlist for the whole brief (below), not one per part
+				fut = loop.run_in_executor(
+					pool, functools.partial(synthesize_to_mp3, segment, summaries_dir / filename, playlist=False)
+				)
+				pending.append((index, filename, fut))
+
+		async def ready(block: bool) -> AsyncIterator[str]:
+			# audio is announced strictly in order so clients can queue it as-is
+			while pending and (block or pending[0][2].done()):
+				index, filename, fut = pending.popleft()
+				await fut
+				url = f"/audio/{filename}"
+				audio_urls.append(url)
+				if playlist_url is not None:
+					await asyncio.to_thread(write_playlist, mp3_path, part_paths(), False)
+				yield _sse("audio", {"index": index, "url": url})
+
+		if tts_settings["hls"] and not body.no_audio:
+			# announced up front (empty until the first part is voiced) so HLS
+			# players can start on it while the brief is still being written
+			await asyncio.to_thread(write_playlist, mp3_path, [], False)
+			playlist_url = f"/audio/{playlist_path_for(mp3_path).name}"
+		yield _sse("meta", {"summary_id": summary_id, "articles_used": articles, "playlist_url": playlist_url})
+		try:
+			async for delta in astream_brief(
+				articles=articles,
+				interests=interests,
+				rag_context=rag_context,
+				target_words=settings["brief_target_words"],
+			):
+				parts.append(delta)
+				yield _sse("text", {"delta": delta})
+				submit(segmenter.feed(delta))
+				async for event in ready(block=False):
+					yield event
+			submit(segmenter.flush())
+			async for event in ready(block=True):
+				yield event
+		except Exception as exc:
+			for _, _, fut in pending:
+				fut.cancel()
+			if playlist_url is not None:
+				# end the playlist so players stop polling for more
+				await asyncio.to_thread(write_playlist, mp3_path, part_paths(), True)
+			yield _sse("error", {"detail": str(exc)})
+			return
+
+		summary_text = "".join(parts).strip()
+		if not summary_text:
+			if playlist_url is not None:
+				await asyncio.to_thread(write_playlist, mp3_path, [], True)
+			yield _sse("error", {"detail": "Summary generation failed."})
+			return
+		await asyncio.to_thread(write_text, summaries_dir / f"{stem}.txt", summary_text)
+		audio_url = None
+		if audio_urls:
+			await asyncio.to_thread(concat_mp3, part_paths(), mp3_path)
+			audio_url = f"/audio/{mp3_path.name}"
+		if playlist_url is not None:
+			await asyncio.to_thread(write_playlist, mp3_path, part_paths(), True)
+		await vs.aadd_texts(
+			[summary_text],
+			metadatas=[{"type": "summary", "summary_id": summary_id, "timestamp": ts}],
+		)
+		sections = extract_section_titles(summary_text)
+		await asyncio.to_thread(
+			archive_brief,
+			summary_id,
+			summary_text,
+			ts,
+			sections=sections,
+			audio_file=mp3_path.name if audio_url else None,
+			source="stream",
+		)
+		yield _sse(
+			"done",
+			{
+				"summary_id": summary_id,
+				"text": summary_text,
+				"sections": sections,
+				"audio_url": audio_url,
+				"audio_urls": audio_urls,
+				"playlist_url": playlist_url,
+			},
+		)
+
+	return StreamingResponse(
+		events(),
+		media_type="text/event-stream",
+		headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
 	)
-	vs.save()
 
-	mp3_filename = f"brief_{ts}.mp3"
-	mp3_path = Path(dirs["summaries_dir"]) / mp3_filename
-	if not body.no_audio:
-		synthesize_to_mp3(summary_text, mp3_path)
 
-	return {
-		"summary_id": summary_id,
-		"text": summary_text,
-		"sections": extract_section_titles(summary_text),
-		"audio_url": f"/audio/{mp3_filename}" if (not body.no_audio) else None,
-		"articles_used": articles,
-	}
+def _with_urls(entry: dict) -> dict:
+	audio = entry.pop("audio_file")
+	mp3_path = Path(ensure_dirs()["summaries_dir"]) / audio if audio else None
+	playlist = playlist_path_for(mp3_path) if mp3_path is not None else None
+	entry["audio_url"] = f"/audio/{audio}" if mp3_path is not None and mp3_path.exists() else None
+	entry["playlist_url"] = f"/audio/{playlist.name}" if playlist is not None and playlist.exists() else None
+	return entry
+
+
+def _get_archive():
+	archive = get_archive()
+	if archive is None:
+		raise HTTPException(status_code=404, detail="The brief archive is disabled.")
+	return archive
+
+
+@app.get("/briefs")
+def list_briefs(limit: int = 20, cursor: Optional[str] = None, profile_id: Optional[int] = None):
+	"""
+	Brief history, newest first and without the text. Pass `next_cursor`
+	back as `cursor` for the following page; it is null on the last one.
+	"""
+	items, next_cursor = _get_archive().page(min(max(limit, 1), 100), cursor=cursor, profile_id=profile_id)
+	return {"items": [_with_urls(item) for item in items], "next_cursor": next_cursor}
+
+
+@app.get("/briefs/{summary_id}")
+def get_brief(summary_id: str):
+	entry = _get_archive().get(summary_id)
+	if entry is None:
+		raise HTTPException(status_code=404, detail="Unknown brief.")
+	return _with_urls(entry)
 
 
 @app.post("/feedback")
 def feedback(body: FeedbackIn):
-	save_feedback(
+	"""
+	Log the feedback durably and return; it is saved to the database and
+	embedded into RAG (so future briefs learn) in the next batch.
+	"""
+	entry = get_feedback().submit(
 		rating=body.rating,
 		likes=body.likes,
 		dislikes=body.dislikes,
 		summary_id=body.summary_id,
 	)
-	# Also embed feedback into RAG so future briefs learn
-	dirs = ensure_dirs()
-	vs = RAGStore(Path(dirs["vector_dir"]))
-	vs.load()
-	texts = []
-	if body.likes:
-		texts.append(f"USER_FEEDBACK_LIKES: {body.likes}")
-	if body.dislikes:
-		texts.append(f"USER_FEEDBACK_DISLIKES: {body.dislikes}")
-	if texts:
-		vs.add_texts(texts, metadatas=[{"type": "feedback", "summary_id": body.summary_id}] * len(texts))
-		vs.save()
-	return {"ok": True}
-
+	return {"ok": True, "feedback_id": entry["id"]}
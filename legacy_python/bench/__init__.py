@@ -0,0 +1,2 @@
+__all__ = []
+
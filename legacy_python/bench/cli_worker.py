@@ -0,0 +1,44 @@
+"""
+One `app.py --auto --no-play` run against the local stand-ins, for bench.run.
+
+Configuration comes from the environment the parent sets up (DATA_DIR,
+NEWSAPI_BASE_URL, ...) plus BENCH_STUBS (install_stubs keyword arguments as
+JSON) and BENCH_INTERESTS. Prints one `BENCH_RESULT {json}` line with the
+run's total latency and per-stage samples.
+"""
+
+from __future__ import annotations
+
+import builtins
+import json
+import os
+import sys
+import time
+
+from bench.fakes import install_stubs
+from bench.harness import StageTimer, instrument
+
+
+def main() -> int:
+	install_stubs(**json.loads(os.environ.get("BENCH_STUBS") or "{}"))
+	timer = StageTimer()
+	instrument(timer, "cli")
+
+	import app
+	from pmbrief.db import save_profile
+
+	interests = [i.strip() for i in (os.environ.get("BENCH_INTERESTS") or "").split(",") if i.strip()]
+	save_profile(interests)
+	# skip the rating/likes/dislikes prompts
+	builtins.input = lambda *args, **kwargs: ""
+
+	start = time.perf_counter()
+	app.run_once(auto=True, no_play=True)
+	total = time.perf_counter() - start
+	print("BENCH_RESULT " + json.dumps({"total": total, "stages": timer.snapshot()}))
+	sys.stdout.flush()
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+
+_WORDS = (
+	"markets rates inflation earnings guidance outlook chips cloud merger deal regulators "
+	"policy growth supply demand investors analysts quarter revenue forecast shares bonds"
+).split()
+# One MPEG-1 Layer III frame header: 32 kbps, 44.1 kHz, mono (104-byte frames)
+_MP3_FRAME = b"\xff\xfb\x10\xc4" + b"\x00" * 100
+_FRAMES_PER_CHAR = 2.5
+
+
+def _sleep_ms(base_ms: float, jitter_ms: float = 0.0) -> None:
+	delay = base_ms + (random.uniform(-jitter_ms, jitter_ms) if jitter_ms else 0.0)
+	if delay > 0:
+		time.sleep(delay / 1000.0)
+
+
+def fake_articles(query: str, count: int, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+	"""
+	Deterministic NewsAPI-shaped articles for `query`, newest first.
+	"""
+	now = now or datetime.now(timezone.utc)
+	slug = re.sub(r"[^a-z0-9]+", "-", query.lower()).strip("-") or "news"
+	seed = int(hashlib.md5(query.encode("utf-8")).hexdigest()[:8], 16)
+	rng = random.Random(seed)
+	articles = []
+	for i in range(count):
+		words = " ".join(rng.choice(_WORDS) for _ in range(24))
+		articles.append(
+			{
+				"source": {"id": None, "name": f"Source {i % 9}"},
+				"author": None,
+				"title": f"{query.title()} update {i}: {' '.join(words.split()[:6])}",
+				"description": f"{query} {words}.",
+				"url": f"https://news.example.com/{slug}/{i}",
+				"publishedAt": (now - timedelta(minutes=7 * i)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+				"content": words,
+			}
+		)
+	return articles
+
+
+class FakeNewsAPI:
+	"""
+	NewsAPI `/v2/everything` stand-in on 127.0.0.1: `articles_per_query`
+	results per `q`, answered after `latency_ms` (± `jitter_ms`).
+	"""
+
+	def __init__(self, articles_per_query: int = 40, latency_ms: float = 150.0, jitter_ms: float = 30.0) -> None:
+		self.articles_per_query = articles_per_query
+		self.latency_ms = latency_ms
+		self.jitter_ms = jitter_ms
+		self.requests = 0
+		self._lock = threading.Lock()
+		fake = self
+
+		class Handler(BaseHTTPRequestHandler):
+			def do_GET(self) -> None:
+				parts = urlsplit(self.path)
+				if parts.path != "/v2/everything":
+					self.send_error(404)
+					return
+				with fake._lock:
+					fake.requests += 1
+				query = (parse_qs(parts.query).get("q") or [""])[0]
+				_sleep_ms(fake.latency_ms, fake.jitter_ms)
+				articles = fake_articles(query, fake.articles_per_query)
+				body = json.dumps({"status": "ok", "totalResults": len(articles), "articles": articles}).encode("utf-8")
+				self.send_response(200)
+				self.send_header("Content-Type", "application/json")
+				self.send_header("Content-Length", str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, format: str, *args: Any) -> None:
+				return None
+
+		self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+		self._server.daemon_threads = True
+		self._thread: Optional[threading.Thread] = None
+
+	@property
+	def url(self) -> str:
+		host, port = self._server.server_address[:2]
+		return f"http://{host}:{port}/v2/everything"
+
+	def start(self) -> "FakeNewsAPI":
+		self._thread = threading.Thread(target=self._server.serve_forever, name="fake-newsapi", daemon=True)
+		self._thread.start()
+		return self
+
+	def stop(self) -> None:
+		self._server.shutdown()
+		self._server.server_close()
+
+
+def fake_vector(text: str, dim: int) -> List[float]:
+	rng = random.Random(int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16))
+	return [rng.gauss(0.0, 1.0) for _ in range(dim)]
+
+
+class _Response:
+	def __init__(self, text: str) -> None:
+		self.text = text
+
+
+class FakeGenerativeModel:
+	"""
+	Stands in for genai.GenerativeModel: writes a brief with one section per
+	listener interest, about BRIEF_TARGET_WORDS long, after `latency_ms` plus
+	`ms_per_token` per output word.
+	"""
+
+	latency_ms = 800.0
+	ms_per_token = 2.0
+
+	def __init__(self, model_name: str = "", **_: Any) -> None:
+		self.model_name = model_name
+
+	def _brief(self, prompt: str) -> str:
+		interests_block = prompt.split("LISTENER INTERESTS:", 1)[-1].split("\n\n", 1)[0]
+		interests = [i.strip() for i in interests_block.strip().split(",") if i.strip()] or ["Top stories"]
+		target = re.search(r"write ~(\d+) words", prompt)
+		words = int(target.group(1)) if target else 600
+		per_section = max(20, words // (len(interests) + 1))
+		rng = random.Random(len(prompt))
+		sections = []
+		for title in ["Welcome"] + interests:
+			body = " ".join(rng.choice(_WORDS) for _ in range(per_section))
+			sections.append(f"SECTION: {title.upper()}\n{body.capitalize()}.")
+		return "\n\n".join(sections)
+
+	def generate_content(self, prompt: str, stream: bool = False, **_: Any) -> Any:
+		text = self._brief(prompt)
+		if not stream:
+			_sleep_ms(self.latency_ms + self.ms_per_token * len(text.split()))
+			return _Response(text)
+		return self._stream(text)
+
+	def _stream(self, text: str) -> Iterator[_Response]:
+		_sleep_ms(self.latency_ms)
+		words = text.split(" ")
+		for i in range(0, len(words), 20):
+			_sleep_ms(self.ms_per_token * 20)
+			yield _Response(" ".join(words[i : i + 20]) + " ")
+
+
+class FakeEmbedder:
+	"""
+	Stands in for genai.embed_content: deterministic unit-free vectors of
+	`dim` floats after `latency_ms` per request (single text or batch).
+	"""
+
+	def __init__(self, dim: int = 256, latency_ms: float = 60.0) -> None:
+		self.dim = dim
+		self.latency_ms = latency_ms
+		self.requests = 0
+		self._lock = threading.Lock()
+
+	def __call__(self, model: str = "", content: Any = None, **_: Any) -> Dict[str, Any]:
+		with self._lock:
+			self.requests += 1
+		_sleep_ms(self.latency_ms)
+		if isinstance(content, (list, tuple)):
+			return {"embedding": [fake_vector(str(t), self.dim) for t in content]}
+		return {"embedding": fake_vector(str(content), self.dim)}
+
+
+class FakeGeminiAPI:
+	"""
+	Gemini REST stand-in on 127.0.0.1 for the async code path (point
+	GEMINI_API_BASE at `url`): batchEmbedContents and embedContent return the
+	same vectors as FakeEmbedder, generateContent and streamGenerateContent
+	(alt=sse) the same briefs as FakeGenerativeModel, with the same latencies.
+	"""
+
+	def __init__(self, embed_dim: int = 256, embed_latency_ms: float = 60.0) -> None:
+		self.embed_dim = embed_dim
+		self.embed_latency_ms = embed_latency_ms
+		self.requests = 0
+		self._lock = threading.Lock()
+		fake = self
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = "HTTP/1.1"
+
+			def _json(self, payload: Dict[str, Any]) -> None:
+				body = json.dumps(payload).encode("utf-8")
+				self.send_response(200)
+				self.send_header("Content-Type", "application/json")
+				self.send_header("Content-Length", str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def do_POST(self) -> None:
+				parts = urlsplit(self.path)
+				method = parts.path.rsplit(":", 1)[-1]
+				length = int(self.headers.get("Content-Length") or 0)
+				body = json.loads(self.rfile.read(length) or b"{}")
+				with fake._lock:
+					fake.requests += 1
+				if method == "batchEmbedContents":
+					_sleep_ms(fake.embed_latency_ms)
+					texts = [r["content"]["parts"][0]["text"] for r in body.get("requests", [])]
+					self._json({"embeddings": [{"values": fake_vector(t, fake.embed_dim)} for t in texts]})
+				elif method == "embedContent":
+					_sleep_ms(fake.embed_latency_ms)
+					text = body["content"]["parts"][0]["text"]
+					self._json({"embedding": {"values": fake_vector(text, fake.embed_dim)}})
+				elif method == "generateContent":
+					response = FakeGenerativeModel().generate_content(body["contents"][0]["parts"][0]["text"])
+					self._json({"candidates": [{"content": {"role": "model", "parts": [{"text": response.text}]}}]})
+				elif method == "streamGenerateContent":
+					self.send_response(200)
+					self.send_header("Content-Type", "text/event-stream")
+					self.send_header("Connection", "close")
+					self.end_headers()
+					prompt = body["contents"][0]["parts"][0]["text"]
+					for chunk in FakeGenerativeModel().generate_content(prompt, stream=True):
+						payload = {"candidates": [{"content": {"role": "model", "parts": [{"text": chunk.text}]}}]}
+						self.wfile.write(f"data: {json.dumps(payload)}\r\n\r\n".encode("utf-8"))
+						self.wfile.flush()
+					self.close_connection = True
+				else:
+					self.send_error(404)
+
+			def log_message(self, format: str, *args: Any) -> None:
+				return None
+
+		self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+		self._server.daemon_threads = True
+		self._thread: Optional[threading.Thread] = None
+
+	@property
+	def url(self) -> str:
+		host, port = self._server.server_address[:2]
+		return f"http://{host}:{port}/v1beta"
+
+	def start(self) -> "FakeGeminiAPI":
+		self._thread = threading.Thread(target=self._server.serve_forever, name="fake-gemini", daemon=True)
+		self._thread.start()
+		return self
+
+	def stop(self) -> None:
+		self._server.shutdown()
+		self._server.server_close()
+
+
+class FakeTTS:
+	"""
+	Stands in for the TTS providers: silent MP3 frames roughly as long as the
+	text would take to read, after `latency_ms` plus `ms_per_char`.
+	"""
+
+	def __init__(self, latency_ms: float = 250.0, ms_per_char: float = 0.05) -> None:
+		self.latency_ms = latency_ms
+		self.ms_per_char = ms_per_char
+		self.requests = 0
+		self._lock = threading.Lock()
+
+	def __call__(self, text: str) -> bytes:
+		with self._lock:
+			self.requests += 1
+		_sleep_ms(self.latency_ms + self.ms_per_char * len(text))
+		return _MP3_FRAME * max(1, int(len(text) * _FRAMES_PER_CHAR))
+
+
+def install_stubs(
+	gen_latency_ms: float = 800.0,
+	gen_ms_per_token: float = 2.0,
+	embed_latency_ms: float = 60.0,
+	embed_dim: int = 256,
+	tts_latency_ms: float = 250.0,
+	tts_ms_per_char: float = 0.05,
+) -> Dict[str, Any]:
+	"""
+	Swap the Gemini SDK calls and the TTS providers for local stand-ins.
+	Must run before any brief is generated; returns the fakes for stats.
+	"""
+	import google.generativeai as genai
+
+	from pmbrief import tts_engine
+
+	FakeGenerativeModel.latency_ms = gen_latency_ms
+	FakeGenerativeModel.ms_per_token = gen_ms_per_token
+	embedder = FakeEmbedder(dim=embed_dim, latency_ms=embed_latency_ms)
+	tts = FakeTTS(latency_ms=tts_latency_ms, ms_per_char=tts_ms_per_char)
+	genai.configure = lambda *args, **kwargs: None
+	genai.embed_content = embedder
+	genai.GenerativeModel = FakeGenerativeModel
+	tts_engine._gtts_bytes = tts
+	tts_engine._gcloud_bytes = tts
+	return {"embedder": embedder, "tts": tts}
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import functools
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+STAGE_ORDER = ("rag_load", "fetch", "rank", "retrieve", "embed", "generate", "persist", "synthesize")
+
+
+class StageTimer:
+	"""
+	Collects wall-clock samples per stage name from any thread.
+	"""
+
+	def __init__(self) -> None:
+		self.samples: Dict[str, List[float]] = {}
+		self._lock = threading.Lock()
+
+	def record(self, stage: str, seconds: float) -> None:
+		with self._lock:
+			self.samples.setdefault(stage, []).append(seconds)
+
+	def merge(self, samples: Dict[str, Sequence[float]]) -> None:
+		with self._lock:
+			for stage, values in samples.items():
+				self.samples.setdefault(stage, []).extend(values)
+
+	def snapshot(self) -> Dict[str, List[float]]:
+		with self._lock:
+			return {stage: list(values) for stage, values in self.samples.items()}
+
+	def wrap(self, owner: Any, attr: str, stage: str) -> None:
+		"""
+		Replace `owner.attr` (a module function or a class method) with a
+		version that records its duration under `stage`.
+		"""
+		original = getattr(owner, attr)
+		if getattr(original, "__bench_stage__", None):
+			return
+
+		@functools.wraps(original)
+		def timed(*args: Any, **kwargs: Any) -> Any:
+			start = time.perf_counter()
+			try:
+				return original(*args, **kwargs)
+			finally:
+				self.record(stage, time.perf_counter() - start)
+
+		timed.__bench_stage__ = stage
+		setattr(owner, attr, timed)
+
+
+def instrument(timer: StageTimer, mode: str) -> None:
+	"""
+	Time the pipeline stages that `run_once` ("cli") or the sync API paths
+	("api", e.g. background jobs) go through. The API shares one
+	SharedRAGStore, the CLI uses RAGStore directly. The async endpoints report
+	their stages in Server-Timing instead; see `parse_server_timing`.
+	"""
+	from pmbrief import pipeline
+	from pmbrief.rag_store import RAGStore, SharedRAGStore
+
+	timer.wrap(pipeline, "fetch_news", "fetch")
+	timer.wrap(pipeline, "select_articles", "rank")
+	timer.wrap(pipeline, "generate_brief", "generate")
+	timer.wrap(pipeline, "synthesize_to_mp3", "synthesize")
+	timer.wrap(RAGStore, "load", "rag_load")
+	store_cls = SharedRAGStore if mode == "api" else RAGStore
+	timer.wrap(store_cls, "retrieve_filtered", "retrieve")
+	timer.wrap(store_cls, "add_texts", "persist")
+	if mode == "cli":
+		import app
+
+		timer.wrap(app, "generate_brief", "generate")
+		timer.wrap(app, "synthesize_to_mp3", "synthesize")
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+	"""
+	Seconds per stage from a Server-Timing value like `fetch;dur=412.0, generate;dur=2210.5`.
+	"""
+	stages: Dict[str, float] = {}
+	for item in (header or "").split(","):
+		name, _, params = item.strip().partition(";")
+		for param in params.split(";"):
+			key, _, value = param.strip().partition("=")
+			if name and key == "dur":
+				try:
+					stages[name] = stages.get(name, 0.0) + float(value) / 1000.0
+				except ValueError:
+					pass
+	return stages
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+	"""
+	Linear-interpolated percentile of `values` (pct in 0..100).
+	"""
+	if not values:
+		return 0.0
+	ordered = sorted(values)
+	rank = (len(ordered) - 1) * pct / 100.0
+	low = int(rank)
+	high = min(low + 1, len(ordered) - 1)
+	return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: Sequence[float]) -> Dict[str, float]:
+	return {
+		"count": len(values),
+		"p50_ms": round(percentile(values, 50) * 1000, 2),
+		"p95_ms": round(percentile(values, 95) * 1000, 2),
+		"p99_ms": round(percentile(values, 99) * 1000, 2),
+		"mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+	}
+
+
+def build_report(
+	name: str,
+	totals: Sequence[float],
+	stages: Dict[str, Sequence[float]],
+	wall_seconds: float,
+	errors: int,
+	config: Dict[str, Any],
+) -> Dict[str, Any]:
+	ordered = [s for s in STAGE_ORDER if s in stages] + sorted(s for s in stages if s not in STAGE_ORDER)
+	return {
+		"name": name,
+		"config": config,
+		"requests": len(totals) + errors,
+		"errors": errors,
+		"wall_seconds": round(wall_seconds, 3),
+		"throughput_rps": round(len(totals) / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+		"total": summarize(totals),
+		"stages": {stage: summarize(stages[stage]) for stage in ordered},
+	}
+
+
+def print_report(report: Dict[str, Any]) -> None:
+	print(
+		f"\n{report['name']}: {report['requests']} requests, {report['errors']} errors, "
+		f"{report['wall_seconds']}s wall, {report['throughput_rps']} req/s"
+	)
+	print(f"{'stage':<12}{'n':>6}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}")
+	rows = list(report["stages"].items()) + [("total", report["total"])]
+	for stage, s in rows:
+		print(f"{stage:<12}{s['count']:>6}{s['p50_ms']:>11.1f}{s['p95_ms']:>11.1f}{s['p99_ms']:>11.1f}")
+
+
+def load_baselines(path: Path) -> Dict[str, Any]:
+	if not Path(path).exists():
+		return {}
+	return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def save_baseline(path: Path, report: Dict[str, Any]) -> None:
+	baselines = load_baselines(path)
+	baselines[report["name"]] = report
+	Path(path).write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def compare(
+	report: Dict[str, Any],
+	baseline: Dict[str, Any],
+	tolerance: float = 0.2,
+	floor_ms: float = 5.0,
+) -> List[str]:
+	"""
+	Regressions against `baseline`: p95 of the total or any stage, or
+	throughput, worse by more than `tolerance` (and by more than `floor_ms`
+	for latencies, so millisecond noise on fast stages is ignored).
+	"""
+	regressions: List[str] = []
+	pairs = [("total", report["total"], baseline.get("total"))] + [
+		(stage, stats, baseline.get("stages", {}).get(stage)) for stage, stats in report["stages"].items()
+	]
+	for stage, now, before in pairs:
+		if not before or not before.get("count"):
+			continue
+		old, new = before["p95_ms"], now["p95_ms"]
+		if new > old * (1 + tolerance) and new - old > floor_ms:
+			regressions.append(f"{stage} p95 {old:.1f} -> {new:.1f} ms (+{(new / old - 1) * 100 if old else 100:.0f}%)")
+	old_rps, new_rps = baseline.get("throughput_rps") or 0.0, report["throughput_rps"]
+	if old_rps and new_rps < old_rps * (1 - tolerance):
+		regressions.append(f"throughput {old_rps:.3f} -> {new_rps:.3f} req/s")
+	return regressions
+
+
+def run_concurrently(
+	job: Callable[[int], Optional[float]],
+	requests: int,
+	concurrency: int,
+) -> Dict[str, Any]:
+	"""
+	Call job(i) for i in range(requests) on `concurrency` threads. A job
+	returns its latency in seconds, or raises. Returns totals, errors, wall time.
+	"""
+	from concurrent.futures import ThreadPoolExecutor
+
+	totals: List[float] = []
+	errors: List[str] = []
+	lock = threading.Lock()
+
+	def run(i: int) -> None:
+		try:
+			latency = job(i)
+		except Exception as exc:
+			with lock:
+				errors.append(f"{type(exc).__name__}: {exc}")
+			return
+		if latency is not None:
+			with lock:
+				totals.append(latency)
+
+	start = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+		list(pool.map(run, range(requests)))
+	return {"totals": totals, "errors": errors, "wall_seconds": time.perf_counter() - start}
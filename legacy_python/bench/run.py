@@ -0,0 +1,226 @@
+"""
+Offline end-to-end benchmark: NewsAPI, Gemini and TTS are replaced by local
+stand-ins (bench.fakes) with configurable volume and latency, and either the
+CLI (`run_once`, one subprocess per run) or the FastAPI app
+(`POST /brief/generate` through TestClient) is driven at a given
+concurrency. Reports p50/p95/p99 per stage and overall, plus throughput,
+and compares against stored baselines. API stage timings come from each
+response's Server-Timing header.
+
+Run from legacy_python/:
+
+	python -m bench.run --mode api --requests 20 --concurrency 4
+	python -m bench.run --mode cli --requests 6 --concurrency 2 --save-baseline
+	python -m bench.run --mode api --fail-on-regression
+
+Caches (news, embeddings, briefs, audio) are off unless --caches is given,
+so each run pays for every stage.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from queue import Queue
+from typing import Any, Dict, List
+
+from bench.fakes import FakeGeminiAPI, FakeNewsAPI, install_stubs
+from bench.harness import (
+	StageTimer,
+	build_report,
+	compare,
+	load_baselines,
+	parse_server_timing,
+	print_report,
+	run_concurrently,
+	save_baseline,
+)
+
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINES = Path(__file__).resolve().parent / "baselines.json"
+CACHE_FLAGS = ("NEWS_CACHE_ENABLED", "EMBEDDING_CACHE_ENABLED", "BRIEF_CACHE_ENABLED", "AUDIO_STORE_ENABLED")
+
+
+def _parse_args(argv: List[str]) -> argparse.Namespace:
+	p = argparse.ArgumentParser(prog="bench.run", description="Offline pipeline benchmark.")
+	p.add_argument("--mode", choices=("api", "cli"), default="api")
+	p.add_argument("--requests", type=int, default=20, help="Briefs to generate.")
+	p.add_argument("--concurrency", type=int, default=4)
+	p.add_argument("--interests", default="semiconductors, interest rates, mergers and acquisitions")
+	p.add_argument("--articles", type=int, default=40, help="Fake NewsAPI results per query.")
+	p.add_argument("--news-latency-ms", type=float, default=150.0)
+	p.add_argument("--gen-latency-ms", type=float, default=800.0)
+	p.add_argument("--gen-ms-per-token", type=float, default=2.0)
+	p.add_argument("--embed-latency-ms", type=float, default=60.0)
+	p.add_argument("--tts-latency-ms", type=float, default=250.0)
+	p.add_argument("--no-audio", action="store_true", help="Skip TTS (API mode only).")
+	p.add_argument("--caches", action="store_true", help="Leave the news/embedding/brief/audio caches on.")
+	p.add_argument("--name", help="Scenario name for baselines (default: <mode>-c<concurrency>).")
+	p.add_argument("--baselines", type=Path, default=DEFAULT_BASELINES)
+	p.add_argument("--save-baseline", action="store_true", help="Store this run as the scenario's baseline.")
+	p.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95/throughput regression (fraction).")
+	p.add_argument("--fail-on-regression", action="store_true")
+	p.add_argument("--json", type=Path, help="Also write the report here.")
+	return p.parse_args(argv)
+
+
+def _stub_config(args: argparse.Namespace) -> Dict[str, Any]:
+	return {
+		"gen_latency_ms": args.gen_latency_ms,
+		"gen_ms_per_token": args.gen_ms_per_token,
+		"embed_latency_ms": args.embed_latency_ms,
+		"tts_latency_ms": args.tts_latency_ms,
+	}
+
+
+def _base_env(args: argparse.Namespace, news: FakeNewsAPI, gemini: FakeGeminiAPI, data_dir: Path) -> Dict[str, str]:
+	env = {
+		"DATA_DIR": str(data_dir),
+		"VECTORSTORE_DIR": str(data_dir / "vectorstore"),
+		"SUMMARIES_DIR": str(data_dir / "summaries"),
+		"TMP_DIR": str(data_dir / "tmp"),
+		"DATABASE_URL": "",
+		"GEMINI_API_KEY": "bench",
+		"NEWSAPI_KEY": "bench",
+		"NEWSAPI_BASE_URL": news.url,
+		"GEMINI_API_BASE": gemini.url,
+		"NEWSAPI_REQUESTS_PER_MINUTE": "1000000",
+		"TTS_PROVIDER": "gtts",
+	}
+	for flag in CACHE_FLAGS:
+		env[flag] = "true" if args.caches else "false"
+	return env
+
+
+def _run_api(args: argparse.Namespace, env: Dict[str, str], timer: StageTimer) -> Dict[str, Any]:
+	os.environ.update(env)
+	install_stubs(**_stub_config(args))
+
+	from fastapi.testclient import TestClient
+
+	from backend.main import app
+
+	interests = [i.strip() for i in args.interests.split(",") if i.strip()]
+	with TestClient(app) as client:
+
+		def job(i: int) -> float:
+			start = time.perf_counter()
+			resp = client.post("/brief/generate", json={"interests": interests, "no_audio": args.no_audio})
+			elapsed = time.perf_counter() - start
+			if resp.status_code != 200:
+				raise RuntimeError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+			for stage, seconds in parse_server_timing(resp.headers.get("Server-Timing", "")).items():
+				timer.record(stage, seconds)
+			return elapsed
+
+		return run_concurrently(job, args.requests, args.concurrency)
+
+
+def _run_cli(args: argparse.Namespace, env: Dict[str, str], timer: StageTimer, data_dir: Path) -> Dict[str, Any]:
+	# One data dir per concurrent slot: separate CLI installs, each building
+	# up its own history across the runs it executes
+	slots: "Queue[int]" = Queue()
+	for slot in range(max(1, args.concurrency)):
+		slots.put(slot)
+
+	def job(i: int) -> float:
+		slot = slots.get()
+		try:
+			slot_dir = data_dir / f"cli_{slot}"
+			run_env = dict(os.environ)
+			run_env.update(env)
+			run_env.update(
+				{
+					"DATA_DIR": str(slot_dir),
+					"VECTORSTORE_DIR": str(slot_dir / "vectorstore"),
+					"SUMMARIES_DIR": str(slot_dir / "summaries"),
+					"TMP_DIR": str(slot_dir / "tmp"),
+					"BENCH_STUBS": json.dumps(_stub_config(args)),
+					"BENCH_INTERESTS": args.interests,
+				}
+			)
+			proc = subprocess.run(
+				[sys.executable, "-m", "bench.cli_worker"],
+				cwd=str(ROOT),
+				env=run_env,
+				capture_output=True,
+				text=True,
+				timeout=600,
+			)
+		finally:
+			slots.put(slot)
+		for line in proc.stdout.splitlines():
+			if line.startswith("BENCH_RESULT "):
+				result = json.loads(line[len("BENCH_RESULT ") :])
+				timer.merge(result["stages"])
+				return result["total"]
+		raise RuntimeError(f"worker exited {proc.returncode}: {(proc.stderr or proc.stdout)[-300:]}")
+
+	return run_concurrently(job, args.requests, args.concurrency)
+
+
+def main(argv: List[str]) -> int:
+	args = _parse_args(argv)
+	name = args.name or f"{args.mode}-c{args.concurrency}"
+	news = FakeNewsAPI(articles_per_query=args.articles, latency_ms=args.news_latency_ms).start()
+	gemini = FakeGeminiAPI(embed_latency_ms=args.embed_latency_ms).start()
+	timer = StageTimer()
+	try:
+		with tempfile.TemporaryDirectory(prefix="pmbrief-bench-") as tmp:
+			data_dir = Path(tmp)
+			env = _base_env(args, news, gemini, data_dir)
+			if args.mode == "api":
+				outcome = _run_api(args, env, timer)
+			else:
+				outcome = _run_cli(args, env, timer, data_dir)
+	finally:
+		news.stop()
+		gemini.stop()
+
+	config = {k: v for k, v in vars(args).items() if k not in ("baselines", "json", "save_baseline", "fail_on_regression")}
+	report = build_report(
+		name,
+		outcome["totals"],
+		timer.snapshot(),
+		outcome["wall_seconds"],
+		len(outcome["errors"]),
+		config,
+	)
+	report["newsapi_requests"] = news.requests
+	print_report(report)
+	for err in outcome["errors"][:5]:
+		print(f"  error: {err}")
+
+	if args.json:
+		args.json.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+	baseline = load_baselines(args.baselines).get(name)
+	regressions: List[str] = []
+	if baseline is not None:
+		regressions = compare(report, baseline, tolerance=args.tolerance)
+		if regressions:
+			print(f"\nRegressions vs baseline '{name}':")
+			for line in regressions:
+				print(f"  {line}")
+		else:
+			print(f"\nWithin {args.tolerance:.0%} of baseline '{name}'.")
+	else:
+		print(f"\nNo baseline for '{name}' in {args.baselines}.")
+	if args.save_baseline:
+		save_baseline(args.baselines, report)
+		print(f"Saved baseline '{name}'.")
+
+	if args.fail_on_regression and (regressions or outcome["errors"]):
+		return 1
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,220 @@
+"""
+Cold-start benchmark: how long each entry point takes to import in a fresh
+interpreter, and how long the API takes from process start to its first
+`GET /health` answer (uvicorn in a subprocess; reported as the total).
+Each import also records which heavy dependencies (faiss,
+langchain_community, the Gemini SDK, gTTS, SQLAlchemy) it pulled in; the
+pmbrief modules should load them on first use, not at import.
+
+Run from legacy_python/:
+
+	python -m bench.startup --runs 5
+	python -m bench.startup --save-baseline
+	python -m bench.startup --fail-on-regression
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from bench.harness import build_report, compare, load_baselines, print_report, save_baseline
+
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINES = Path(__file__).resolve().parent / "baselines.json"
+
+# stage name -> module imported in a fresh interpreter
+TARGETS = {
+	"db": "pmbrief.db",
+	"rag_store": "pmbrief.rag_store",
+	"summarizer": "pmbrief.summarizer",
+	"tts_engine": "pmbrief.tts_engine",
+	"pipeline": "pmbrief.pipeline",
+	"cli": "app",
+	"api": "backend.main",
+}
+HEAVY = ("faiss", "langchain_community", "google.generativeai", "gtts", "sqlalchemy")
+# modules that must leave every HEAVY dependency to first use
+LAZY = ("db", "rag_store", "summarizer", "tts_engine")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import importlib
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - start
+heavy = [m for m in json.loads(sys.argv[2]) if m in sys.modules]
+print("BENCH_RESULT " + json.dumps({"seconds": seconds, "heavy": heavy}))
+"""
+
+
+def _parse_args(argv: List[str]) -> argparse.Namespace:
+	p = argparse.ArgumentParser(prog="bench.startup", description="Import time and time to first /health.")
+	p.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement.")
+	p.add_argument("--only", help="Comma-separated subset of: " + ", ".join(TARGETS) + ", health.")
+	p.add_argument("--health-timeout", type=float, default=60.0)
+	p.add_argument("--name", default="startup", help="Scenario name for baselines.")
+	p.add_argument("--baselines", type=Path, default=DEFAULT_BASELINES)
+	p.add_argument("--save-baseline", action="store_true", help="Store this run as the scenario's baseline.")
+	p.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 regression (fraction).")
+	p.add_argument("--fail-on-regression", action="store_true")
+	p.add_argument("--json", type=Path, help="Also write the report here.")
+	return p.parse_args(argv)
+
+
+def _env(data_dir: Path) -> Dict[str, str]:
+	env = dict(os.environ)
+	env.update(
+		{
+			"DATA_DIR": str(data_dir),
+			"VECTORSTORE_DIR": str(data_dir / "vectorstore"),
+			"SUMMARIES_DIR": str(data_dir / "summaries"),
+			"TMP_DIR": str(data_dir / "tmp"),
+			"DATABASE_URL": "",
+			"GEMINI_API_KEY": env.get("GEMINI_API_KEY") or "bench",
+			# the same measurement with or without compiled bytecode on disk
+			"PYTHONDONTWRITEBYTECODE": "1",
+		}
+	)
+	return env
+
+
+def _last_line(text: str) -> str:
+	lines = (text or "").strip().splitlines()
+	return lines[-1] if lines else ""
+
+
+def measure_import(module: str, env: Dict[str, str]) -> Tuple[float, List[str]]:
+	"""
+	Seconds to import `module` in a fresh interpreter, and the HEAVY
+	modules loaded by then.
+	"""
+	proc = subprocess.run(
+		[sys.executable, "-c", _PROBE, module, json.dumps(HEAVY)],
+		cwd=str(ROOT),
+		env=env,
+		capture_output=True,
+		text=True,
+		timeout=120,
+	)
+	for line in proc.stdout.splitlines():
+		if line.startswith("BENCH_RESULT "):
+			result = json.loads(line[len("BENCH_RESULT ") :])
+			return result["seconds"], result["heavy"]
+	raise RuntimeError(f"import {module} exited {proc.returncode}: {_last_line(proc.stderr or proc.stdout)}")
+
+
+def _free_port() -> int:
+	with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+		s.bind(("127.0.0.1", 0))
+		return s.getsockname()[1]
+
+
+def measure_health(env: Dict[str, str], timeout: float) -> float:
+	"""
+	Seconds from starting `uvicorn backend.main:app` to the first 200 from
+	/health.
+	"""
+	port = _free_port()
+	url = f"http://127.0.0.1:{port}/health"
+	start = time.perf_counter()
+	proc = subprocess.Popen(
+		[sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(port)],
+		cwd=str(ROOT),
+		env=env,
+		stdout=subprocess.DEVNULL,
+		stderr=subprocess.PIPE,
+		text=True,
+	)
+	try:
+		while time.perf_counter() - start < timeout:
+			if proc.poll() is not None:
+				raise RuntimeError(f"uvicorn exited {proc.returncode}: {_last_line(proc.stderr.read())}")
+			try:
+				with urllib.request.urlopen(url, timeout=1) as resp:
+					if resp.status == 200:
+						return time.perf_counter() - start
+			except OSError:
+				pass
+			time.sleep(0.01)
+		raise RuntimeError(f"no /health answer within {timeout:.0f}s")
+	finally:
+		proc.terminate()
+		try:
+			proc.wait(timeout=10)
+		except subprocess.TimeoutExpired:
+			proc.kill()
+			proc.wait()
+
+
+def main(argv: List[str]) -> int:
+	args = _parse_args(argv)
+	selected = [s.strip() for s in args.only.split(",")] if args.only else list(TARGETS) + ["health"]
+	stages: Dict[str, List[float]] = {}
+	totals: List[float] = []
+	errors: List[str] = []
+	eager: Dict[str, List[str]] = {}
+	started = time.perf_counter()
+	with tempfile.TemporaryDirectory(prefix="pmbrief-startup-") as tmp:
+		env = _env(Path(tmp))
+		for _ in range(max(1, args.runs)):
+			for stage in selected:
+				try:
+					if stage == "health":
+						seconds = measure_health(env, args.health_timeout)
+						totals.append(seconds)
+					else:
+						seconds, heavy = measure_import(TARGETS[stage], env)
+						if stage in LAZY and heavy:
+							eager[stage] = heavy
+				except Exception as exc:
+					errors.append(f"{stage}: {exc}")
+					continue
+				stages.setdefault(stage, []).append(seconds)
+	wall = time.perf_counter() - started
+
+	config: Dict[str, Any] = {"runs": args.runs, "only": args.only, "python": sys.version.split()[0]}
+	report = build_report(args.name, totals, stages, wall, len(errors), config)
+	report["eager_imports"] = eager
+	print_report(report)
+	for stage, heavy in sorted(eager.items()):
+		print(f"  {stage} imports {', '.join(heavy)} at load")
+	for err in dict.fromkeys(errors):
+		print(f"  error: {err}")
+
+	if args.json:
+		args.json.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+	baseline = load_baselines(args.baselines).get(args.name)
+	regressions: List[str] = []
+	if baseline is not None:
+		regressions = compare(report, baseline, tolerance=args.tolerance)
+		if regressions:
+			print(f"\nRegressions vs baseline '{args.name}':")
+			for line in regressions:
+				print(f"  {line}")
+		else:
+			print(f"\nWithin {args.tolerance:.0%} of baseline '{args.name}'.")
+	else:
+		print(f"\nNo baseline for '{args.name}' in {args.baselines}.")
+	if args.save_baseline:
+		save_baseline(args.baselines, report)
+		print(f"Saved baseline '{args.name}'.")
+
+	if args.fail_on_regression and (regressions or errors or eager):
+		return 1
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .config import ensure_dirs, get_archive_settings
+
+
+# Each pack record: magic, compressed length, crc32 of the compressed bytes
+_RECORD = struct.Struct(">4sII")
+_MAGIC = b"PMBA"
+_PACK_RE = re.compile(r"^pack-(\d{6})\.dat$")
+_LOOSE_RE = re.compile(r"^brief_(\d{8}_\d{6})(?:_([0-9a-f]{32}))?(?:_p(\d+))?\.txt$")
+
+_COLUMNS = "summary_id, created_at, profile_id, chars, sections, audio_file, source"
+
+
+def _digest(text: str) -> str:
+	return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _row(row: Sequence[Any]) -> Dict[str, Any]:
+	summary_id, created_at, profile_id, chars, sections, audio_file, source = row
+	return {
+		"summary_id": summary_id,
+		"created_at": created_at,
+		"profile_id": profile_id,
+		"chars": chars,
+		"sections": json.loads(sections),
+		"audio_file": audio_file,
+		"source": source,
+	}
+
+
+class BriefArchive:
+	"""
+	Every generated brief, looked up by summary_id. The SQLite index at
+	`index_path` maps each summary_id (and its timestamp, for paging) to a
+	zlib-compressed record in an append-only pack file under `pack_dir`;
+	a pack is closed once it reaches `pack_max_bytes`.
+
+	Appends run inside the index's write transaction, so writers in other
+	processes (CLI, scheduler, API) never interleave records. A crash after
+	the append but before the commit leaves unreferenced bytes in the pack,
+	never a reference to a missing record.
+	"""
+
+	def __init__(self, index_path: Path, pack_dir: Path, pack_max_bytes: int = 64 * 1024 * 1024) -> None:
+		self.index_path = Path(index_path)
+		self.index_path.parent.mkdir(parents=True, exist_ok=True)
+		self.pack_dir = Path(pack_dir)
+		self.pack_dir.mkdir(parents=True, exist_ok=True)
+		self.pack_max_bytes = max(1, pack_max_bytes)
+		self._lock = threading.Lock()
+		self._conn = sqlite3.connect(str(self.index_path), check_same_thread=False, isolation_level=None, timeout=30)
+		self._conn.execute("PRAGMA journal_mode=WAL")
+		self._conn.execute(
+			"""
+			CREATE TABLE IF NOT EXISTS briefs (
+				summary_id TEXT PRIMARY KEY,
+				created_at TEXT NOT NULL,
+				profile_id INTEGER,
+				chars INTEGER NOT NULL,
+				sections TEXT NOT NULL,
+				audio_file TEXT,
+				source TEXT NOT NULL,
+				digest TEXT NOT NULL,
+				pack INTEGER NOT NULL,
+				offset INTEGER NOT NULL,
+				length INTEGER NOT NULL,
+				stored_at REAL NOT NULL
+			)
+			"""
+		)
+		self._conn.execute("CREATE INDEX IF NOT EXISTS briefs_created ON briefs (created_at, summary_id)")
+		self._conn.execute("CREATE INDEX IF NOT EXISTS briefs_profile ON briefs (profile_id, created_at, summary_id)")
+
+	def _pack_path(self, number: int) -> Path:
+		return self.pack_dir / f"pack-{number:06d}.dat"
+
+	def _current_pack(self) -> int:
+		numbers = [int(m.group(1)) for m in (_PACK_RE.match(p.name) for p in self.pack_dir.iterdir()) if m]
+		if not numbers:
+			return 1
+		last = max(numbers)
+		return last + 1 if self._pack_path(last).stat().st_size >= self.pack_max_bytes else last
+
+	def _append(self, data: bytes) -> Tuple[int, int]:
+		# caller holds the index write lock
+		number = self._current_pack()
+		with self._pack_path(number).open("ab") as f:
+			offset = f.tell()
+			f.write(_RECORD.pack(_MAGIC, len(data), zlib.crc32(data)) + data)
+			f.flush()
+			os.fsync(f.fileno())
+		return number, offset
+
+	def put(
+		self,
+		summary_id: str,
+		text: str,
+		created_at: str,
+		profile_id: Optional[int] = None,
+		sections: Sequence[str] = (),
+		audio_file: Optional[str] = None,
+		source: str = "pipeline",
+	) -> bool:
+		"""
+		Archive one brief; `audio_file` is relative to SUMMARIES_DIR. Returns
+		False (and stores nothing) if `summary_id` is already archived.
+		"""
+		data = zlib.compress(text.encode("utf-8"), 6)
+		with self._lock:
+			self._conn.execute("BEGIN IMMEDIATE")
+			try:
+				if self._conn.execute("SELECT 1 FROM briefs WHERE summary_id = ?", (summary_id,)).fetchone():
+					self._conn.execute("ROLLBACK")
+					return False
+				pack, offset = self._append(data)
+				self._conn.execute(
+					"""
+					INSERT INTO briefs (summary_id, created_at, profile_id, chars, sections, audio_file, source,
+						digest, pack, offset, length, stored_at)
+					VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+					""",
+					(
+						summary_id,
+						created_at,
+						profile_id,
+						len(text),
+						json.dumps(list(sections)),
+						audio_file,
+						source,
+						_digest(text),
+						pack,
+						offset,
+						len(data),
+						time.time(),
+					),
+				)
+				self._conn.execute("COMMIT")
+			except BaseException:
+				self._conn.execute("ROLLBACK")
+				raise
+		return True
+
+	def set_audio(self, summary_id: str, audio_file: Optional[str]) -> None:
+		with self._lock:
+			self._conn.execute("UPDATE briefs SET audio_file = ? WHERE summary_id = ?", (audio_file, summary_id))
+
+	def get(self, summary_id: str, with_text: bool = True) -> Optional[Dict[str, Any]]:
+		"""
+		The archived brief (metadata, plus `text` unless `with_text` is off),
+		or None.
+		"""
+		with self._lock:
+			row = self._conn.execute(
+				f"SELECT {_COLUMNS}, pack, offset, length FROM briefs WHERE summary_id = ?", (summary_id,)
+			).fetchone()
+		if row is None:
+			return None
+		entry = _row(row[:7])
+		if with_text:
+			entry["text"] = self._read(*row[7:])
+		return entry
+
+	def _read(self, pack: int, offset: int, length: int) -> str:
+		with self._pack_path(pack).open("rb") as f:
+			f.seek(offset)
+			header = f.read(_RECORD.size)
+			data = f.read(length)
+		magic, size, crc = _RECORD.unpack(header)
+		if magic != _MAGIC or size != length or len(data) != length or zlib.crc32(data) != crc:
+			raise RuntimeError(f"Corrupt archive record at pack {pack} offset {offset}")
+		return zlib.decompress(data).decode("utf-8")
+
+	def page(
+		self,
+		limit: int = 20,
+		cursor: Optional[str] = None,
+		profile_id: Optional[int] = None,
+	) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+		"""
+		Up to `limit` briefs, newest first, without their text, and the
+		cursor for the next page (None after the last). Cursors are opaque
+		to callers; pages stay stable while new briefs are added.
+		"""
+		clauses: List[str] = []
+		params: List[Any] = []
+		if profile_id is not None:
+			clauses.append("profile_id = ?")
+			params.append(profile_id)
+		if cursor:
+			created_at, _, summary_id = cursor.partition("|")
+			clauses.append("(created_at, summary_id) < (?, ?)")
+			params += [created_at, summary_id]
+		where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+		limit = max(1, limit)
+		with self._lock:
+			rows = self._conn.execute(
+				f"SELECT {_COLUMNS} FROM briefs {where} ORDER BY created_at DESC, summary_id DESC LIMIT ?",
+				(*params, limit + 1),
+			).fetchall()
+		items = [_row(r) for r in rows[:limit]]
+		next_cursor = f"{items[-1]['created_at']}|{items[-1]['summary_id']}" if len(rows) > limit else None
+		return items, next_cursor
+
+	def has_text(self, created_at: str, text: str) -> bool:
+		"""
+		True if an identical brief from the same second is archived already.
+		"""
+		with self._lock:
+			row = self._conn.execute(
+				"SELECT 1 FROM briefs WHERE created_at = ? AND digest = ?", (created_at, _digest(text))
+			).fetchone()
+		return row is not None
+
+	def import_loose(
+		self,
+		summaries_dir: Path,
+		summary_ids: Optional[Dict[str, str]] = None,
+		remove: bool = False,
+	) -> Dict[str, int]:
+		"""
+		Archive loose `brief_<timestamp>[_<summary_id>][_p<profile>].txt`
+		files the archive does not have. Older names carry no summary_id:
+		`summary_ids` maps brief text to one (see
+		rag_store.stored_summary_ids), and briefs not found there get
+		`legacy-<file stem>`. Safe to re-run. With `remove`, each text file
+		is deleted once archived (its MP3 stays, it is still served).
+		"""
+		from .summarizer import extract_section_titles
+
+		summary_ids = summary_ids or {}
+		summaries_dir = Path(summaries_dir)
+		report = {"imported": 0, "skipped": 0, "removed": 0}
+		for path in sorted(summaries_dir.glob("brief_*.txt")):
+			match = _LOOSE_RE.match(path.name)
+			if not match:
+				continue
+			text = path.read_text(encoding="utf-8")
+			created_at = match.group(1)
+			profile_id = int(match.group(3)) if match.group(3) else None
+			mp3 = path.with_suffix(".mp3")
+			# older names carry no summary_id, so match those on their content
+			if not match.group(2) and self.has_text(created_at, text):
+				stored = False
+			else:
+				stored = self.put(
+					match.group(2) or summary_ids.get(text.strip()) or f"legacy-{path.stem}",
+					text,
+					created_at,
+					profile_id=profile_id,
+					sections=extract_section_titles(text),
+					audio_file=mp3.name if mp3.exists() else None,
+					source="import",
+				)
+			report["imported" if stored else "skipped"] += 1
+			if remove:
+				path.unlink()
+				report["removed"] += 1
+		return report
+
+	def stats(self) -> Dict[str, int]:
+		with self._lock:
+			entries, chars, stored = self._conn.execute(
+				"SELECT COUNT(*), COALESCE(SUM(chars), 0), COALESCE(SUM(length), 0) FROM briefs"
+			).fetchone()
+		packs = [p for p in self.pack_dir.iterdir() if _PACK_RE.match(p.name)]
+		return {
+			"entries": entries,
+			"chars": chars,
+			"stored_bytes": stored,
+			"packs": len(packs),
+			"pack_bytes": sum(p.stat().st_size for p in packs),
+		}
+
+	def close(self) -> None:
+		with self._lock:
+			self._conn.close()
+
+
+_archive: Optional[BriefArchive] = None
+_archive_lock = threading.Lock()
+
+
+def get_archive() -> Optional[BriefArchive]:
+	"""
+	The process-wide archive under DATA_DIR, opened on first use; None when
+	ARCHIVE_ENABLED is off.
+	"""
+	global _archive
+	settings = get_archive_settings()
+	if not settings["enabled"]:
+		return None
+	data_dir = Path(ensure_dirs()["data_dir"])
+	index_path = data_dir / "archive.sqlite3"
+	with _archive_lock:
+		if _archive is None or _archive.index_path != index_path:
+			_archive = BriefArchive(index_path, data_dir / "archive", pack_max_bytes=settings["pack_max_bytes"])
+		return _archive
+
+
+def archive_brief(
+	summary_id: str,
+	text: str,
+	created_at: str,
+	profile_id: Optional[int] = None,
+	sections: Sequence[str] = (),
+	audio_file: Optional[str] = None,
+	source: str = "pipeline",
+) -> bool:
+	"""
+	`BriefArchive.put` on the default archive. Failures are swallowed: the
+	brief's loose .txt is written regardless, and `import_loose` picks it
+	up later.
+	"""
+	try:
+		archive = get_archive()
+		if archive is None:
+			return False
+		return archive.put(summary_id, text, created_at, profile_id, sections, audio_file, source)
+	except (OSError, sqlite3.Error):
+		return False
+
+
+def archive_audio(summary_id: str, audio_file: Optional[str]) -> None:
+	"""
+	Record the brief's MP3 (relative to SUMMARIES_DIR) once it is voiced.
+	"""
+	try:
+		archive = get_archive()
+		if archive is not None:
+			archive.set_audio(summary_id, audio_file)
+	except (OSError, sqlite3.Error):
+		pass
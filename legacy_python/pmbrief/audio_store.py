@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from .metrics import register_cache
+
+
+def audio_key(provider: str, voice: str, text: str) -> str:
+	return hashlib.sha256(f"{provider}\0{voice}\0{text}".encode("utf-8")).hexdigest()
+
+
+def link_or_copy(source: Path, dest: Path) -> Path:
+	"""
+	Make `dest` a hardlink to `source` (a copy where hardlinks are not
+	possible), replacing any existing file atomically.
+	"""
+	dest = Path(dest)
+	dest.parent.mkdir(parents=True, exist_ok=True)
+	tmp = dest.with_name(f"{dest.name}.{threading.get_ident()}.tmp")
+	if tmp.exists():
+		tmp.unlink()
+	try:
+		os.link(source, tmp)
+	except OSError:
+		# cross-device or no hardlink support
+		shutil.copyfile(source, tmp)
+	os.replace(tmp, dest)
+	return dest
+
+
+class AudioStore:
+	"""
+	Content-addressed MP3 blobs under `root/<aa>/<key>.mp3`, keyed by
+	`audio_key(provider, voice, text)`. Callers hardlink blobs to their own
+	file names, so evicting a blob never breaks a brief that uses it. Blobs
+	past `max_bytes` are evicted least-recently-used first. The SQLite index
+	lives at `index_path`, outside `root`, which may be publicly served.
+	"""
+
+	def __init__(self, root: Path, index_path: Path, max_bytes: int) -> None:
+		self.root = Path(root)
+		self.root.mkdir(parents=True, exist_ok=True)
+		self.index_path = Path(index_path)
+		self.index_path.parent.mkdir(parents=True, exist_ok=True)
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+		self._lock = threading.Lock()
+		self._conn = sqlite3.connect(str(self.index_path), check_same_thread=False, isolation_level=None)
+		self._conn.execute("PRAGMA journal_mode=WAL")
+		self._conn.execute(
+			"""
+			CREATE TABLE IF NOT EXISTS blobs (
+				key TEXT PRIMARY KEY,
+				bytes INTEGER NOT NULL,
+				last_used REAL NOT NULL
+			)
+			"""
+		)
+		self._conn.execute("CREATE INDEX IF NOT EXISTS blobs_last_used ON blobs (last_used)")
+
+	def path_for(self, key: str) -> Path:
+		return self.root / key[:2] / f"{key}.mp3"
+
+	def url_for(self, key: str, mount: Path) -> str:
+		"""
+		URL of the blob under the /audio static mount rooted at `mount`.
+		"""
+		return "/audio/" + self.path_for(key).relative_to(mount).as_posix()
+
+	def link(self, key: str, dest: Path) -> bool:
+		"""
+		Hardlink (or copy) the blob for `key` to `dest`. This runs under the
+		lock `evict` takes, so the blob cannot vanish halfway; False (a miss)
+		if there is none.
+		"""
+		found = self._link(key, dest)
+		with self._lock:
+			if found:
+				self.hits += 1
+			else:
+				self.misses += 1
+		return found
+
+	def _link(self, key: str, dest: Path) -> bool:
+		with self._lock:
+			try:
+				link_or_copy(self.path_for(key), dest)
+			except FileNotFoundError:
+				self._conn.execute("DELETE FROM blobs WHERE key = ?", (key,))
+				return False
+			self._conn.execute("UPDATE blobs SET last_used = ? WHERE key = ?", (time.time(), key))
+		return True
+
+	def put(self, key: str, data: bytes) -> Path:
+		path = self.path_for(key)
+		path.parent.mkdir(parents=True, exist_ok=True)
+		tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+		tmp.write_bytes(data)
+		os.replace(tmp, path)
+		with self._lock:
+			self._conn.execute(
+				"INSERT OR REPLACE INTO blobs (key, bytes, last_used) VALUES (?, ?, ?)",
+				(key, len(data), time.time()),
+			)
+		self.evict()
+		return path
+
+	def put_file(self, key: str, source: Path) -> Path:
+		path = link_or_copy(source, self.path_for(key))
+		with self._lock:
+			self._conn.execute(
+				"INSERT OR REPLACE INTO blobs (key, bytes, last_used) VALUES (?, ?, ?)",
+				(key, path.stat().st_size, time.time()),
+			)
+		self.evict()
+		return path
+
+	def link_or_create(self, key: str, produce: Callable[[], bytes], dest: Path) -> Path:
+		"""
+		`link` the blob for `key` to `dest`, storing `produce()` first on a miss.
+		"""
+		if not self.link(key, dest):
+			data = produce()
+			self.put(key, data)
+			if not self._link(key, dest):
+				# evicted straight away (larger than max_bytes on its own)
+				Path(dest).write_bytes(data)
+		return Path(dest)
+
+	def evict(self) -> int:
+		with self._lock:
+			total = self._conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM blobs").fetchone()[0]
+			if total <= self.max_bytes:
+				return 0
+			removed = 0
+			for key, size in self._conn.execute("SELECT key, bytes FROM blobs ORDER BY last_used ASC").fetchall():
+				if total <= self.max_bytes:
+					break
+				try:
+					self.path_for(key).unlink()
+				except FileNotFoundError:
+					pass
+				self._conn.execute("DELETE FROM blobs WHERE key = ?", (key,))
+				total -= size
+				removed += 1
+			return removed
+
+	def stats(self) -> Dict[str, int]:
+		with self._lock:
+			entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM blobs").fetchone()
+			return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+
+_store: Optional[AudioStore] = None
+_store_lock = threading.Lock()
+
+
+def get_audio_store(root: Path, index_path: Path, max_bytes: int) -> AudioStore:
+	"""
+	Return the process-wide store, opening it on first use.
+	"""
+	global _store
+	with _store_lock:
+		if _store is None or _store.root != Path(root):
+			_store = AudioStore(root, index_path, max_bytes=max_bytes)
+			register_cache("audio", _store.stats)
+		return _store
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .audio_store import link_or_copy
+from .metrics import register_cache
+
+
+def brief_key(model: str, interests: Sequence[str], articles: Sequence[Dict], target_words: int) -> str:
+	"""
+	sha256 over the model, normalized interests (case/whitespace/order
+	insensitive), the selected articles' URLs and publish times, and the
+	target length.
+	"""
+	normalized = sorted({" ".join(i.lower().split()) for i in interests if i.strip()})
+	payload = {
+		"model": model,
+		"interests": normalized,
+		"articles": [[a.get("url") or "", a.get("publishedAt") or ""] for a in articles],
+		"target_words": target_words,
+	}
+	return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def rag_digest(docs: Sequence[Any]) -> str:
+	"""
+	sha256 of the retrieved RAG documents' texts (langchain Documents), in order.
+	"""
+	h = hashlib.sha256()
+	for doc in docs:
+		h.update(doc.page_content.encode("utf-8"))
+		h.update(b"\0")
+	return h.hexdigest()
+
+
+class BriefCache:
+	"""
+	Generated briefs keyed by `brief_key`, with the RAG context digest
+	checked on lookup. Text lives in SQLite; audio is linked into
+	`audio_dir` (so it stays servable after the original files are gone).
+	Entries expire after `ttl_seconds`, and the least recently used are
+	evicted once text plus audio exceed `max_bytes`.
+	"""
+
+	def __init__(self, path: Path, audio_dir: Path, ttl_seconds: float, max_bytes: int) -> None:
+		self.path = Path(path)
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		self.audio_dir = Path(audio_dir)
+		self.audio_dir.mkdir(parents=True, exist_ok=True)
+		self.ttl = ttl_seconds
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+		self._lock = threading.Lock()
+		self._key_locks: Dict[str, Tuple[threading.Lock, int]] = {}
+		self._akey_locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+		self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+		self._conn.execute("PRAGMA journal_mode=WAL")
+		self._conn.execute(
+			"""
+			CREATE TABLE IF NOT EXISTS briefs (
+				key TEXT PRIMARY KEY,
+				rag_digest TEXT NOT NULL,
+				summary_id TEXT NOT NULL,
+				text TEXT NOT NULL,
+				sections TEXT NOT NULL,
+				audio_file TEXT,
+				bytes INTEGER NOT NULL,
+				expires_at REAL NOT NULL,
+				last_used REAL NOT NULL
+			)
+			"""
+		)
+		self._conn.execute("CREATE INDEX IF NOT EXISTS briefs_last_used ON briefs (last_used)")
+
+	@contextmanager
+	def claim(self, key: str) -> Iterator[None]:
+		"""
+		Serialize work on one key, so a retry arriving while the first request
+		is still generating waits and then hits instead of generating again.
+		"""
+		with self._lock:
+			lock, users = self._key_locks.get(key, (threading.Lock(), 0))
+			self._key_locks[key] = (lock, users + 1)
+		try:
+			with lock:
+				yield
+		finally:
+			with self._lock:
+				lock, users = self._key_locks[key]
+				if users <= 1:
+					del self._key_locks[key]
+				else:
+					self._key_locks[key] = (lock, users - 1)
+
+	@asynccontextmanager
+	async def aclaim(self, key: str) -> AsyncIterator[None]:
+		"""
+		`claim` for coroutines in one event loop. It does not exclude threads
+		holding `claim` on the same key; at worst both generate.
+		"""
+		with self._lock:
+			lock, users = self._akey_locks.get(key, (asyncio.Lock(), 0))
+			self._akey_locks[key] = (lock, users + 1)
+		try:
+			async with lock:
+				yield
+		finally:
+			with self._lock:
+				lock, users = self._akey_locks[key]
+				if users <= 1:
+					del self._akey_locks[key]
+				else:
+					self._akey_locks[key] = (lock, users - 1)
+
+	def get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+		"""
+		The unexpired entry for `key` (without touching hit counters), or None.
+		"""
+		with self._lock:
+			row = self._conn.execute(
+				"SELECT rag_digest, summary_id, text, sections, audio_file, expires_at FROM briefs WHERE key = ?",
+				(key,),
+			).fetchone()
+		if row is None or row[5] <= time.time():
+			return None
+		audio_file = row[4] if row[4] and (self.audio_dir / row[4]).exists() else None
+		return {
+			"rag_digest": row[0],
+			"summary_id": row[1],
+			"text": row[2],
+			"sections": json.loads(row[3]),
+			"audio_file": audio_file,
+		}
+
+	def record(self, key: str, hit: bool) -> None:
+		with self._lock:
+			if hit:
+				self.hits += 1
+				self._conn.execute("UPDATE briefs SET last_used = ? WHERE key = ?", (time.time(), key))
+			else:
+				self.misses += 1
+
+	def _link_audio(self, key: str, source: Path) -> str:
+		name = f"{key}.mp3"
+		link_or_copy(source, self.audio_dir / name)
+		return name
+
+	def put(
+		self,
+		key: str,
+		digest: str,
+		summary_id: str,
+		text: str,
+		sections: List[str],
+		audio_path: Optional[Path] = None,
+	) -> Optional[str]:
+		"""
+		Store (or replace) the entry for `key`; returns the cached audio file name.
+		"""
+		audio_file = self._link_audio(key, Path(audio_path)) if audio_path and Path(audio_path).exists() else None
+		size = len(text.encode("utf-8")) + ((self.audio_dir / audio_file).stat().st_size if audio_file else 0)
+		now = time.time()
+		with self._lock:
+			self._conn.execute(
+				"""
+				INSERT OR REPLACE INTO briefs
+					(key, rag_digest, summary_id, text, sections, audio_file, bytes, expires_at, last_used)
+				VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+				""",
+				(key, digest, summary_id, text, json.dumps(sections), audio_file, size, now + self.ttl, now),
+			)
+		self.evict()
+		return audio_file
+
+	def _drop(self, rows: Sequence[tuple]) -> int:
+		for key, audio_file in rows:
+			self._conn.execute("DELETE FROM briefs WHERE key = ?", (key,))
+			if audio_file:
+				try:
+					(self.audio_dir / audio_file).unlink()
+				except FileNotFoundError:
+					pass
+		return len(rows)
+
+	def evict(self) -> int:
+		"""
+		Drop expired entries, then least recently used ones until under quota.
+		"""
+		with self._lock:
+			removed = self._drop(
+				self._conn.execute("SELECT key, audio_file FROM briefs WHERE expires_at <= ?", (time.time(),)).fetchall()
+			)
+			total = self._conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM briefs").fetchone()[0]
+			if total <= self.max_bytes:
+				return removed
+			victims = []
+			for key, audio_file, size in self._conn.execute(
+				"SELECT key, audio_file, bytes FROM briefs ORDER BY last_used ASC"
+			).fetchall():
+				if total <= self.max_bytes:
+					break
+				victims.append((key, audio_file))
+				total -= size
+			return removed + self._drop(victims)
+
+	def stats(self) -> Dict[str, int]:
+		with self._lock:
+			entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM briefs").fetchone()
+			return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+
+_cache: Optional[BriefCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_brief_cache(path: Path, audio_dir: Path, ttl_seconds: float, max_bytes: int) -> BriefCache:
+	"""
+	Return the process-wide cache, opening it on first use.
+	"""
+	global _cache
+	with _cache_lock:
+		if _cache is None or _cache.path != Path(path):
+			_cache = BriefCache(path, audio_dir, ttl_seconds=ttl_seconds, max_bytes=max_bytes)
+			register_cache("brief", _cache.stats)
+		return _cache
@@ -1,3 +1,4 @@
+import logging
 import os
 from pathlib import Path
 from typing import Optional
@@ -10,6 +11,20 @@ def load_env() -> None:
 	load_dotenv(override=False)
 
 
+def configure_logging() -> None:
+	"""
+	Send pmbrief's log records (e.g. each prompt's token breakdown) to
+	stderr at LOG_LEVEL, unless the host application already set up logging.
+	"""
+	logger = logging.getLogger("pmbrief")
+	level = (get_env_str("LOG_LEVEL", "INFO") or "INFO").upper()
+	logger.setLevel(level if isinstance(logging.getLevelName(level), int) else logging.INFO)
+	if not logger.handlers and not logging.getLogger().handlers:
+		handler = logging.StreamHandler()
+		handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+		logger.addHandler(handler)
+
+
 def get_env_str(name: str, default: Optional[str] = None) -> Optional[str]:
 	val = os.getenv(name)
 	if val is None or val == "":
@@ -60,3 +75,177 @@ def get_generation_settings() -> dict:
 		"brief_target_words": int(get_env_str("BRIEF_TARGET_WORDS", "1200") or "1200"),
 	}
 
+
+def get_fetch_settings() -> dict:
+	return {
+		"concurrency": max(1, int(get_env_str("NEWS_FETCH_CONCURRENCY", "4") or "4")),
+		"requests_per_minute": float(get_env_str("NEWSAPI_REQUESTS_PER_MINUTE", "60") or "60"),
+		"burst": max(1, int(get_env_str("NEWSAPI_BURST", "5") or "5")),
+		"max_retries": max(0, int(get_env_str("NEWSAPI_MAX_RETRIES", "2") or "2")),
+		"near_dup": get_bool("NEWS_NEAR_DUP", True),
+		# dedupe.MAX_NEAR_DUP_DISTANCE: 64-bit SimHash in at most 16 bands
+		"near_dup_distance": min(15, max(0, int(get_env_str("NEWS_NEAR_DUP_DISTANCE", "6") or "6"))),
+	}
+
+
+def get_http_settings() -> dict:
+	return {
+		# per upstream host: each service (NewsAPI, Gemini) has its own pool
+		"max_connections": max(1, int(get_env_str("HTTP_MAX_CONNECTIONS_PER_HOST", "50") or "50")),
+		"max_keepalive": max(0, int(get_env_str("HTTP_MAX_KEEPALIVE_PER_HOST", "20") or "20")),
+		"keepalive_seconds": float(get_env_str("HTTP_KEEPALIVE_SECONDS", "30") or "30"),
+		"timeout": float(get_env_str("HTTP_TIMEOUT_SECONDS", "60") or "60"),
+	}
+
+
+def get_embedding_settings() -> dict:
+	return {
+		# Gemini accepts at most 100 contents per batchEmbedContents request
+		"batch_size": min(100, max(1, int(get_env_str("EMBED_BATCH_SIZE", "100") or "100"))),
+		"concurrency": max(1, int(get_env_str("EMBED_CONCURRENCY", "4") or "4")),
+	}
+
+
+def get_embedding_cache_settings() -> dict:
+	return {
+		"enabled": get_bool("EMBEDDING_CACHE_ENABLED", True),
+		"max_entries": max(1, int(get_env_str("EMBEDDING_CACHE_MAX_ENTRIES", "50000") or "50000")),
+	}
+
+
+def rag_flush_interval() -> float:
+	return max(0.5, float(get_env_str("RAG_FLUSH_INTERVAL_SECONDS", "30") or "30"))
+
+
+def get_rag_retention_settings() -> dict:
+	return {
+		"retention_days": max(0.0, float(get_env_str("RAG_RETENTION_DAYS", "90") or "90")),
+		"hot_days": max(0.0, float(get_env_str("RAG_HOT_DAYS", "14") or "14")),
+		"compact_interval_hours": max(0.0, float(get_env_str("RAG_COMPACT_INTERVAL_HOURS", "24") or "24")),
+		"rollup_feedback": get_bool("RAG_ROLLUP_FEEDBACK", True),
+	}
+
+
+def get_rag_snapshot_settings() -> dict:
+	return {
+		"keep": max(1, int(get_env_str("RAG_SNAPSHOT_KEEP", "2") or "2")),
+		"refresh_seconds": max(0.0, float(get_env_str("RAG_REFRESH_SECONDS", "2") or "2")),
+	}
+
+
+def get_feedback_settings() -> dict:
+	return {
+		"batch_size": max(1, int(get_env_str("FEEDBACK_BATCH_SIZE", "32") or "32")),
+		"max_delay": max(0.1, float(get_env_str("FEEDBACK_FLUSH_SECONDS", "5") or "5")),
+		"max_attempts": max(1, int(get_env_str("FEEDBACK_MAX_ATTEMPTS", "5") or "5")),
+	}
+
+
+def get_db_pool_settings() -> dict:
+	return {
+		"pool_size": max(1, int(get_env_str("DB_POOL_SIZE", "5") or "5")),
+		"max_overflow": max(0, int(get_env_str("DB_MAX_OVERFLOW", "10") or "10")),
+		"pool_timeout": float(get_env_str("DB_POOL_TIMEOUT", "30") or "30"),
+		"pool_recycle": int(get_env_str("DB_POOL_RECYCLE", "1800") or "1800"),
+	}
+
+
+def get_news_cache_settings() -> dict:
+	return {
+		"enabled": get_bool("NEWS_CACHE_ENABLED", True),
+		"ttl_seconds": float(get_env_str("NEWS_CACHE_TTL_SECONDS", "900") or "900"),
+		"bucket_minutes": max(1, int(get_env_str("NEWS_CACHE_BUCKET_MINUTES", "15") or "15")),
+		"memory_entries": max(1, int(get_env_str("NEWS_CACHE_MEMORY_ENTRIES", "256") or "256")),
+	}
+
+
+def get_brief_cache_settings() -> dict:
+	return {
+		"enabled": get_bool("BRIEF_CACHE_ENABLED", True),
+		"ttl_seconds": float(get_env_str("BRIEF_CACHE_TTL_SECONDS", "21600") or "21600"),
+		"max_bytes": int(float(get_env_str("BRIEF_CACHE_MAX_MB", "200") or "200") * 1024 * 1024),
+	}
+
+
+def get_tts_settings() -> dict:
+	return {
+		"workers": max(1, int(get_env_str("TTS_WORKERS", "3") or "3")),
+		"segment_min_chars": max(1, int(get_env_str("TTS_SEGMENT_MIN_CHARS", "200") or "200")),
+		"segment_max_chars": max(1, int(get_env_str("TTS_SEGMENT_MAX_CHARS", "1500") or "1500")),
+		# Cloud TTS rejects requests over 5000 bytes of input
+		"chunk_chars": max(100, int(get_env_str("TTS_CHUNK_CHARS", "1500") or "1500")),
+		"hls": get_bool("TTS_HLS_ENABLED", False),
+	}
+
+
+def get_audio_store_settings() -> dict:
+	return {
+		"enabled": get_bool("AUDIO_STORE_ENABLED", True),
+		"max_bytes": int(float(get_env_str("AUDIO_STORE_MAX_MB", "500") or "500") * 1024 * 1024),
+	}
+
+
+def get_audio_delivery_settings() -> dict:
+	return {
+		# for MP3s; playlists and manifests change while a brief is voiced
+		"max_age": max(0, int(get_env_str("AUDIO_CACHE_MAX_AGE_SECONDS", "86400") or "86400")),
+	}
+
+
+def get_archive_settings() -> dict:
+	return {
+		"enabled": get_bool("ARCHIVE_ENABLED", True),
+		"pack_max_bytes": max(1, int(float(get_env_str("ARCHIVE_PACK_MAX_MB", "64") or "64") * 1024 * 1024)),
+	}
+
+
+def get_job_settings() -> dict:
+	return {
+		"workers": max(1, int(get_env_str("JOB_WORKERS", "2") or "2")),
+		"max_depth": max(1, int(get_env_str("JOB_QUEUE_DEPTH", "32") or "32")),
+		"timeout": float(get_env_str("JOB_TIMEOUT_SECONDS", "300") or "300"),
+		"result_ttl": float(get_env_str("JOB_RESULT_TTL_SECONDS", "3600") or "3600"),
+		"store": (get_env_str("JOB_STORE", "memory") or "memory").lower(),
+	}
+
+
+def get_scheduler_settings() -> dict:
+	return {
+		"default_delivery_time": get_env_str("DEFAULT_DELIVERY_TIME", "07:00") or "07:00",
+		"timezone": get_env_str("SCHEDULER_TIMEZONE", "UTC") or "UTC",
+		"lead_minutes": float(get_env_str("SCHEDULER_LEAD_MINUTES", "30") or "30"),
+		"batch_minutes": float(get_env_str("SCHEDULER_BATCH_MINUTES", "15") or "15"),
+		"workers": max(1, int(get_env_str("SCHEDULER_WORKERS", "4") or "4")),
+		"poll_seconds": max(5.0, float(get_env_str("SCHEDULER_POLL_SECONDS", "300") or "300")),
+	}
+
+
+def get_ranking_settings() -> dict:
+	return {
+		"enabled": get_bool("ARTICLE_RANKING", True),
+		"candidates": max(1, int(get_env_str("ARTICLE_CANDIDATES", "100") or "100")),
+		"per_interest_quota": max(0, int(get_env_str("ARTICLE_INTEREST_QUOTA", "1") or "1")),
+		"mmr_lambda": float(get_env_str("ARTICLE_MMR_LAMBDA", "0.7") or "0.7"),
+		"like_weight": float(get_env_str("ARTICLE_LIKE_WEIGHT", "0.3") or "0.3"),
+	}
+
+
+def get_prompt_settings() -> dict:
+	return {
+		"token_budget": max(500, int(get_env_str("PROMPT_TOKEN_BUDGET", "8000") or "8000")),
+		"article_share": min(1.0, max(0.0, float(get_env_str("PROMPT_ARTICLE_SHARE", "0.7") or "0.7"))),
+		"desc_chars": max(0, int(get_env_str("PROMPT_DESC_CHARS", "300") or "300")),
+		"rag_doc_tokens": max(0, int(get_env_str("PROMPT_RAG_DOC_TOKENS", "400") or "400")),
+	}
+
+
+def get_retrieval_settings() -> dict:
+	max_age_days = float(get_env_str("RAG_MAX_AGE_DAYS", "0") or "0")
+	return {
+		"k_by_type": {
+			"summary": max(0, int(get_env_str("RAG_K_SUMMARY", "3") or "3")),
+			"feedback": max(0, int(get_env_str("RAG_K_FEEDBACK", "3") or "3")),
+		},
+		"half_life_hours": float(get_env_str("RAG_HALF_LIFE_HOURS", "72") or "72") or None,
+		"max_age_hours": max_age_days * 24 if max_age_days > 0 else None,
+	}
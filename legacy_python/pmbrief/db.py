@@ -1,32 +1,92 @@
 from __future__ import annotations
 
 import json
+import threading
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
-from sqlalchemy import (
-	TEXT,
-	TIMESTAMP,
-	Integer,
-	String,
-	create_engine,
-	text as sql_text,
-)
-from sqlalchemy.exc import SQLAlchemyError
+from .config import ensure_dirs, get_db_pool_settings, get_env_str
 
-from .config import get_env_str, ensure_dirs
+
+_engine = None
+_engine_url: Optional[str] = None
+_engine_lock = threading.Lock()
+
+
+# SQLAlchemy is only imported once a database is configured; without one
+# every call below takes the JSON fallback and never needs it
+def sql_text(statement: str):
+	from sqlalchemy import text
+
+	return text(statement)
+
+
+def _db_error() -> type:
+	from sqlalchemy.exc import SQLAlchemyError
+
+	return SQLAlchemyError
 
 
 def get_engine():
+	"""
+	Process-wide engine for DATABASE_URL, built on first use so every caller
+	shares one connection pool. Returns None when no database is configured.
+	"""
+	global _engine, _engine_url
 	db_url = get_env_str("DATABASE_URL")
 	if not db_url:
 		return None
-	try:
-		engine = create_engine(db_url, pool_pre_ping=True)
-		return engine
-	except Exception:
-		return None
+	with _engine_lock:
+		if _engine is not None and _engine_url == db_url:
+			return _engine
+		if _engine is not None:
+			_engine.dispose()
+			_engine = None
+		settings = get_db_pool_settings()
+		try:
+			from sqlalchemy import create_engine
+
+			try:
+				engine = create_engine(
+					db_url,
+					pool_pre_ping=True,
+					pool_size=settings["pool_size"],
+					max_overflow=settings["max_overflow"],
+					pool_timeout=settings["pool_timeout"],
+					pool_recycle=settings["pool_recycle"],
+				)
+			except TypeError:
+				# Dialects without a QueuePool (e.g. in-memory SQLite) reject sizing args
+				engine = create_engine(db_url, pool_pre_ping=True)
+		except Exception:
+			return None
+		_engine = engine
+		_engine_url = db_url
+		return _engine
+
+
+def dispose_engine() -> None:
+	global _engine, _engine_url
+	with _engine_lock:
+		if _engine is not None:
+			_engine.dispose()
+		_engine = None
+		_engine_url = None
+
+
+def pool_stats() -> Dict[str, Any]:
+	with _engine_lock:
+		engine = _engine
+	if engine is None:
+		return {"configured": bool(get_env_str("DATABASE_URL")), "engine": False}
+	pool = engine.pool
+	stats: Dict[str, Any] = {"configured": True, "engine": True, "pool": type(pool).__name__}
+	for name in ("size", "checkedin", "checkedout", "overflow"):
+		fn = getattr(pool, name, None)
+		if callable(fn):
+			stats[name] = fn()
+	return stats
 
 
 def init_db(engine) -> None:
@@ -40,6 +100,8 @@ def init_db(engine) -> None:
 					CREATE TABLE IF NOT EXISTS user_profile (
 						id INTEGER PRIMARY KEY,
 						interests TEXT,
+						delivery_time TEXT,
+						timezone TEXT,
 						created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 					)
 					"""
@@ -59,9 +121,21 @@ def init_db(engine) -> None:
 					"""
 				)
 			)
-	except SQLAlchemyError:
+	except _db_error():
 		# Fail silently; app will fallback to JSON
 		pass
+	try:
+		from sqlalchemy import inspect
+
+		# Tables created before scheduling existed lack these columns; plain
+		# ADD COLUMN, as SQLite has no IF NOT EXISTS for it
+		existing = {c["name"] for c in inspect(engine).get_columns("user_profile")}
+		with engine.begin() as conn:
+			for column in ("delivery_time", "timezone"):
+				if column not in existing:
+					conn.execute(sql_text(f"ALTER TABLE user_profile ADD COLUMN {column} TEXT"))
+	except _db_error():
+		pass
 
 
 # -------- JSON fallback paths --------
@@ -70,6 +144,11 @@ def _profile_path() -> Path:
 	return Path(dirs["data_dir"]) / "profile.json"
 
 
+def _profiles_path() -> Path:
+	dirs = ensure_dirs()
+	return Path(dirs["data_dir"]) / "profiles.json"
+
+
 def _feedback_path() -> Path:
 	dirs = ensure_dirs()
 	return Path(dirs["data_dir"]) / "feedback.jsonl"
@@ -87,7 +166,7 @@ def load_profile() -> Dict[str, Any]:
 				if row:
 					interests = json.loads(row[1]) if row[1] else []
 					return {"id": 1, "interests": interests}
-		except SQLAlchemyError:
+		except _db_error():
 			pass
 	# JSON fallback
 	path = _profile_path()
@@ -99,6 +178,52 @@ def load_profile() -> Dict[str, Any]:
 	return {"id": 1, "interests": []}
 
 
+def load_profiles() -> List[Dict[str, Any]]:
+	"""
+	Every profile with its interests, `delivery_time` ("HH:MM") and
+	`timezone` (IANA name); the latter two are None when unset.
+	JSON fallback: a list of such objects in profiles.json, else profile.json.
+	"""
+	engine = get_engine()
+	if engine:
+		try:
+			with engine.begin() as conn:
+				rows = conn.execute(
+					sql_text("SELECT id, interests, delivery_time, timezone FROM user_profile ORDER BY id")
+				).all()
+				return [
+					{
+						"id": row[0],
+						"interests": json.loads(row[1]) if row[1] else [],
+						"delivery_time": row[2],
+						"timezone": row[3],
+					}
+					for row in rows
+				]
+		except _db_error():
+			pass
+	# JSON fallback
+	path = _profiles_path()
+	if path.exists():
+		try:
+			data = json.loads(path.read_text(encoding="utf-8"))
+			return [
+				{
+					"id": p.get("id"),
+					"interests": p.get("interests", []),
+					"delivery_time": p.get("delivery_time"),
+					"timezone": p.get("timezone"),
+				}
+				for p in data
+			]
+		except Exception:
+			pass
+	profile = load_profile()
+	profile.setdefault("delivery_time", None)
+	profile.setdefault("timezone", None)
+	return [profile]
+
+
 def save_profile(interests: List[str]) -> None:
 	engine = get_engine()
 	if engine:
@@ -115,7 +240,7 @@ def save_profile(interests: List[str]) -> None:
 					{"interests": json.dumps(interests)},
 				)
 				return
-		except SQLAlchemyError:
+		except _db_error():
 			pass
 	# JSON fallback
 	path = _profile_path()
@@ -147,7 +272,7 @@ def save_feedback(rating: Optional[int], likes: str, dislikes: str, summary_id:
 					},
 				)
 				return
-		except SQLAlchemyError:
+		except _db_error():
 			pass
 	# JSON fallback (append line-delimited JSON)
 	path = _feedback_path()
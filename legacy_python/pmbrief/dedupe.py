@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+
+
+_TRACKING_PARAMS = {
+	"fbclid",
+	"gclid",
+	"dclid",
+	"msclkid",
+	"mc_cid",
+	"mc_eid",
+	"cmpid",
+	"ocid",
+	"smid",
+	"taid",
+	"ito",
+	"guccounter",
+	"ref",
+	"ref_src",
+	"src",
+	"mod",
+	"output",
+}
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# 64-bit fingerprints split into at most 16 bands of 4 bits, so the banding
+# guarantee below only holds up to 15 differing bits
+MAX_NEAR_DUP_DISTANCE = 15
+_BIT_SHIFTS = np.arange(64, dtype=np.uint64)
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def canonical_url(url: str) -> str:
+	"""
+	Normalize a URL so tracking/AMP/mobile variants of a page compare equal.
+	"""
+	try:
+		parts = urlsplit(url.strip())
+	except ValueError:
+		return url
+	host = parts.netloc.lower()
+	for prefix in ("www.", "m.", "amp."):
+		if host.startswith(prefix):
+			host = host[len(prefix) :]
+	path = re.sub(r"/(amp|amp\.html)/?$", "", parts.path) or "/"
+	path = path.rstrip("/") or "/"
+	query = [
+		(k, v)
+		for k, v in parse_qsl(parts.query, keep_blank_values=True)
+		if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+	]
+	return urlunsplit(("https", host, path, urlencode(sorted(query)), ""))
+
+
+def _tokens(text: str) -> List[str]:
+	words = _WORD_RE.findall(text.lower())
+	return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def simhash_fingerprints(texts: Sequence[str]) -> np.ndarray:
+	"""
+	64-bit SimHash per text over word unigrams and bigrams (uint64 array).
+	Token hashes are computed once per distinct token.
+	"""
+	token_hash: Dict[str, int] = {}
+	prints = np.zeros(len(texts), dtype=np.uint64)
+	for i, text in enumerate(texts):
+		toks = _tokens(text)
+		if not toks:
+			continue
+		hashes = np.empty(len(toks), dtype=np.uint64)
+		for j, tok in enumerate(toks):
+			h = token_hash.get(tok)
+			if h is None:
+				h = int.from_bytes(hashlib.blake2b(tok.encode("utf-8"), digest_size=8).digest(), "little")
+				token_hash[tok] = h
+			hashes[j] = h
+		bits = ((hashes[:, None] >> _BIT_SHIFTS) & np.uint64(1)).astype(np.int32)
+		votes = (2 * bits - 1).sum(axis=0)
+		prints[i] = np.sum((votes > 0).astype(np.uint64) << _BIT_SHIFTS, dtype=np.uint64)
+	return prints
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+	return _POPCOUNT_TABLE[values.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+class _UnionFind:
+	def __init__(self, n: int) -> None:
+		self.parent = list(range(n))
+
+	def find(self, i: int) -> int:
+		while self.parent[i] != i:
+			self.parent[i] = self.parent[self.parent[i]]
+			i = self.parent[i]
+		return i
+
+	def union(self, a: int, b: int) -> None:
+		ra, rb = self.find(a), self.find(b)
+		if ra != rb:
+			# keep the lower (earlier, i.e. preferred) index as root
+			self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def cluster_near_duplicates(articles: List[Dict], max_distance: int = 6) -> List[Dict]:
+	"""
+	Collapse articles with the same canonical URL or near-identical
+	title+description (SimHash Hamming distance <= max_distance).
+	Candidate pairs come from banded buckets: with max_distance + 1 bands,
+	any two fingerprints within the distance share at least one band exactly,
+	so only bucket-mates are compared. That needs max_distance <=
+	MAX_NEAR_DUP_DISTANCE; larger values raise ValueError. Input order is
+	preference order; each cluster keeps its first article, with the rest
+	listed under `alternates`.
+	"""
+	if max_distance > MAX_NEAR_DUP_DISTANCE:
+		raise ValueError(f"max_distance must be at most {MAX_NEAR_DUP_DISTANCE}, got {max_distance}")
+	n = len(articles)
+	if n < 2:
+		return list(articles)
+	uf = _UnionFind(n)
+
+	seen_urls: Dict[str, int] = {}
+	for i, art in enumerate(articles):
+		key = canonical_url(art.get("url") or "")
+		if key in seen_urls:
+			uf.union(seen_urls[key], i)
+		else:
+			seen_urls[key] = i
+
+	texts = [f"{a.get('title') or ''} {a.get('description') or ''}" for a in articles]
+	prints = simhash_fingerprints(texts)
+	has_text = np.array([bool(_WORD_RE.search(t.lower())) for t in texts])
+
+	bands = max(1, max_distance + 1)
+	width = 64 // bands
+	mask = np.uint64((1 << width) - 1)
+	for b in range(bands):
+		keys = (prints >> np.uint64(b * width)) & mask
+		buckets: Dict[int, List[int]] = {}
+		for i in np.flatnonzero(has_text):
+			buckets.setdefault(int(keys[i]), []).append(int(i))
+		for members in buckets.values():
+			if len(members) < 2:
+				continue
+			idx = np.array(members)
+			group = prints[idx]
+			dist = _popcount(np.bitwise_xor(group[:, None], group[None, :]).ravel()).reshape(len(idx), len(idx))
+			rows, cols = np.nonzero(np.triu(dist <= max_distance, k=1))
+			for r, c in zip(rows, cols):
+				uf.union(int(idx[r]), int(idx[c]))
+
+	clusters: Dict[int, List[int]] = {}
+	for i in range(n):
+		clusters.setdefault(uf.find(i), []).append(i)
+
+	result: List[Dict] = []
+	for root in sorted(clusters):
+		members = clusters[root]
+		rep = dict(articles[members[0]])
+		if len(members) > 1:
+			rep["alternates"] = [
+				{"source": articles[j].get("source"), "url": articles[j].get("url")} for j in members[1:]
+			]
+		result.append(rep)
+	return result
+
+
+def source_names(article: Dict, limit: Optional[int] = None) -> List[str]:
+	names: List[str] = []
+	for alt in article.get("alternates") or []:
+		name = alt.get("source")
+		if name and name != article.get("source") and name not in names:
+			names.append(name)
+	return names[:limit] if limit is not None else names
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+from .metrics import register_cache
+
+if TYPE_CHECKING:
+	from langchain_core.embeddings import Embeddings
+
+
+def cache_key(model: str, text: str) -> str:
+	return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _pack(vector: Sequence[float]) -> bytes:
+	return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+	arr = array("f")
+	arr.frombytes(blob)
+	return arr.tolist()
+
+
+class EmbeddingCache:
+	"""
+	SQLite-backed embedding store keyed by sha256(model, text).
+	Entries past `max_entries` are evicted least-recently-used first.
+	"""
+
+	def __init__(self, path: Path, max_entries: int = 50000) -> None:
+		self.path = Path(path)
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		self.max_entries = max_entries
+		self.hits = 0
+		self.misses = 0
+		self._lock = threading.Lock()
+		self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+		self._conn.execute("PRAGMA journal_mode=WAL")
+		self._conn.execute(
+			"""
+			CREATE TABLE IF NOT EXISTS embeddings (
+				key TEXT PRIMARY KEY,
+				vector BLOB NOT NULL,
+				last_used REAL NOT NULL
+			)
+			"""
+		)
+		self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+	def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+		found: Dict[str, List[float]] = {}
+		unique = list(dict.fromkeys(keys))
+		if not unique:
+			return found
+		with self._lock:
+			# Stay under SQLite's bound-parameter limit
+			for i in range(0, len(unique), 500):
+				chunk = unique[i : i + 500]
+				marks = ",".join("?" for _ in chunk)
+				rows = self._conn.execute(
+					f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", chunk
+				).fetchall()
+				for key, blob in rows:
+					found[key] = _unpack(blob)
+			if found:
+				now = time.time()
+				self._conn.executemany(
+					"UPDATE embeddings SET last_used = ? WHERE key = ?",
+					[(now, k) for k in found],
+				)
+			self.hits += sum(1 for k in keys if k in found)
+			self.misses += sum(1 for k in keys if k not in found)
+		return found
+
+	def put_many(self, items: Dict[str, Sequence[float]]) -> None:
+		if not items:
+			return
+		now = time.time()
+		with self._lock:
+			self._conn.execute("BEGIN")
+			try:
+				self._conn.executemany(
+					"INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+					[(k, _pack(v), now) for k, v in items.items()],
+				)
+				self._evict()
+				self._conn.execute("COMMIT")
+			except Exception:
+				self._conn.execute("ROLLBACK")
+				raise
+
+	def _evict(self) -> None:
+		(count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+		excess = count - self.max_entries
+		if excess > 0:
+			self._conn.execute(
+				"DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+				(excess,),
+			)
+
+	def size(self) -> int:
+		with self._lock:
+			(count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+		return count
+
+	def stats(self) -> Dict[str, int]:
+		return {"hits": self.hits, "misses": self.misses, "entries": self.size()}
+
+	def close(self) -> None:
+		with self._lock:
+			self._conn.close()
+
+
+class CachedEmbeddingFunction:
+	"""
+	Wraps an embedding function so that texts already embedded with the same
+	model are served from an EmbeddingCache instead of the API. Implements the
+	langchain Embeddings interface (registered with it in rag_store).
+	"""
+
+	def __init__(self, inner: Embeddings, cache: EmbeddingCache, model: Optional[str] = None) -> None:
+		self.inner = inner
+		self.cache = cache
+		self.model = model or getattr(inner, "model", "")
+
+	def embed_documents(self, texts: List[str]) -> List[List[float]]:
+		texts = list(texts)
+		keys = [cache_key(self.model, t) for t in texts]
+		found = self.cache.get_many(keys)
+		missing: Dict[str, str] = {}
+		for key, text in zip(keys, texts):
+			if key not in found and key not in missing:
+				missing[key] = text
+		if missing:
+			vectors = self.inner.embed_documents(list(missing.values()))
+			fresh = dict(zip(missing.keys(), vectors))
+			self.cache.put_many(fresh)
+			found.update(fresh)
+		return [found[k] for k in keys]
+
+	def embed_query(self, text: str) -> List[float]:
+		key = cache_key(self.model, text)
+		found = self.cache.get_many([key])
+		if key in found:
+			return found[key]
+		vector = self.inner.embed_query(text)
+		self.cache.put_many({key: vector})
+		return vector
+
+	async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+		texts = list(texts)
+		keys = [cache_key(self.model, t) for t in texts]
+		found = await asyncio.to_thread(self.cache.get_many, keys)
+		missing: Dict[str, str] = {}
+		for key, text in zip(keys, texts):
+			if key not in found and key not in missing:
+				missing[key] = text
+		if missing:
+			vectors = await self.inner.aembed_documents(list(missing.values()))
+			fresh = dict(zip(missing.keys(), vectors))
+			await asyncio.to_thread(self.cache.put_many, fresh)
+			found.update(fresh)
+		return [found[k] for k in keys]
+
+	async def aembed_query(self, text: str) -> List[float]:
+		key = cache_key(self.model, text)
+		found = await asyncio.to_thread(self.cache.get_many, [key])
+		if key in found:
+			return found[key]
+		vector = await self.inner.aembed_query(text)
+		await asyncio.to_thread(self.cache.put_many, {key: vector})
+		return vector
+
+	def stats(self) -> Dict[str, int]:
+		data = dict(self.cache.stats())
+		inner_stats = getattr(self.inner, "stats", None)
+		if callable(inner_stats):
+			data.update(inner_stats())
+		return data
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(path: Path, max_entries: int) -> EmbeddingCache:
+	"""
+	Return the process-wide cache for `path`, opening it on first use.
+	"""
+	key = str(Path(path).resolve())
+	with _caches_lock:
+		cache = _caches.get(key)
+		if cache is None:
+			cache = EmbeddingCache(path, max_entries=max_entries)
+			_caches[key] = cache
+			register_cache("embedding", cache.stats)
+		return cache
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .metrics import span
+from .utils import timestamp_string
+
+
+Entry = Dict[str, Any]
+
+
+def feedback_texts(entry: Entry) -> List[Tuple[str, str]]:
+	"""
+	(docstore id, text) pairs to embed for one feedback entry. The ids are
+	derived from the entry id so a replayed entry is not indexed twice.
+	"""
+	pairs = []
+	if entry.get("likes"):
+		pairs.append((f"feedback-{entry['id']}-likes", f"USER_FEEDBACK_LIKES: {entry['likes']}"))
+	if entry.get("dislikes"):
+		pairs.append((f"feedback-{entry['id']}-dislikes", f"USER_FEEDBACK_DISLIKES: {entry['dislikes']}"))
+	return pairs
+
+
+class FeedbackLog:
+	"""
+	Append-only JSON-lines log of feedback submissions. `append` returns once
+	the line is on disk (fsync); the checkpoint file holds the byte offset up
+	to which entries have been applied. Once everything is applied the log is
+	truncated, so it only ever holds the unflushed tail. Entries that cannot
+	be applied are moved to `<log>.dead` by `dead_letter`.
+	"""
+
+	def __init__(self, path: Path) -> None:
+		self.path = Path(path)
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		self.checkpoint_path = self.path.with_name(self.path.name + ".offset")
+		self.dead_letter_path = self.path.with_name(self.path.name + ".dead")
+		self._lock = threading.Lock()
+		self._fh = self.path.open("ab")
+		size = self._fh.tell()
+		self._offset = self._read_checkpoint()
+		if self._offset > size:
+			# crashed between truncating the log and resetting the checkpoint
+			self._offset = 0
+			self._write_checkpoint(0)
+		self._pending = len(self.pending()[0])
+		self._first_pending_at: Optional[float] = time.monotonic() if self._pending else None
+
+	def _read_checkpoint(self) -> int:
+		try:
+			return max(0, int(self.checkpoint_path.read_text(encoding="utf-8").strip() or "0"))
+		except (OSError, ValueError):
+			return 0
+
+	def _write_checkpoint(self, offset: int) -> None:
+		tmp = self.checkpoint_path.with_name(self.checkpoint_path.name + ".tmp")
+		with tmp.open("w", encoding="utf-8") as f:
+			f.write(str(offset))
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(tmp, self.checkpoint_path)
+
+	def append(self, rating: Optional[int], likes: str, dislikes: str, summary_id: str) -> Entry:
+		entry = {
+			"id": uuid.uuid4().hex,
+			"received_at": timestamp_string(),
+			"rating": rating,
+			"likes": likes,
+			"dislikes": dislikes,
+			"summary_id": summary_id,
+		}
+		line = (json.dumps(entry) + "\n").encode("utf-8")
+		with self._lock:
+			self._fh.write(line)
+			self._fh.flush()
+			os.fsync(self._fh.fileno())
+			self._pending += 1
+			if self._first_pending_at is None:
+				self._first_pending_at = time.monotonic()
+		return entry
+
+	def pending(self, limit: Optional[int] = None) -> Tuple[List[Entry], List[int]]:
+		"""
+		Up to `limit` unapplied entries and, for each, the offset just past
+		it (what to `commit` once it is applied). A torn final line (crash
+		mid-append) is left for a later read.
+		"""
+		entries: List[Entry] = []
+		ends: List[int] = []
+		with self._lock:
+			offset = self._offset
+		with self.path.open("rb") as f:
+			f.seek(offset)
+			for line in f:
+				if not line.endswith(b"\n"):
+					break
+				offset += len(line)
+				try:
+					entries.append(json.loads(line))
+				except ValueError:
+					# unreadable line: skip it rather than block everything after it
+					continue
+				ends.append(offset)
+				if limit is not None and len(entries) >= limit:
+					break
+		return entries, ends
+
+	def commit(self, offset: int, count: int) -> None:
+		"""
+		Mark everything before `offset` (`count` entries) as applied.
+		"""
+		with self._lock:
+			self._pending = max(0, self._pending - count)
+			self._first_pending_at = time.monotonic() if self._pending else None
+			if offset >= self._fh.tell():
+				self._fh.truncate(0)
+				self._fh.flush()
+				os.fsync(self._fh.fileno())
+				offset = 0
+			self._offset = offset
+			self._write_checkpoint(offset)
+
+	def dead_letter(self, entry: Entry, error: str) -> None:
+		"""
+		Set aside an entry that keeps failing; the caller commits past it.
+		"""
+		line = (json.dumps({**entry, "error": error, "dead_at": timestamp_string()}) + "\n").encode("utf-8")
+		with self._lock:
+			with self.dead_letter_path.open("ab") as f:
+				f.write(line)
+				f.flush()
+				os.fsync(f.fileno())
+
+	@property
+	def pending_count(self) -> int:
+		return self._pending
+
+	def pending_age(self) -> float:
+		"""
+		Seconds the oldest unapplied entry has waited, 0 if none.
+		"""
+		first = self._first_pending_at
+		return time.monotonic() - first if first is not None else 0.0
+
+	def close(self) -> None:
+		with self._lock:
+			self._fh.close()
+
+
+class FeedbackIngestor:
+	"""
+	Applies logged feedback in batches: one embedding request and one index
+	save per batch instead of per submission. A batch is flushed once
+	`batch_size` entries are pending or the oldest has waited `max_delay`
+	seconds; entries left over from a previous run are replayed on start.
+
+	Each batch is indexed first (the index ignores entries it already holds,
+	by docstore id), then saved to the database one entry at a time with the
+	checkpoint advanced after each, so a retry never saves an entry twice;
+	only a crash between an insert and its checkpoint can. An entry whose
+	save fails `max_attempts` times is dead-lettered so it stops holding
+	back the entries behind it.
+	"""
+
+	def __init__(
+		self,
+		log: FeedbackLog,
+		get_store: Callable[[], Any],
+		save: Callable[..., None],
+		batch_size: int = 32,
+		max_delay: float = 5.0,
+		max_attempts: int = 5,
+	) -> None:
+		self.log = log
+		self.get_store = get_store
+		self.save = save
+		self.batch_size = max(1, batch_size)
+		self.max_delay = max(0.1, max_delay)
+		self.max_attempts = max(1, max_attempts)
+		# failed saves per entry id, for this process's lifetime
+		self._attempts: Dict[str, int] = {}
+		self._flush_lock = threading.Lock()
+		self._wake = threading.Event()
+		self._stop = threading.Event()
+		self._thread: Optional[threading.Thread] = None
+
+	def start(self) -> None:
+		if self._thread is None:
+			self._stop.clear()
+			self._thread = threading.Thread(target=self._loop, name="feedback-flush", daemon=True)
+			self._thread.start()
+
+	def submit(self, rating: Optional[int], likes: str, dislikes: str, summary_id: str) -> Entry:
+		entry = self.log.append(rating, likes, dislikes, summary_id)
+		if self.log.pending_count >= self.batch_size:
+			self._wake.set()
+		return entry
+
+	def flush(self) -> int:
+		"""
+		Apply every pending entry now; returns how many were applied.
+		"""
+		applied = 0
+		with self._flush_lock:
+			while True:
+				entries, ends = self.log.pending(limit=self.batch_size)
+				if not entries:
+					return applied
+				with span("feedback_flush"):
+					self._index(entries)
+					for entry, end in zip(entries, ends):
+						self._save(entry)
+						self.log.commit(end, 1)
+						applied += 1
+
+	def _index(self, entries: List[Entry]) -> None:
+		ids: List[str] = []
+		texts: List[str] = []
+		metadatas: List[Dict[str, Any]] = []
+		for entry in entries:
+			for doc_id, text in feedback_texts(entry):
+				ids.append(doc_id)
+				texts.append(text)
+				metadatas.append(
+					{"type": "feedback", "summary_id": entry["summary_id"], "timestamp": entry["received_at"]}
+				)
+		if texts:
+			store = self.get_store()
+			store.add_texts(texts, metadatas=metadatas, ids=ids)
+			# the checkpoint may only pass entries whose vectors are on disk
+			store.flush()
+
+	def _save(self, entry: Entry) -> None:
+		"""
+		Save one entry, or dead-letter it once it has failed `max_attempts`
+		times. Raises (leaving it pending) on an earlier failure.
+		"""
+		try:
+			self.save(
+				rating=entry.get("rating"),
+				likes=entry.get("likes", ""),
+				dislikes=entry.get("dislikes", ""),
+				summary_id=entry["summary_id"],
+			)
+		except Exception as exc:
+			attempts = self._attempts.get(entry["id"], 0) + 1
+			if attempts < self.max_attempts:
+				self._attempts[entry["id"]] = attempts
+				raise
+			self.log.dead_letter(entry, f"{type(exc).__name__}: {exc}")
+		self._attempts.pop(entry["id"], None)
+
+	def _loop(self) -> None:
+		# the first pass runs at once: it replays what a previous run left behind
+		replay = True
+		while not self._stop.is_set():
+			if self.log.pending_count and (
+				replay or self.log.pending_count >= self.batch_size or self.log.pending_age() >= self.max_delay
+			):
+				try:
+					self.flush()
+				except Exception:
+					# e.g. embedding unavailable: entries stay logged, retry next tick
+					pass
+			replay = False
+			self._wake.wait(min(self.max_delay, 1.0))
+			self._wake.clear()
+
+	def close(self) -> None:
+		self._stop.set()
+		self._wake.set()
+		if self._thread is not None:
+			self._thread.join(timeout=5)
+			self._thread = None
+		try:
+			self.flush()
+		except Exception:
+			# still logged; replayed on next start
+			pass
+		self.log.close()
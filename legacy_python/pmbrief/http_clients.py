@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any, Dict, Tuple
+
+import httpx
+
+from .config import get_env_str, get_http_settings
+from .metrics import external_call
+
+
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+
+_clients: Dict[str, Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+_clients_lock = threading.Lock()
+
+
+def get_async_client(name: str) -> httpx.AsyncClient:
+	"""
+	The shared keep-alive client for one upstream service (e.g. "newsapi",
+	"gemini"), created on first use in the running event loop. Each service
+	talks to one host, so the pool limits are per host.
+	"""
+	loop = asyncio.get_running_loop()
+	with _clients_lock:
+		entry = _clients.get(name)
+		if entry is not None and entry[0] is loop and not entry[1].is_closed:
+			return entry[1]
+		# a client bound to another (finished) loop cannot be reused
+		settings = get_http_settings()
+		client = httpx.AsyncClient(
+			limits=httpx.Limits(
+				max_connections=settings["max_connections"],
+				max_keepalive_connections=settings["max_keepalive"],
+				keepalive_expiry=settings["keepalive_seconds"],
+			),
+			timeout=httpx.Timeout(settings["timeout"], connect=10.0),
+		)
+		_clients[name] = (loop, client)
+		return client
+
+
+async def aclose_clients() -> None:
+	loop = asyncio.get_running_loop()
+	with _clients_lock:
+		entries = list(_clients.items())
+		_clients.clear()
+	for _, (owner, client) in entries:
+		if owner is loop:
+			await client.aclose()
+
+
+def gemini_base() -> str:
+	# Overridable so benchmarks and tests can point at a local stand-in
+	return (get_env_str("GEMINI_API_BASE", GEMINI_API_BASE) or GEMINI_API_BASE).rstrip("/")
+
+
+def gemini_model_path(model: str) -> str:
+	return model if model.startswith("models/") else f"models/{model}"
+
+
+def gemini_headers() -> Dict[str, str]:
+	api_key = get_env_str("GEMINI_API_KEY")
+	if not api_key:
+		raise RuntimeError("GEMINI_API_KEY not set")
+	return {"x-goog-api-key": api_key}
+
+
+async def gemini_call(model: str, method: str, body: Dict[str, Any], service: str) -> Dict[str, Any]:
+	"""
+	POST `body` to the Gemini REST method (e.g. "generateContent") of
+	`model`; returns the decoded response. Counted under `service`.
+	"""
+	client = get_async_client("gemini")
+	url = f"{gemini_base()}/{gemini_model_path(model)}:{method}"
+	try:
+		resp = await client.post(url, json=body, headers=gemini_headers())
+		resp.raise_for_status()
+	except Exception:
+		external_call(service, ok=False)
+		raise
+	external_call(service)
+	return resp.json()
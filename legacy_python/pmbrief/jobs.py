@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TIMED_OUT = "timed_out"
+FINISHED = (SUCCEEDED, FAILED, TIMED_OUT)
+
+Handler = Callable[[Dict[str, Any], Callable[[str], None]], Dict[str, Any]]
+
+
+class QueueFull(RuntimeError):
+	pass
+
+
+class JobTimeout(RuntimeError):
+	pass
+
+
+@dataclass
+class Job:
+	id: str
+	payload: Dict[str, Any]
+	status: str = QUEUED
+	stage: Optional[str] = None
+	stages: List[Dict[str, Any]] = field(default_factory=list)
+	created_at: float = field(default_factory=time.time)
+	started_at: Optional[float] = None
+	finished_at: Optional[float] = None
+	result: Optional[Dict[str, Any]] = None
+	error: Optional[Dict[str, Any]] = None
+
+	def to_dict(self) -> Dict[str, Any]:
+		data = asdict(self)
+		data.pop("payload", None)
+		data["job_id"] = data.pop("id")
+		return data
+
+
+class MemoryJobStore:
+	def __init__(self) -> None:
+		self._jobs: Dict[str, Job] = {}
+		self._lock = threading.Lock()
+
+	def save(self, job: Job) -> None:
+		with self._lock:
+			self._jobs[job.id] = job
+
+	def get(self, job_id: str) -> Optional[Job]:
+		with self._lock:
+			return self._jobs.get(job_id)
+
+	def adopt(self, status: str) -> List[Job]:
+		return []
+
+	def prune(self, older_than: float) -> None:
+		with self._lock:
+			for job_id in [j.id for j in self._jobs.values() if j.status in FINISHED and (j.finished_at or 0) < older_than]:
+				self._jobs.pop(job_id, None)
+
+
+def _alive(owner: Optional[str]) -> bool:
+	"""
+	Whether the process behind an owner tag (`<pid>:<token>`) still runs.
+	"""
+	try:
+		os.kill(int((owner or "").partition(":")[0]), 0)
+	except ProcessLookupError:
+		return False
+	except PermissionError:
+		return True
+	except (OSError, ValueError):
+		return False
+	return True
+
+
+class SQLiteJobStore:
+	"""
+	Jobs persisted in SQLite so queued work survives a restart (see
+	JobQueue.start for what happens to it then). Several worker processes
+	may share the file: each row is tagged with the process that owns it,
+	and only that process runs it.
+	"""
+
+	def __init__(self, path: Path) -> None:
+		self.path = Path(path)
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		self.owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+		self._lock = threading.Lock()
+		self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+		self._conn.execute("PRAGMA journal_mode=WAL")
+		self._conn.execute(
+			"""
+			CREATE TABLE IF NOT EXISTS jobs (
+				id TEXT PRIMARY KEY,
+				status TEXT NOT NULL,
+				created_at REAL NOT NULL,
+				finished_at REAL,
+				data TEXT NOT NULL,
+				owner TEXT
+			)
+			"""
+		)
+		columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+		if "owner" not in columns:
+			self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+		self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+	def save(self, job: Job) -> None:
+		with self._lock:
+			self._conn.execute(
+				"INSERT OR REPLACE INTO jobs (id, status, created_at, finished_at, data, owner) VALUES (?, ?, ?, ?, ?, ?)",
+				(job.id, job.status, job.created_at, job.finished_at, json.dumps(asdict(job)), self.owner),
+			)
+
+	def get(self, job_id: str) -> Optional[Job]:
+		with self._lock:
+			row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+		return Job(**json.loads(row[0])) if row else None
+
+	def adopt(self, status: str) -> List[Job]:
+		"""
+		Take over the jobs in `status` whose owning process has exited
+		(including an earlier run of this one). The owner is swapped with a
+		compare-and-set, so when several workers start at once each job goes
+		to exactly one of them.
+		"""
+		with self._lock:
+			rows = self._conn.execute(
+				"SELECT owner, data FROM jobs WHERE status = ? AND owner IS NOT ? ORDER BY created_at",
+				(status, self.owner),
+			).fetchall()
+		jobs: List[Job] = []
+		for owner, data in rows:
+			if _alive(owner) and not owner.startswith(f"{os.getpid()}:"):
+				continue
+			job = Job(**json.loads(data))
+			with self._lock:
+				claimed = self._conn.execute(
+					"UPDATE jobs SET owner = ? WHERE id = ? AND status = ? AND owner IS ?",
+					(self.owner, job.id, status, owner),
+				).rowcount
+			if claimed:
+				jobs.append(job)
+		return jobs
+
+	def prune(self, older_than: float) -> None:
+		with self._lock:
+			self._conn.execute(
+				"DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (older_than,)
+			)
+
+
+class JobQueue:
+	"""
+	Bounded queue of brief jobs run by a fixed pool of worker threads.
+	The handler receives the job payload and a progress callback; the callback
+	records stage transitions and raises JobTimeout once the job has run past
+	`timeout` seconds, so long jobs stop at the next stage boundary.
+	"""
+
+	def __init__(
+		self,
+		handler: Handler,
+		store: Any,
+		workers: int = 2,
+		max_depth: int = 32,
+		timeout: float = 300.0,
+		result_ttl: float = 3600.0,
+	) -> None:
+		self.handler = handler
+		self.store = store
+		self.workers = max(1, workers)
+		self.timeout = timeout
+		self.result_ttl = result_ttl
+		self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=max(1, max_depth))
+		self._threads: List[threading.Thread] = []
+		self._running = 0
+		self._running_lock = threading.Lock()
+
+	def start(self) -> None:
+		"""
+		Start the workers. Jobs whose process has exited (see
+		SQLiteJobStore.adopt) are taken over: running ones were cut off and
+		are failed; queued ones are re-enqueued, and those past `max_depth`
+		are failed as `submit` would have, so no job is left for clients to
+		poll forever. Jobs of other live workers are left to them.
+		"""
+		if self._threads:
+			return
+		for job in self.store.adopt(RUNNING):
+			self._fail(job, 500, "Interrupted by server restart.")
+		for job in self.store.adopt(QUEUED):
+			try:
+				self._queue.put_nowait(job.id)
+			except queue.Full:
+				self._fail(job, 503, "Job queue is full.")
+		for i in range(self.workers):
+			t = threading.Thread(target=self._work, name=f"brief-job-{i}", daemon=True)
+			t.start()
+			self._threads.append(t)
+
+	def stop(self) -> None:
+		for _ in self._threads:
+			try:
+				self._queue.put_nowait(None)
+			except queue.Full:
+				break
+		for t in self._threads:
+			t.join(timeout=1)
+		self._threads = []
+
+	def depth(self) -> int:
+		"""
+		Jobs queued or running in this process.
+		"""
+		with self._running_lock:
+			return self._queue.qsize() + self._running
+
+	def submit(self, payload: Dict[str, Any]) -> Job:
+		job = Job(id=uuid.uuid4().hex, payload=payload)
+		self.store.save(job)
+		try:
+			self._queue.put_nowait(job.id)
+		except queue.Full:
+			self._fail(job, 503, "Job queue is full.")
+			raise QueueFull("Job queue is full.")
+		return job
+
+	def _fail(self, job: Job, status_code: int, detail: str) -> None:
+		job.status = FAILED
+		job.finished_at = time.time()
+		job.error = {"status_code": status_code, "detail": detail}
+		self.store.save(job)
+
+	def get(self, job_id: str) -> Optional[Job]:
+		return self.store.get(job_id)
+
+	def _work(self) -> None:
+		while True:
+			job_id = self._queue.get()
+			if job_id is None:
+				return
+			job = self.store.get(job_id)
+			if job is None or job.status != QUEUED:
+				continue
+			with self._running_lock:
+				self._running += 1
+			try:
+				self._run(job)
+			finally:
+				with self._running_lock:
+					self._running -= 1
+			self.store.prune(time.time() - self.result_ttl)
+
+	def _run(self, job: Job) -> None:
+		job.status = RUNNING
+		job.started_at = time.time()
+		deadline = time.monotonic() + self.timeout
+		self.store.save(job)
+
+		def progress(stage: str) -> None:
+			now = time.time()
+			if job.stages and job.stages[-1]["finished_at"] is None:
+				job.stages[-1]["finished_at"] = now
+			if time.monotonic() > deadline:
+				raise JobTimeout(f"Job exceeded {self.timeout:g}s before stage '{stage}'.")
+			job.stage = stage
+			job.stages.append({"name": stage, "started_at": now, "finished_at": None})
+			self.store.save(job)
+
+		try:
+			job.result = self.handler(job.payload, progress)
+			job.status = SUCCEEDED
+		except JobTimeout as exc:
+			job.status = TIMED_OUT
+			job.error = {"status_code": 504, "detail": str(exc)}
+		except Exception as exc:
+			job.status = FAILED
+			job.error = {
+				"status_code": getattr(exc, "status_code", 500),
+				"detail": getattr(exc, "detail", None) or str(exc),
+			}
+		job.finished_at = time.time()
+		if job.stages and job.stages[-1]["finished_at"] is None:
+			job.stages[-1]["finished_at"] = job.finished_at
+		job.stage = None
+		self.store.save(job)
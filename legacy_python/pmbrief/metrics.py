@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import bisect
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+
+LabelValues = Tuple[str, ...]
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Seconds; stages range from milliseconds (retrieve) to a minute (synthesize)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Estimated tokens; PROMPT_TOKEN_BUDGET defaults to 8000
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+
+def _escape(value: str) -> str:
+	return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+	pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+	if extra:
+		pairs.append(extra)
+	return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _num(value: float) -> str:
+	if value == float("inf"):
+		return "+Inf"
+	return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+	def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+		self.name = name
+		self.help = help
+		self.labelnames = tuple(labelnames)
+		self._values: Dict[LabelValues, float] = {}
+		self._lock = threading.Lock()
+
+	def inc(self, *labels: str, amount: float = 1.0) -> None:
+		with self._lock:
+			self._values[labels] = self._values.get(labels, 0.0) + amount
+
+	def render(self) -> List[str]:
+		lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+		with self._lock:
+			for labels, value in sorted(self._values.items()):
+				lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_num(value)}")
+		return lines
+
+
+class Histogram:
+	def __init__(
+		self,
+		name: str,
+		help: str,
+		labelnames: Sequence[str] = (),
+		buckets: Sequence[float] = DEFAULT_BUCKETS,
+	) -> None:
+		self.name = name
+		self.help = help
+		self.labelnames = tuple(labelnames)
+		self.buckets = tuple(sorted(buckets))
+		# per label set: per-bucket counts (non-cumulative, last is +Inf), sum
+		self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+		self._lock = threading.Lock()
+
+	def observe(self, value: float, *labels: str) -> None:
+		index = bisect.bisect_left(self.buckets, value)
+		with self._lock:
+			counts, total = self._series.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+			counts[index] += 1
+			total[0] += value
+
+	def render(self) -> List[str]:
+		lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+		with self._lock:
+			for labels, (counts, total) in sorted(self._series.items()):
+				running = 0
+				for bound, count in zip(self.buckets + (float("inf"),), counts):
+					running += count
+					le = f'le="{_num(bound)}"'
+					lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {running}")
+				lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(total[0])}")
+				lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {running}")
+		return lines
+
+
+GaugeSamples = List[Tuple[LabelValues, float]]
+
+
+class GaugeFunc:
+	"""
+	A gauge whose samples are read from `collect()` at scrape time.
+	"""
+
+	def __init__(self, name: str, help: str, labelnames: Sequence[str], collect: Callable[[], GaugeSamples]) -> None:
+		self.name = name
+		self.help = help
+		self.labelnames = tuple(labelnames)
+		self.collect = collect
+
+	def render(self) -> List[str]:
+		lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+		try:
+			samples = self.collect()
+		except Exception:
+			# a broken source must not take down the whole scrape
+			samples = []
+		for labels, value in samples:
+			lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_num(value)}")
+		return lines
+
+
+STAGE_SECONDS = Histogram("pmbrief_stage_seconds", "Time spent per pipeline stage.", ("stage",))
+STAGE_ERRORS = Counter("pmbrief_stage_errors_total", "Pipeline stages that raised.", ("stage",))
+EXTERNAL_CALLS = Counter(
+	"pmbrief_external_calls_total", "Calls to external services by outcome.", ("service", "outcome")
+)
+HTTP_SECONDS = Histogram("pmbrief_http_request_seconds", "API request latency.", ("method", "route", "status"))
+PROMPT_TOKENS = Histogram(
+	"pmbrief_prompt_tokens", "Estimated generation prompt tokens by part.", ("part",), buckets=TOKEN_BUCKETS
+)
+PROMPT_DROPPED = Counter(
+	"pmbrief_prompt_dropped_total", "Articles and RAG documents cut to fit the prompt budget.", ("kind",)
+)
+
+_cache_sources: Dict[str, Callable[[], Dict[str, int]]] = {}
+_gauge_sources: Dict[str, GaugeFunc] = {}
+_sources_lock = threading.Lock()
+
+
+def register_cache(name: str, stats: Callable[[], Dict[str, int]]) -> None:
+	"""
+	Expose a cache's hit/miss counts; `stats()` returns at least
+	{"hits": int, "misses": int}. Re-registering a name replaces it.
+	"""
+	with _sources_lock:
+		_cache_sources[name] = stats
+
+
+def register_gauge(name: str, help: str, labelnames: Sequence[str], collect: Callable[[], GaugeSamples]) -> None:
+	with _sources_lock:
+		_gauge_sources[name] = GaugeFunc(name, help, labelnames, collect)
+
+
+def _cache_samples() -> Dict[str, Dict[str, int]]:
+	with _sources_lock:
+		sources = dict(_cache_sources)
+	data: Dict[str, Dict[str, int]] = {}
+	for name, stats in sources.items():
+		try:
+			data[name] = stats()
+		except Exception:
+			continue
+	return data
+
+
+def _render_caches() -> List[str]:
+	stats = _cache_samples()
+	lines: List[str] = []
+	for metric, kind, help, key in (
+		("pmbrief_cache_hits_total", "counter", "Cache lookups served from cache.", "hits"),
+		("pmbrief_cache_misses_total", "counter", "Cache lookups that missed.", "misses"),
+	):
+		lines += [f"# HELP {metric} {help}", f"# TYPE {metric} {kind}"]
+		for name, data in sorted(stats.items()):
+			lines.append(f'{metric}{{cache="{_escape(name)}"}} {int(data.get(key, 0))}')
+	lines += ["# HELP pmbrief_cache_hit_ratio Hits over lookups since start.", "# TYPE pmbrief_cache_hit_ratio gauge"]
+	for name, data in sorted(stats.items()):
+		lookups = data.get("hits", 0) + data.get("misses", 0)
+		ratio = data.get("hits", 0) / lookups if lookups else 0.0
+		lines.append(f'pmbrief_cache_hit_ratio{{cache="{_escape(name)}"}} {_num(round(ratio, 4))}')
+	return lines
+
+
+def render() -> str:
+	"""
+	All metrics in the Prometheus text exposition format.
+	"""
+	lines: List[str] = []
+	for metric in (STAGE_SECONDS, STAGE_ERRORS, EXTERNAL_CALLS, HTTP_SECONDS, PROMPT_TOKENS, PROMPT_DROPPED):
+		lines += metric.render()
+	lines += _render_caches()
+	with _sources_lock:
+		gauges = list(_gauge_sources.values())
+	for gauge in gauges:
+		lines += gauge.render()
+	return "\n".join(lines) + "\n"
+
+
+_trace: ContextVar[Optional[Dict[str, float]]] = ContextVar("pmbrief_trace", default=None)
+
+
+@contextmanager
+def trace() -> Iterator[Dict[str, float]]:
+	"""
+	Collect the seconds spent per stage by spans in this context (and in
+	worker threads started with a copy of it) into the yielded dict.
+	"""
+	breakdown: Dict[str, float] = {}
+	token = _trace.set(breakdown)
+	try:
+		yield breakdown
+	finally:
+		_trace.reset(token)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+	"""
+	Time a pipeline stage into STAGE_SECONDS and the current trace, if any.
+	Nested spans (e.g. embed inside retrieve) are each counted in full.
+	"""
+	start = time.perf_counter()
+	try:
+		yield
+	except BaseException:
+		STAGE_ERRORS.inc(stage)
+		raise
+	finally:
+		elapsed = time.perf_counter() - start
+		STAGE_SECONDS.observe(elapsed, stage)
+		breakdown = _trace.get()
+		if breakdown is not None:
+			breakdown[stage] = breakdown.get(stage, 0.0) + elapsed
+
+
+def timed(stage: str) -> Callable[[F], F]:
+	"""
+	Decorator form of `span`, for plain and `async def` functions.
+	"""
+
+	def decorate(fn: F) -> F:
+		if inspect.iscoroutinefunction(fn):
+
+			@functools.wraps(fn)
+			async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+				with span(stage):
+					return await fn(*args, **kwargs)
+
+			return async_wrapper  # type: ignore[return-value]
+
+		@functools.wraps(fn)
+		def wrapper(*args: Any, **kwargs: Any) -> Any:
+			with span(stage):
+				return fn(*args, **kwargs)
+
+		return wrapper  # type: ignore[return-value]
+
+	return decorate
+
+
+def external_call(service: str, ok: bool = True) -> None:
+	EXTERNAL_CALLS.inc(service, "ok" if ok else "error")
+
+
+def prompt_tokens(breakdown: Dict[str, int]) -> None:
+	"""
+	Record a prompt's token breakdown (see prompt_builder.assemble_prompt).
+	"""
+	for part in ("instructions", "articles", "rag", "total"):
+		PROMPT_TOKENS.observe(breakdown[part], part)
+	for kind in ("articles", "rag_docs"):
+		if breakdown[f"{kind}_dropped"]:
+			PROMPT_DROPPED.inc(kind, amount=breakdown[f"{kind}_dropped"])
+
+
+def format_breakdown(breakdown: Dict[str, float]) -> str:
+	"""
+	A Server-Timing header value: `fetch;dur=123.4, generate;dur=2100.0`.
+	"""
+	return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in breakdown.items())
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .metrics import register_cache
+
+
+CacheKey = Tuple[str, str, str]
+
+# expired rows are purged from disk when the cache opens and every this many puts
+_PURGE_EVERY = 100
+
+
+def make_key(query: str, window_start: str, language: str) -> CacheKey:
+	return (query.strip().lower(), window_start, language)
+
+
+def _key_str(key: CacheKey) -> str:
+	return json.dumps(list(key))
+
+
+def _cancelling() -> bool:
+	"""
+	Whether the current task has a cancellation pending (Python 3.11+;
+	earlier versions cannot tell, and report False).
+	"""
+	task = asyncio.current_task()
+	cancelling = getattr(task, "cancelling", None)
+	return bool(cancelling()) if cancelling is not None else False
+
+
+class _InFlight:
+	def __init__(self) -> None:
+		self.done = threading.Event()
+		self.result: Optional[List[Dict]] = None
+		self.error: Optional[BaseException] = None
+
+
+class NewsResponseCache:
+	"""
+	Two-tier TTL cache for NewsAPI article lists: a small in-memory LRU in
+	front of a SQLite table that survives restarts. Concurrent misses for the
+	same key share a single upstream call. Expired rows are purged from the
+	table as it is opened and then every `_PURGE_EVERY` puts.
+	"""
+
+	def __init__(self, path: Path, ttl_seconds: float, memory_entries: int = 256) -> None:
+		self.path = Path(path)
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		self.ttl = ttl_seconds
+		self.memory_entries = max(1, memory_entries)
+		self.stats_counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "collapsed": 0}
+		self._memory: "OrderedDict[str, Tuple[float, List[Dict]]]" = OrderedDict()
+		self._puts = 0
+		self._inflight: Dict[str, _InFlight] = {}
+		self._ainflight: Dict[str, "asyncio.Future[List[Dict]]"] = {}
+		self._lock = threading.Lock()
+		self._db_lock = threading.Lock()
+		self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+		self._conn.execute("PRAGMA journal_mode=WAL")
+		self._conn.execute(
+			"""
+			CREATE TABLE IF NOT EXISTS news_responses (
+				key TEXT PRIMARY KEY,
+				articles TEXT NOT NULL,
+				expires_at REAL NOT NULL
+			)
+			"""
+		)
+		self.purge_expired()
+
+	def _remember(self, skey: str, expires_at: float, articles: List[Dict]) -> None:
+		self._memory[skey] = (expires_at, articles)
+		self._memory.move_to_end(skey)
+		while len(self._memory) > self.memory_entries:
+			self._memory.popitem(last=False)
+
+	def get(self, key: CacheKey) -> Optional[List[Dict]]:
+		skey = _key_str(key)
+		now = time.time()
+		with self._lock:
+			entry = self._memory.get(skey)
+			if entry is not None:
+				if entry[0] > now:
+					self._memory.move_to_end(skey)
+					self.stats_counts["memory_hits"] += 1
+					return entry[1]
+				self._memory.pop(skey, None)
+		with self._db_lock:
+			row = self._conn.execute(
+				"SELECT articles, expires_at FROM news_responses WHERE key = ?", (skey,)
+			).fetchone()
+		if row is None or row[1] <= now:
+			return None
+		articles = json.loads(row[0])
+		with self._lock:
+			self._remember(skey, row[1], articles)
+			self.stats_counts["disk_hits"] += 1
+		return articles
+
+	def put(self, key: CacheKey, articles: List[Dict]) -> None:
+		skey = _key_str(key)
+		expires_at = time.time() + self.ttl
+		with self._lock:
+			self._remember(skey, expires_at, articles)
+			self._puts += 1
+			purge = self._puts % _PURGE_EVERY == 0
+		with self._db_lock:
+			self._conn.execute(
+				"INSERT OR REPLACE INTO news_responses (key, articles, expires_at) VALUES (?, ?, ?)",
+				(skey, json.dumps(articles), expires_at),
+			)
+		if purge:
+			self.purge_expired()
+
+	def get_or_fetch(self, key: CacheKey, fetch: Callable[[], List[Dict]]) -> List[Dict]:
+		cached = self.get(key)
+		if cached is not None:
+			return cached
+		skey = _key_str(key)
+		with self._lock:
+			flight = self._inflight.get(skey)
+			leader = flight is None
+			if leader:
+				flight = _InFlight()
+				self._inflight[skey] = flight
+			else:
+				self.stats_counts["collapsed"] += 1
+		if not leader:
+			flight.done.wait()
+			if flight.error is not None:
+				raise flight.error
+			return flight.result or []
+		try:
+			with self._lock:
+				self.stats_counts["misses"] += 1
+			flight.result = fetch()
+			self.put(key, flight.result)
+			return flight.result
+		except BaseException as exc:
+			# errors are shared with waiters but never cached
+			flight.error = exc
+			raise
+		finally:
+			with self._lock:
+				self._inflight.pop(skey, None)
+			flight.done.set()
+
+	async def aget_or_fetch(self, key: CacheKey, fetch: Callable[[], Awaitable[List[Dict]]]) -> List[Dict]:
+		"""
+		`get_or_fetch` for coroutines: concurrent misses in the event loop
+		await a single upstream call. If the task making that call is
+		cancelled, its waiters are not: one of them makes the call instead.
+		SQLite reads and writes run in worker threads.
+		"""
+		skey = _key_str(key)
+		while True:
+			cached = await asyncio.to_thread(self.get, key)
+			if cached is not None:
+				return cached
+			with self._lock:
+				flight = self._ainflight.get(skey)
+				leader = flight is None
+				if leader:
+					flight = asyncio.get_running_loop().create_future()
+					self._ainflight[skey] = flight
+				else:
+					self.stats_counts["collapsed"] += 1
+			if leader:
+				return await self._alead(key, skey, flight, fetch)
+			try:
+				return list(await asyncio.shield(flight))
+			except asyncio.CancelledError:
+				if not flight.cancelled() or _cancelling():
+					# this waiter itself was cancelled
+					raise
+
+	async def _alead(
+		self,
+		key: CacheKey,
+		skey: str,
+		flight: "asyncio.Future[List[Dict]]",
+		fetch: Callable[[], Awaitable[List[Dict]]],
+	) -> List[Dict]:
+		try:
+			with self._lock:
+				self.stats_counts["misses"] += 1
+			articles = await fetch()
+			await asyncio.to_thread(self.put, key, articles)
+			flight.set_result(articles)
+			return articles
+		except asyncio.CancelledError:
+			# waiters see a cancelled flight and retry
+			flight.cancel()
+			raise
+		except BaseException as exc:
+			# errors are shared with waiters but never cached
+			flight.set_exception(exc)
+			# retrieved here so a failure nobody waited for is not logged
+			flight.exception()
+			raise
+		finally:
+			with self._lock:
+				self._ainflight.pop(skey, None)
+
+	def purge_expired(self) -> int:
+		with self._db_lock:
+			cur = self._conn.execute("DELETE FROM news_responses WHERE expires_at <= ?", (time.time(),))
+		return cur.rowcount
+
+	def stats(self) -> Dict[str, int]:
+		with self._lock:
+			data = dict(self.stats_counts)
+			data["memory_entries"] = len(self._memory)
+		return data
+
+	def hit_stats(self) -> Dict[str, int]:
+		data = self.stats()
+		return {"hits": data["memory_hits"] + data["disk_hits"], "misses": data["misses"]}
+
+
+_cache: Optional[NewsResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_news_cache(path: Path, ttl_seconds: float, memory_entries: int) -> NewsResponseCache:
+	"""
+	Return the process-wide cache, opening it on first use.
+	"""
+	global _cache
+	with _cache_lock:
+		if _cache is None or _cache.path != Path(path):
+			_cache = NewsResponseCache(path, ttl_seconds=ttl_seconds, memory_entries=memory_entries)
+			register_cache("news", _cache.hit_stats)
+		return _cache
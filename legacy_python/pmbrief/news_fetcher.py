@@ -1,59 +1,287 @@
 from __future__ import annotations
 
+import asyncio
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Tuple
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
 
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 
-from .config import get_env_str
+from .config import ensure_dirs, get_env_str, get_fetch_settings, get_news_cache_settings
+from .dedupe import cluster_near_duplicates
+from .http_clients import get_async_client
+from .metrics import external_call, timed
+from .news_cache import NewsResponseCache, get_news_cache, make_key
 
 
 NEWSAPI_BASE = "https://newsapi.org/v2/everything"
+NEWS_LANGUAGE = "en"
+DEFAULT_BACKOFF_SECONDS = 2.0
+
+
+def _newsapi_url() -> str:
+	# Overridable so benchmarks and tests can point at a local stand-in
+	return get_env_str("NEWSAPI_BASE_URL", NEWSAPI_BASE) or NEWSAPI_BASE
 
 
 def _iso_utc(dt: datetime) -> str:
 	return dt.replace(tzinfo=timezone.utc).isoformat().replace("+00:00", "Z")
 
 
-def fetch_news(interests: List[str], hours: int = 36, max_articles: int = 30) -> List[Dict]:
+class TokenBucket:
 	"""
-	Fetch recent news articles (last N hours) matching user interests using NewsAPI.
-	Returns a list of unique articles, most recent first.
+	Thread-safe token bucket shared by every NewsAPI request in the process.
+	A Retry-After from the server pauses all callers until it has elapsed.
+	"""
+
+	def __init__(self, rate_per_sec: float, capacity: int) -> None:
+		self.rate = max(rate_per_sec, 1e-6)
+		self.capacity = max(1, capacity)
+		self._tokens = float(self.capacity)
+		self._updated = time.monotonic()
+		self._paused_until = 0.0
+		self._lock = threading.Lock()
+
+	def _take(self) -> float:
+		"""
+		Take a token and return 0, or return how long to wait before retrying.
+		"""
+		with self._lock:
+			now = time.monotonic()
+			self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+			self._updated = now
+			if now >= self._paused_until and self._tokens >= 1.0:
+				self._tokens -= 1.0
+				return 0.0
+			return max(self._paused_until - now, (1.0 - self._tokens) / self.rate, 1e-3)
+
+	def acquire(self) -> None:
+		while True:
+			wait = self._take()
+			if not wait:
+				return
+			time.sleep(wait)
+
+	async def aacquire(self) -> None:
+		while True:
+			wait = self._take()
+			if not wait:
+				return
+			await asyncio.sleep(wait)
+
+	def pause(self, seconds: float) -> None:
+		with self._lock:
+			self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+_limiter: Optional[TokenBucket] = None
+_limiter_lock = threading.Lock()
+
+
+def _get_limiter() -> TokenBucket:
+	global _limiter
+	with _limiter_lock:
+		if _limiter is None:
+			settings = get_fetch_settings()
+			_limiter = TokenBucket(settings["requests_per_minute"] / 60.0, settings["burst"])
+		return _limiter
+
+
+def _retry_after_seconds(resp: Union[requests.Response, httpx.Response]) -> float:
+	raw = resp.headers.get("Retry-After")
+	if not raw:
+		return DEFAULT_BACKOFF_SECONDS
+	try:
+		return max(0.0, float(raw))
+	except ValueError:
+		pass
+	try:
+		when = parsedate_to_datetime(raw)
+		return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+	except Exception:
+		return DEFAULT_BACKOFF_SECONDS
+
+
+def _news_cache() -> Optional[NewsResponseCache]:
+	settings = get_news_cache_settings()
+	if not settings["enabled"]:
+		return None
+	path = Path(ensure_dirs()["data_dir"]) / "news_cache.sqlite3"
+	return get_news_cache(path, settings["ttl_seconds"], settings["memory_entries"])
+
+
+def _window_start(now: datetime, hours: int) -> datetime:
+	"""
+	Lookback start rounded down to the cache bucket, so runs a few minutes
+	apart send the same `from` and can share cached responses.
+	"""
+	start = now - timedelta(hours=hours)
+	settings = get_news_cache_settings()
+	if not settings["enabled"]:
+		return start
+	bucket = settings["bucket_minutes"] * 60
+	epoch = start.replace(tzinfo=timezone.utc).timestamp()
+	return datetime.utcfromtimestamp(epoch - (epoch % bucket))
+
+
+def _params(q: str, start_iso: str) -> Dict:
+	return {
+		"q": q,
+		"from": start_iso,
+		"sortBy": "publishedAt",
+		"language": NEWS_LANGUAGE,
+		"pageSize": 100,
+	}
+
+
+def _fetch_interest(session: requests.Session, api_key: str, q: str, start_iso: str, max_retries: int) -> List[Dict]:
+	params = _params(q, start_iso)
+	headers = {"X-Api-Key": api_key}
+	limiter = _get_limiter()
+	for attempt in range(max_retries + 1):
+		limiter.acquire()
+		try:
+			resp = session.get(_newsapi_url(), params=params, headers=headers, timeout=20)
+		except requests.RequestException:
+			external_call("newsapi", ok=False)
+			raise
+		external_call("newsapi", ok=resp.ok)
+		if resp.status_code == 429 and attempt < max_retries:
+			limiter.pause(_retry_after_seconds(resp))
+			continue
+		resp.raise_for_status()
+		return resp.json().get("articles", [])
+	return []
+
+
+@timed("fetch")
+def fetch_interest_articles(
+	interests: List[str],
+	hours: int = 36,
+	concurrency: Optional[int] = None,
+) -> Dict[str, Optional[List[Dict]]]:
+	"""
+	Raw NewsAPI articles per distinct query (keyed by the stripped query as
+	given; None when that query failed). Queries run in parallel, up to
+	`concurrency` (default NEWS_FETCH_CONCURRENCY), under a shared rate limit.
 	"""
 	api_key = get_env_str("NEWSAPI_KEY")
 	if not api_key:
 		raise RuntimeError("NEWSAPI_KEY not set")
 
+	settings = get_fetch_settings()
+	workers = max(1, concurrency if concurrency is not None else settings["concurrency"])
+
 	now = datetime.utcnow()
-	start_time = now - timedelta(hours=hours)
+	start_time = _window_start(now, hours)
 	start_iso = _iso_utc(start_time)
+	cache = _news_cache()
 
-	articles_by_url: Dict[str, Dict] = {}
+	queries = list(dict.fromkeys(q for q in (i.strip() for i in interests) if q))
 	session = requests.Session()
+	adapter = HTTPAdapter(pool_maxsize=workers)
+	session.mount("https://", adapter)
+	session.mount("http://", adapter)
 
-	# Strategy: query per interest to maximize recall, then deduplicate by URL
-	for interest in interests:
-		q = interest.strip()
-		if not q:
+	def run(q: str) -> Optional[List[Dict]]:
+		try:
+			if cache is None:
+				return _fetch_interest(session, api_key, q, start_iso, settings["max_retries"])
+			return cache.get_or_fetch(
+				make_key(q, start_iso, NEWS_LANGUAGE),
+				lambda: _fetch_interest(session, api_key, q, start_iso, settings["max_retries"]),
+			)
+		except Exception:
+			# continue on errors per-interest
+			return None
+
+	if workers == 1 or len(queries) <= 1:
+		results = [run(q) for q in queries]
+	else:
+		with ThreadPoolExecutor(max_workers=min(workers, len(queries))) as pool:
+			results = list(pool.map(run, queries))
+	return dict(zip(queries, results))
+
+
+async def _afetch_interest(client: httpx.AsyncClient, api_key: str, q: str, start_iso: str, max_retries: int) -> List[Dict]:
+	params = _params(q, start_iso)
+	headers = {"X-Api-Key": api_key}
+	limiter = _get_limiter()
+	for attempt in range(max_retries + 1):
+		await limiter.aacquire()
+		try:
+			resp = await client.get(_newsapi_url(), params=params, headers=headers, timeout=20)
+		except httpx.HTTPError:
+			external_call("newsapi", ok=False)
+			raise
+		external_call("newsapi", ok=resp.is_success)
+		if resp.status_code == 429 and attempt < max_retries:
+			limiter.pause(_retry_after_seconds(resp))
+			continue
+		resp.raise_for_status()
+		return resp.json().get("articles", [])
+	return []
+
+
+@timed("fetch")
+async def afetch_interest_articles(
+	interests: List[str],
+	hours: int = 36,
+	concurrency: Optional[int] = None,
+) -> Dict[str, Optional[List[Dict]]]:
+	"""
+	Async `fetch_interest_articles` over the shared NewsAPI client: queries
+	run concurrently (up to `concurrency`) under the same process-wide rate
+	limit and response cache.
+	"""
+	api_key = get_env_str("NEWSAPI_KEY")
+	if not api_key:
+		raise RuntimeError("NEWSAPI_KEY not set")
+
+	settings = get_fetch_settings()
+	workers = max(1, concurrency if concurrency is not None else settings["concurrency"])
+	start_iso = _iso_utc(_window_start(datetime.utcnow(), hours))
+	cache = await asyncio.to_thread(_news_cache)
+	client = get_async_client("newsapi")
+	gate = asyncio.Semaphore(workers)
+
+	queries = list(dict.fromkeys(q for q in (i.strip() for i in interests) if q))
+
+	async def run(q: str) -> Optional[List[Dict]]:
+		async with gate:
+			try:
+				if cache is None:
+					return await _afetch_interest(client, api_key, q, start_iso, settings["max_retries"])
+				return await cache.aget_or_fetch(
+					make_key(q, start_iso, NEWS_LANGUAGE),
+					lambda: _afetch_interest(client, api_key, q, start_iso, settings["max_retries"]),
+				)
+			except Exception:
+				# continue on errors per-interest
+				return None
+
+	results = await asyncio.gather(*(run(q) for q in queries))
+	return dict(zip(queries, results))
+
+
+def merge_articles(results: List[Optional[List[Dict]]], max_articles: int = 30) -> List[Dict]:
+	"""
+	Normalize per-interest results (in interest order), drop repeated URLs,
+	collapse near-duplicate stories (unless NEWS_NEAR_DUP is off) and return
+	the `max_articles` most recent.
+	"""
+	articles_by_url: Dict[str, Dict] = {}
+	for raw_articles in results:
+		if raw_articles is None:
 			continue
-		params = {
-			"q": q,
-			"from": start_iso,
-			"sortBy": "publishedAt",
-			"language": "en",
-			"pageSize": 100,
-		}
-		headers = {"X-Api-Key": api_key}
 		try:
-			resp = session.get(NEWSAPI_BASE, params=params, headers=headers, timeout=20)
-			if resp.status_code == 429:
-				# simple backoff
-				time.sleep(2.0)
-				resp = session.get(NEWSAPI_BASE, params=params, headers=headers, timeout=20)
-			resp.raise_for_status()
-			data = resp.json()
-			for art in data.get("articles", []):
+			for art in raw_articles:
 				url = art.get("url")
 				if not url or url in articles_by_url:
 					continue
@@ -65,7 +293,6 @@ def fetch_news(interests: List[str], hours: int = 36, max_articles: int = 30) ->
 					"source": (art.get("source") or {}).get("name"),
 				}
 		except Exception:
-			# continue on errors per-interest
 			continue
 
 	# Sort by publishedAt desc, then trim to max_articles
@@ -74,5 +301,40 @@ def fetch_news(interests: List[str], hours: int = 36, max_articles: int = 30) ->
 
 	all_articles = list(articles_by_url.values())
 	all_articles.sort(key=sort_key, reverse=True)
+	settings = get_fetch_settings()
+	if settings["near_dup"]:
+		# most recent copy of each story is kept; others become its alternates
+		all_articles = cluster_near_duplicates(all_articles, max_distance=settings["near_dup_distance"])
 	return all_articles[:max_articles]
 
+
+def fetch_news(
+	interests: List[str],
+	hours: int = 36,
+	max_articles: int = 30,
+	concurrency: Optional[int] = None,
+) -> List[Dict]:
+	"""
+	Fetch recent news articles (last N hours) matching user interests using NewsAPI.
+	Interests are queried in parallel (up to `concurrency`, default NEWS_FETCH_CONCURRENCY)
+	under a shared rate limit; results are merged in interest order.
+	Returns a list of unique articles, most recent first.
+	"""
+	# Strategy: query per interest to maximize recall, then deduplicate by URL
+	by_query = fetch_interest_articles(interests, hours=hours, concurrency=concurrency)
+	queries = [q for q in (i.strip() for i in interests) if q]
+	return merge_articles([by_query.get(q) for q in queries], max_articles=max_articles)
+
+
+async def afetch_news(
+	interests: List[str],
+	hours: int = 36,
+	max_articles: int = 30,
+	concurrency: Optional[int] = None,
+) -> List[Dict]:
+	"""
+	Async `fetch_news`.
+	"""
+	by_query = await afetch_interest_articles(interests, hours=hours, concurrency=concurrency)
+	queries = [q for q in (i.strip() for i in interests) if q]
+	return merge_articles([by_query.get(q) for q in queries], max_articles=max_articles)
@@ -0,0 +1,479 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .archive import archive_audio, archive_brief
+from .brief_cache import BriefCache, brief_key, get_brief_cache, rag_digest
+from .config import (
+	ensure_dirs,
+	get_brief_cache_settings,
+	get_generation_settings,
+	get_ranking_settings,
+	get_retrieval_settings,
+	model_name,
+)
+from .metrics import span
+from .news_fetcher import afetch_news, fetch_news
+from .ranking import aselect_articles, select_articles
+from .summarizer import agenerate_brief, extract_section_titles, generate_brief
+from .tts_engine import asynthesize_to_mp3, playlist_path_for, synthesize_to_mp3
+from .utils import brief_stem, timestamp_string, write_text
+
+
+STAGES = ("fetch", "rank", "retrieve", "generate", "persist", "synthesize")
+
+ProgressFn = Callable[[str], None]
+
+
+class BriefError(RuntimeError):
+	"""
+	A pipeline failure the caller should report, with an HTTP-style status.
+	"""
+
+	def __init__(self, status_code: int, detail: str) -> None:
+		super().__init__(detail)
+		self.status_code = status_code
+		self.detail = detail
+
+
+def _noop(stage: str) -> None:
+	return None
+
+
+def candidate_count() -> int:
+	"""
+	How many articles to fetch before selection: the ranking pool when
+	relevance ranking is on, else just MAX_ARTICLES.
+	"""
+	settings = get_generation_settings()
+	ranking = get_ranking_settings()
+	if ranking["enabled"]:
+		return max(settings["max_articles"], ranking["candidates"])
+	return settings["max_articles"]
+
+
+def _brief_cache() -> Optional[BriefCache]:
+	settings = get_brief_cache_settings()
+	if not settings["enabled"]:
+		return None
+	dirs = ensure_dirs()
+	return get_brief_cache(
+		Path(dirs["data_dir"]) / "brief_cache.sqlite3",
+		Path(dirs["summaries_dir"]) / "brief_cache",
+		ttl_seconds=settings["ttl_seconds"],
+		max_bytes=settings["max_bytes"],
+	)
+
+
+def prepare_brief(
+	interests: List[str],
+	store: Any,
+	progress: Optional[ProgressFn] = None,
+	articles: Optional[List[Dict]] = None,
+) -> Tuple[List[Dict], List[str]]:
+	"""
+	Fetch articles (unless already supplied) and retrieve RAG context.
+	Returns (articles, rag_context), the latter being the retrieved document
+	texts, most relevant first. `store` is a RAGStore or SharedRAGStore.
+	"""
+	articles, rag_docs = _prepare(interests, store, progress, articles)
+	return articles, [d.page_content for d in rag_docs]
+
+
+def _prepare(
+	interests: List[str],
+	store: Any,
+	progress: Optional[ProgressFn] = None,
+	articles: Optional[List[Dict]] = None,
+	extra_summaries: int = 0,
+) -> Tuple[List[Dict], List[Any]]:
+	progress = progress or _noop
+
+	progress("fetch")
+	for hours in _fetch_windows():
+		if articles:
+			break
+		articles = fetch_news(interests=interests, hours=hours, max_articles=candidate_count())
+	if not articles:
+		raise BriefError(404, "No recent articles found.")
+
+	rank_args = _rank_args(articles)
+	if rank_args is not None:
+		progress("rank")
+		try:
+			with span("rank"):
+				liked = store.feedback_texts()
+				articles = select_articles(articles, interests, store.embedding, liked=liked, **rank_args)
+		except Exception:
+			# embedding trouble: fall back to the most recent articles
+			pass
+	articles = articles[: get_generation_settings()["max_articles"]]
+
+	progress("retrieve")
+	query, k_by_type, retrieve_args = _retrieve_args(interests, extra_summaries)
+	with span("retrieve"):
+		rag_docs = store.retrieve_filtered(query, k_by_type, **retrieve_args)
+	return articles, rag_docs
+
+
+async def aprepare_brief(
+	interests: List[str],
+	store: Any,
+	progress: Optional[ProgressFn] = None,
+	articles: Optional[List[Dict]] = None,
+) -> Tuple[List[Dict], List[str]]:
+	"""
+	Async `prepare_brief`; `store` must be a SharedRAGStore.
+	"""
+	articles, rag_docs = await _aprepare(interests, store, progress, articles)
+	return articles, [d.page_content for d in rag_docs]
+
+
+async def _aprepare(
+	interests: List[str],
+	store: Any,
+	progress: Optional[ProgressFn] = None,
+	articles: Optional[List[Dict]] = None,
+	extra_summaries: int = 0,
+) -> Tuple[List[Dict], List[Any]]:
+	progress = progress or _noop
+
+	progress("fetch")
+	for hours in _fetch_windows():
+		if articles:
+			break
+		articles = await afetch_news(interests=interests, hours=hours, max_articles=candidate_count())
+	if not articles:
+		raise BriefError(404, "No recent articles found.")
+
+	rank_args = _rank_args(articles)
+	if rank_args is not None:
+		progress("rank")
+		try:
+			with span("rank"):
+				liked = await asyncio.to_thread(store.feedback_texts)
+				articles = await aselect_articles(articles, interests, store.embedding, liked=liked, **rank_args)
+		except Exception:
+			# embedding trouble: fall back to the most recent articles
+			pass
+	articles = articles[: get_generation_settings()["max_articles"]]
+
+	progress("retrieve")
+	query, k_by_type, retrieve_args = _retrieve_args(interests, extra_summaries)
+	with span("retrieve"):
+		rag_docs = await store.aretrieve_filtered(query, k_by_type, **retrieve_args)
+	return articles, rag_docs
+
+
+def _fetch_windows() -> Tuple[int, ...]:
+	"""
+	Lookback hours to try in turn until NewsAPI returns articles.
+	"""
+	return (get_generation_settings()["lookback_hours"], 48)
+
+
+def _rank_args(articles: List[Dict]) -> Optional[Dict[str, Any]]:
+	"""
+	Keyword arguments for (a)select_articles, or None when there is nothing
+	to rank: ranking is off or the pool already fits MAX_ARTICLES.
+	"""
+	max_articles = get_generation_settings()["max_articles"]
+	ranking = get_ranking_settings()
+	if not ranking["enabled"] or len(articles) <= max_articles:
+		return None
+	return {
+		"k": max_articles,
+		"per_interest_quota": ranking["per_interest_quota"],
+		"mmr_lambda": ranking["mmr_lambda"],
+		"like_weight": ranking["like_weight"],
+	}
+
+
+def _retrieve_args(interests: List[str], extra_summaries: int) -> Tuple[str, Dict[str, int], Dict[str, Any]]:
+	"""
+	(query, k_by_type, keyword arguments) for (a)retrieve_filtered.
+	"""
+	retrieval = get_retrieval_settings()
+	return (
+		", ".join(interests),
+		_k_by_type(retrieval, extra_summaries),
+		{"half_life_hours": retrieval["half_life_hours"], "max_age_hours": retrieval["max_age_hours"]},
+	)
+
+
+def _k_by_type(retrieval: Dict[str, Any], extra_summaries: int) -> Dict[str, int]:
+	k_by_type = dict(retrieval["k_by_type"])
+	if extra_summaries and k_by_type.get("summary"):
+		k_by_type["summary"] += extra_summaries
+	return k_by_type
+
+
+def run_brief_pipeline(
+	interests: List[str],
+	store: Any,
+	no_audio: bool = False,
+	progress: Optional[ProgressFn] = None,
+	articles: Optional[List[Dict]] = None,
+	profile_id: Optional[int] = None,
+) -> Dict[str, Any]:
+	"""
+	Fetch, retrieve, generate, persist and (optionally) voice one brief.
+	`progress` is called with each stage name as it starts; it may raise to
+	abort the run between stages. Pre-fetched `articles` skip the NewsAPI
+	call; `profile_id` tags the output files and metadata.
+
+	With the brief cache on, a request whose model, interests, selected
+	articles and RAG context match a stored brief returns that brief
+	(`"cache": "hit"`) without calling Gemini, persisting or re-voicing it.
+	"""
+	progress = progress or _noop
+
+	cache = _brief_cache()
+	# With the cache on, one extra summary is retrieved so that a cached
+	# brief's own stored summary can be set aside and the rest still match
+	articles, rag_docs = _prepare(interests, store, progress, articles=articles, extra_summaries=1 if cache else 0)
+	context_docs = _top_by_type(rag_docs, get_retrieval_settings()["k_by_type"])
+
+	if cache is None:
+		result = _generate(interests, store, articles, context_docs, no_audio, progress, profile_id)
+		return _fresh_result(result, "off")
+
+	key = _cache_key(interests, articles)
+	with cache.claim(key):
+		entry = cache.get_entry(key)
+		if _reusable(entry, rag_docs):
+			audio_file = entry["audio_file"]
+			if not no_audio and audio_file is None:
+				progress("synthesize")
+				mp3_path = _mp3_path(entry["summary_id"], profile_id)
+				synthesize_to_mp3(entry["text"], mp3_path)
+				audio_file = cache.put(*_cache_row(key, entry["rag_digest"], entry, mp3_path))
+			cache.record(key, hit=True)
+			return _cached_result(cache, entry, audio_file, articles, no_audio)
+
+		cache.record(key, hit=False)
+		result = _generate(interests, store, articles, context_docs, no_audio, progress, profile_id)
+		cache.put(*_cache_row(key, rag_digest(context_docs), result, result["_mp3_path"]))
+	return _fresh_result(result, "miss")
+
+
+async def arun_brief_pipeline(
+	interests: List[str],
+	store: Any,
+	no_audio: bool = False,
+	progress: Optional[ProgressFn] = None,
+	articles: Optional[List[Dict]] = None,
+	profile_id: Optional[int] = None,
+) -> Dict[str, Any]:
+	"""
+	Async `run_brief_pipeline`: NewsAPI, embedding and Gemini calls go over
+	the shared async clients, and blocking work (TTS, index writes, file
+	and cache I/O) runs in worker threads. `store` must be a SharedRAGStore.
+	"""
+	progress = progress or _noop
+
+	cache = await asyncio.to_thread(_brief_cache)
+	articles, rag_docs = await _aprepare(
+		interests, store, progress, articles=articles, extra_summaries=1 if cache else 0
+	)
+	context_docs = _top_by_type(rag_docs, get_retrieval_settings()["k_by_type"])
+
+	if cache is None:
+		result = await _agenerate(interests, store, articles, context_docs, no_audio, progress, profile_id)
+		return _fresh_result(result, "off")
+
+	key = _cache_key(interests, articles)
+	async with cache.aclaim(key):
+		entry = await asyncio.to_thread(cache.get_entry, key)
+		if _reusable(entry, rag_docs):
+			audio_file = entry["audio_file"]
+			if not no_audio and audio_file is None:
+				progress("synthesize")
+				mp3_path = _mp3_path(entry["summary_id"], profile_id)
+				await asynthesize_to_mp3(entry["text"], mp3_path)
+				audio_file = await asyncio.to_thread(cache.put, *_cache_row(key, entry["rag_digest"], entry, mp3_path))
+			await asyncio.to_thread(cache.record, key, True)
+			return _cached_result(cache, entry, audio_file, articles, no_audio)
+
+		await asyncio.to_thread(cache.record, key, False)
+		result = await _agenerate(interests, store, articles, context_docs, no_audio, progress, profile_id)
+		await asyncio.to_thread(cache.put, *_cache_row(key, rag_digest(context_docs), result, result["_mp3_path"]))
+	return _fresh_result(result, "miss")
+
+
+def _cache_key(interests: List[str], articles: List[Dict]) -> str:
+	return brief_key(model_name(), interests, articles, get_generation_settings()["brief_target_words"])
+
+
+def _reusable(entry: Optional[Dict[str, Any]], rag_docs: List[Any]) -> bool:
+	"""
+	Whether a cached entry was generated from the same RAG context, not
+	counting its own stored summary.
+	"""
+	if entry is None:
+		return False
+	k_by_type = get_retrieval_settings()["k_by_type"]
+	return entry["rag_digest"] == rag_digest(_top_by_type(rag_docs, k_by_type, exclude_summary_id=entry["summary_id"]))
+
+
+def _cache_row(key: str, digest: str, brief: Dict[str, Any], mp3_path: Optional[Path]) -> Tuple[Any, ...]:
+	"""
+	BriefCache.put arguments for a cache entry or generated result.
+	"""
+	return key, digest, brief["summary_id"], brief["text"], brief["sections"], mp3_path
+
+
+def _fresh_result(result: Dict[str, Any], cache_status: str) -> Dict[str, Any]:
+	result.pop("_mp3_path", None)
+	result["cache"] = cache_status
+	return result
+
+
+def _cached_result(
+	cache: BriefCache,
+	entry: Dict[str, Any],
+	audio_file: Optional[str],
+	articles: List[Dict],
+	no_audio: bool,
+) -> Dict[str, Any]:
+	return {
+		"summary_id": entry["summary_id"],
+		"text": entry["text"],
+		"sections": entry["sections"],
+		"audio_url": f"/audio/{cache.audio_dir.name}/{audio_file}" if (not no_audio and audio_file) else None,
+		# cached briefs keep only the joined MP3
+		"playlist_url": None,
+		"articles_used": articles,
+		"cache": "hit",
+	}
+
+
+def _top_by_type(
+	docs: List[Any],
+	k_by_type: Dict[str, int],
+	exclude_summary_id: Optional[str] = None,
+) -> List[Any]:
+	"""
+	The first k documents of each type (in score order), optionally skipping
+	the summary document with `exclude_summary_id`.
+	"""
+	taken: Dict[str, int] = {}
+	kept: List[Any] = []
+	for doc in docs:
+		meta = doc.metadata or {}
+		doc_type = meta.get("type")
+		if exclude_summary_id and doc_type == "summary" and meta.get("summary_id") == exclude_summary_id:
+			continue
+		if taken.get(doc_type, 0) >= k_by_type.get(doc_type, 0):
+			continue
+		taken[doc_type] = taken.get(doc_type, 0) + 1
+		kept.append(doc)
+	return kept
+
+
+def _mp3_path(summary_id: str, profile_id: Optional[int], ts: Optional[str] = None) -> Path:
+	stem = brief_stem(ts or timestamp_string(), summary_id, profile_id)
+	return Path(ensure_dirs()["summaries_dir"]) / f"{stem}.mp3"
+
+
+def _generate(
+	interests: List[str],
+	store: Any,
+	articles: List[Dict],
+	rag_docs: List[Any],
+	no_audio: bool,
+	progress: ProgressFn,
+	profile_id: Optional[int],
+) -> Dict[str, Any]:
+	progress("generate")
+	summary_text, summary_id = generate_brief(**_generation_args(interests, articles, rag_docs))
+	if not summary_text:
+		raise BriefError(500, "Summary generation failed.")
+
+	progress("persist")
+	ts = timestamp_string()
+	with span("persist"):
+		_persist(summary_id, summary_text, ts, profile_id)
+		store.add_texts([summary_text], metadatas=[_summary_metadata(summary_id, ts, profile_id)])
+
+	mp3_path = _mp3_path(summary_id, profile_id, ts)
+	if not no_audio:
+		progress("synthesize")
+		synthesize_to_mp3(summary_text, mp3_path)
+		archive_audio(summary_id, mp3_path.name)
+
+	return _generated_result(summary_id, summary_text, articles, None if no_audio else mp3_path)
+
+
+async def _agenerate(
+	interests: List[str],
+	store: Any,
+	articles: List[Dict],
+	rag_docs: List[Any],
+	no_audio: bool,
+	progress: ProgressFn,
+	profile_id: Optional[int],
+) -> Dict[str, Any]:
+	progress("generate")
+	summary_text, summary_id = await agenerate_brief(**_generation_args(interests, articles, rag_docs))
+	if not summary_text:
+		raise BriefError(500, "Summary generation failed.")
+
+	progress("persist")
+	ts = timestamp_string()
+	with span("persist"):
+		await asyncio.to_thread(_persist, summary_id, summary_text, ts, profile_id)
+		await store.aadd_texts([summary_text], metadatas=[_summary_metadata(summary_id, ts, profile_id)])
+
+	mp3_path = _mp3_path(summary_id, profile_id, ts)
+	if not no_audio:
+		progress("synthesize")
+		await asynthesize_to_mp3(summary_text, mp3_path)
+		await asyncio.to_thread(archive_audio, summary_id, mp3_path.name)
+
+	return _generated_result(summary_id, summary_text, articles, None if no_audio else mp3_path)
+
+
+def _generation_args(interests: List[str], articles: List[Dict], rag_docs: List[Any]) -> Dict[str, Any]:
+	return {
+		"articles": articles,
+		"interests": interests,
+		"rag_context": [d.page_content for d in rag_docs],
+		"target_words": get_generation_settings()["brief_target_words"],
+	}
+
+
+def _persist(summary_id: str, summary_text: str, ts: str, profile_id: Optional[int]) -> None:
+	"""
+	Write the brief's text file and archive it (the vector store is separate).
+	"""
+	stem = brief_stem(ts, summary_id, profile_id)
+	write_text(Path(ensure_dirs()["summaries_dir"]) / f"{stem}.txt", summary_text)
+	archive_brief(summary_id, summary_text, ts, profile_id, extract_section_titles(summary_text))
+
+
+def _summary_metadata(summary_id: str, ts: str, profile_id: Optional[int]) -> Dict[str, Any]:
+	metadata: Dict[str, Any] = {"type": "summary", "summary_id": summary_id, "timestamp": ts}
+	if profile_id is not None:
+		metadata["profile_id"] = profile_id
+	return metadata
+
+
+def _generated_result(
+	summary_id: str,
+	summary_text: str,
+	articles: List[Dict],
+	mp3_path: Optional[Path],
+) -> Dict[str, Any]:
+	playlist = playlist_path_for(mp3_path) if mp3_path is not None else None
+	return {
+		"summary_id": summary_id,
+		"text": summary_text,
+		"sections": extract_section_titles(summary_text),
+		"audio_url": f"/audio/{mp3_path.name}" if mp3_path is not None else None,
+		"playlist_url": f"/audio/{playlist.name}" if playlist is not None and playlist.exists() else None,
+		"articles_used": articles,
+		"_mp3_path": mp3_path,
+	}
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple, Union
+
+from .dedupe import source_names
+
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\S+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+	"""
+	Cheap local token estimate: ~4 characters per token for prose, but at
+	least one per whitespace-separated word (numbers, names, punctuation).
+	"""
+	if not text:
+		return 0
+	return max((len(text) + 3) // 4, len(_WORD_RE.findall(text)))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+	if max_tokens <= 0:
+		return ""
+	if estimate_tokens(text) <= max_tokens:
+		return text
+	cut = text[: max_tokens * 4]
+	space = cut.rfind(" ")
+	if space > len(cut) // 2:
+		cut = cut[:space]
+	while cut and estimate_tokens(cut + "…") > max_tokens:
+		cut = cut[: int(len(cut) * 0.9)]
+	return cut.rstrip() + "…" if cut else ""
+
+
+def compact_brief(text: str) -> str:
+	"""
+	Reduce a stored brief to its section titles and each section's opening
+	sentence, which is what the model needs to avoid repeating itself.
+	"""
+	if "SECTION:" not in text.upper():
+		return text.strip()
+	lines: List[str] = []
+	opener_pending = False
+	for raw in text.splitlines():
+		line = raw.strip()
+		if not line:
+			continue
+		if line.upper().startswith("SECTION:"):
+			lines.append(line)
+			opener_pending = True
+		elif opener_pending:
+			lines.append(_SENTENCE_RE.split(line, 1)[0])
+			opener_pending = False
+	return "\n".join(lines)
+
+
+def format_article(article: Dict, desc_chars: int) -> str:
+	title = (article.get("title") or "").strip()
+	desc = (article.get("description") or "").strip()
+	if len(desc) > desc_chars:
+		desc = desc[:desc_chars].rsplit(" ", 1)[0] + "…"
+	src = article.get("source") or ""
+	also = source_names(article, limit=3)
+	via = f"{src}; also {', '.join(also)}" if also else src
+	return f"- {title} — {desc} (via {via})"
+
+
+@dataclass
+class BuiltPrompt:
+	text: str
+	breakdown: Dict[str, int] = field(default_factory=dict)
+
+
+def _take_within(items: Sequence[str], budget: int) -> Tuple[List[str], int]:
+	taken: List[str] = []
+	used = 0
+	for item in items:
+		cost = estimate_tokens(item) + 1
+		if used + cost > budget:
+			break
+		taken.append(item)
+		used += cost
+	return taken, used
+
+
+def assemble_prompt(
+	instructions: str,
+	interests: List[str],
+	articles: List[Dict],
+	rag_context: Union[str, Sequence[str]],
+	target_words: int,
+	budget: int,
+	article_share: float = 0.7,
+	desc_chars: int = 300,
+	rag_doc_tokens: int = 400,
+) -> BuiltPrompt:
+	"""
+	Build the generation prompt within `budget` estimated tokens.
+
+	Instructions, interests and the closing request are always included.
+	The remainder goes to articles (in the given, priority, order; URLs
+	dropped, descriptions capped at `desc_chars`) and RAG context (compacted,
+	each document capped at `rag_doc_tokens`). Articles may use up to
+	`article_share` of it up front, RAG context the rest, and either section
+	inherits what the other leaves unused.
+	"""
+	interests_str = ", ".join(interests)
+	closing = f"Please write ~{target_words} words total. Remember to produce 'SECTION: ' headers."
+	fixed = "\n\n".join(
+		[
+			instructions,
+			f"LISTENER INTERESTS:\n{interests_str}",
+			"RAG CONTEXT (prior summaries and feedback, most relevant first):",
+			"ARTICLES (last 24–48h):",
+			closing,
+		]
+	)
+	fixed_tokens = estimate_tokens(fixed)
+	remaining = max(0, budget - fixed_tokens)
+
+	article_lines = [format_article(a, desc_chars) for a in articles]
+	docs = [rag_context] if isinstance(rag_context, str) else list(rag_context)
+	rag_lines = [truncate_to_tokens(compact_brief(d), rag_doc_tokens) for d in docs if d and d.strip()]
+
+	article_cap = int(remaining * article_share)
+	taken_articles, article_tokens = _take_within(article_lines, article_cap)
+	taken_rag, rag_tokens = _take_within(rag_lines, remaining - article_tokens)
+	if len(taken_articles) < len(article_lines):
+		# RAG left room: give it back to articles
+		taken_articles, article_tokens = _take_within(article_lines, remaining - rag_tokens)
+
+	articles_str = "\n".join(taken_articles)
+	rag_str = "\n".join(taken_rag)
+	text = f"""{instructions}
+
+LISTENER INTERESTS:
+{interests_str}
+
+RAG CONTEXT (prior summaries and feedback, most relevant first):
+{rag_str}
+
+ARTICLES (last 24–48h):
+{articles_str}
+
+{closing}
+"""
+	breakdown = {
+		"budget": budget,
+		"instructions": fixed_tokens,
+		"articles": article_tokens,
+		"articles_used": len(taken_articles),
+		"articles_dropped": len(article_lines) - len(taken_articles),
+		"rag": rag_tokens,
+		"rag_docs_used": len(taken_rag),
+		"rag_docs_dropped": len(rag_lines) - len(taken_rag),
+		"total": estimate_tokens(text),
+	}
+	logger.info(
+		"prompt tokens: total=%d/%d instructions=%d articles=%d (%d used, %d dropped) rag=%d (%d docs, %d dropped)",
+		breakdown["total"],
+		budget,
+		fixed_tokens,
+		article_tokens,
+		breakdown["articles_used"],
+		breakdown["articles_dropped"],
+		rag_tokens,
+		breakdown["rag_docs_used"],
+		breakdown["rag_docs_dropped"],
+	)
+	return BuiltPrompt(text=text, breakdown=breakdown)
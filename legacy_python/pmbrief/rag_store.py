@@ -1,74 +1,999 @@
 from __future__ import annotations
 
-import os
-from dataclasses import dataclass
+import asyncio
+import math
+import pickle
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Set, Tuple, Type
 
-import google.generativeai as genai
-from langchain_community.vectorstores import FAISS
+import numpy as np
 from langchain_core.documents import Document
 
-from .config import embedding_model_name, get_env_str
+from .config import (
+	embedding_model_name,
+	ensure_dirs,
+	get_embedding_cache_settings,
+	get_embedding_settings,
+	get_env_str,
+	get_rag_retention_settings,
+	get_rag_snapshot_settings,
+	rag_flush_interval,
+)
+from .embedding_cache import CachedEmbeddingFunction, get_embedding_cache
+from .http_clients import gemini_call, gemini_model_path
+from .metrics import external_call, timed
+from .snapshots import SnapshotDir
+from .utils import ReadWriteLock
+
+if TYPE_CHECKING:
+	from langchain_community.vectorstores import FAISS
+	from langchain_core.embeddings import Embeddings
+
+# faiss, langchain_community and the Gemini SDK take most of a cold start to
+# import, so they are imported where first used instead of at module load
 
 
 @dataclass
 class GeminiEmbeddingFunction:
 	model: str
+	batch_size: int = 0
+	concurrency: int = 0
+	requests_made: int = field(default=0, init=False)
+	vectors_produced: int = field(default=0, init=False)
 
 	def __post_init__(self) -> None:
 		api_key = get_env_str("GEMINI_API_KEY")
 		if not api_key:
 			raise RuntimeError("GEMINI_API_KEY not set")
+		import google.generativeai as genai
+
 		genai.configure(api_key=api_key)
+		settings = get_embedding_settings()
+		self.batch_size = min(100, self.batch_size or settings["batch_size"])
+		self.concurrency = self.concurrency or settings["concurrency"]
+		self._stats_lock = threading.Lock()
+
+	def _record(self, requests: int, vectors: int) -> None:
+		with self._stats_lock:
+			self.requests_made += requests
+			self.vectors_produced += vectors
 
+	def _embed_batch(self, batch: Sequence[str]) -> List[List[float]]:
+		import google.generativeai as genai
+
+		try:
+			resp = genai.embed_content(model=self.model, content=list(batch))
+		except Exception:
+			external_call("gemini_embed", ok=False)
+			raise
+		external_call("gemini_embed")
+		vectors = resp["embedding"]
+		if len(vectors) != len(batch):
+			raise RuntimeError(f"Embedding batch returned {len(vectors)} vectors for {len(batch)} texts")
+		self._record(1, len(vectors))
+		return vectors
+
+	@timed("embed")
 	def embed_documents(self, texts: Sequence[str]) -> List[List[float]]:
+		"""
+		Embed texts in batches of `batch_size`, running up to `concurrency`
+		batch requests at once. Vectors are returned in input order.
+		"""
+		texts = list(texts)
+		if not texts:
+			return []
+		batches = [texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+		if len(batches) == 1 or self.concurrency == 1:
+			results = [self._embed_batch(b) for b in batches]
+		else:
+			with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as pool:
+				results = list(pool.map(self._embed_batch, batches))
 		vectors: List[List[float]] = []
-		for text in texts:
-			resp = genai.embed_content(model=self.model, content=text)
-			vectors.append(resp["embedding"])
+		for batch_vectors in results:
+			vectors.extend(batch_vectors)
 		return vectors
 
+	@timed("embed")
 	def embed_query(self, text: str) -> List[float]:
-		resp = genai.embed_content(model=self.model, content=text)
+		import google.generativeai as genai
+
+		try:
+			resp = genai.embed_content(model=self.model, content=text)
+		except Exception:
+			external_call("gemini_embed", ok=False)
+			raise
+		external_call("gemini_embed")
+		self._record(1, 1)
 		return resp["embedding"]
 
+	async def _aembed_batch(self, batch: Sequence[str]) -> List[List[float]]:
+		model = gemini_model_path(self.model)
+		resp = await gemini_call(
+			self.model,
+			"batchEmbedContents",
+			{"requests": [{"model": model, "content": {"parts": [{"text": t}]}} for t in batch]},
+			"gemini_embed",
+		)
+		vectors = [e["values"] for e in resp.get("embeddings", [])]
+		if len(vectors) != len(batch):
+			raise RuntimeError(f"Embedding batch returned {len(vectors)} vectors for {len(batch)} texts")
+		self._record(1, len(vectors))
+		return vectors
+
+	@timed("embed")
+	async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+		"""
+		`embed_documents` over the shared async client (Gemini REST
+		batchEmbedContents), with up to `concurrency` batches in flight.
+		"""
+		texts = list(texts)
+		if not texts:
+			return []
+		batches = [texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+		gate = asyncio.Semaphore(self.concurrency)
+
+		async def run(batch: Sequence[str]) -> List[List[float]]:
+			async with gate:
+				return await self._aembed_batch(batch)
+
+		vectors: List[List[float]] = []
+		for batch_vectors in await asyncio.gather(*(run(b) for b in batches)):
+			vectors.extend(batch_vectors)
+		return vectors
+
+	@timed("embed")
+	async def aembed_query(self, text: str) -> List[float]:
+		resp = await gemini_call(
+			self.model,
+			"embedContent",
+			{"model": gemini_model_path(self.model), "content": {"parts": [{"text": text}]}},
+			"gemini_embed",
+		)
+		self._record(1, 1)
+		return resp["embedding"]["values"]
+
+	def stats(self) -> Dict[str, int]:
+		with self._stats_lock:
+			return {"requests": self.requests_made, "vectors": self.vectors_produced}
+
+
+def build_embedding_function() -> Embeddings:
+	"""
+	Gemini embeddings, fronted by the on-disk cache unless EMBEDDING_CACHE_ENABLED is off.
+	"""
+	model = embedding_model_name()
+	inner = GeminiEmbeddingFunction(model=model)
+	settings = get_embedding_cache_settings()
+	if not settings["enabled"]:
+		return inner
+	path = Path(ensure_dirs()["data_dir"]) / "embedding_cache.sqlite3"
+	cache = get_embedding_cache(path, max_entries=settings["max_entries"])
+	return CachedEmbeddingFunction(inner, cache, model=model)
+
+
+def parse_timestamp(value: Any) -> Optional[float]:
+	"""
+	Epoch seconds for a `timestamp_string()` value (UTC), else None.
+	"""
+	if not value:
+		return None
+	try:
+		return datetime.strptime(str(value), "%Y%m%d_%H%M%S").replace(tzinfo=timezone.utc).timestamp()
+	except ValueError:
+		return None
+
+
+def _dir_bytes(path: Optional[Path]) -> int:
+	if path is None:
+		return 0
+	return sum(f.stat().st_size for f in (path / "index.faiss", path / "index.pkl") if f.exists())
+
+
+def stored_summary_ids(path: Path) -> Dict[str, str]:
+	"""
+	summary_id by summary text for every summary in the store at `path`,
+	hot and cold tiers, read from the saved docstores alone (no index, no
+	embedding function).
+	"""
+	found: Dict[str, str] = {}
+	for root in (Path(path), Path(path) / "cold"):
+		if not root.exists():
+			continue
+		snapshot = SnapshotDir(root).current_path()
+		pkl = snapshot / "index.pkl" if snapshot is not None else root / "index.pkl"
+		if not pkl.exists():
+			continue
+		with pkl.open("rb") as f:
+			docstore, _ = pickle.load(f)
+		for doc in getattr(docstore, "_dict", {}).values():
+			if isinstance(doc, Document) and doc.metadata.get("type") == "summary" and doc.metadata.get("summary_id"):
+				found.setdefault(doc.page_content.strip(), doc.metadata["summary_id"])
+	return found
+
+
+def _mmap_flags() -> int:
+	import faiss
+
+	# Map the flat vectors instead of reading them (faiss >= 1.8); older builds
+	# fall back to IO_FLAG_MMAP, which maps what that version supports
+	return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def _vectorstore() -> Type[FAISS]:
+	"""
+	LangChain's FAISS store class. The embedding functions here implement
+	the Embeddings interface without inheriting it (langchain_core.embeddings
+	is slow to import), so they are registered with it before FAISS, which
+	checks isinstance, sees them.
+	"""
+	from langchain_community.vectorstores import FAISS
+	from langchain_core.embeddings import Embeddings
+
+	Embeddings.register(GeminiEmbeddingFunction)
+	Embeddings.register(CachedEmbeddingFunction)
+	return FAISS
+
+
+PendingAdd = Tuple[str, str, List[float], Dict[str, Any]]
+
 
 class RAGStore:
-	def __init__(self, path: Path) -> None:
+	"""
+	FAISS store persisted as versioned snapshots (see SnapshotDir), so
+	several processes can share one directory. Loading maps the index
+	read-only; it is copied into memory on the first add. Additions not yet
+	saved are kept aside, and `save()` replays them onto whatever snapshot is
+	newest at the time, so concurrent writers never drop each other's vectors.
+	"""
+
+	def __init__(self, path: Path, embedding: Optional[Embeddings] = None) -> None:
 		self.path = Path(path)
 		self.path.mkdir(parents=True, exist_ok=True)
-		self.embedding = GeminiEmbeddingFunction(model=embedding_model_name())
+		self.embedding = embedding or build_embedding_function()
+		self.snapshots = SnapshotDir(self.path, keep=get_rag_snapshot_settings()["keep"])
 		self.vs: Optional[FAISS] = None
+		# snapshot `vs` was loaded from or last saved as; None if none yet
+		self.version: Optional[str] = None
+		self._mapped = False
+		self._pending: List[PendingAdd] = []
+		# per metadata type: index positions and their epoch timestamps (NaN if
+		# undated), kept in step with vs so filtered searches need no scan
+		self._by_type: Dict[str, Tuple[List[int], List[float]]] = {}
+		self._ts_by_pos: Dict[int, float] = {}
+
+	def _index_metadata(self, positions: Sequence[int]) -> None:
+		for pos in positions:
+			doc = self.vs.docstore.search(self.vs.index_to_docstore_id.get(pos, ""))
+			if not isinstance(doc, Document):
+				continue
+			ts = parse_timestamp(doc.metadata.get("timestamp"))
+			ts = float("nan") if ts is None else ts
+			pos_list, ts_list = self._by_type.setdefault(str(doc.metadata.get("type")), ([], []))
+			pos_list.append(pos)
+			ts_list.append(ts)
+			self._ts_by_pos[pos] = ts
 
+	@timed("rag_load")
 	def load(self) -> None:
-		if (self.path / "index.faiss").exists():
-			self.vs = FAISS.load_local(
-				str(self.path),
-				self.embedding,
-				allow_dangerous_deserialization=True,
+		"""
+		Load the current snapshot, discarding unsaved additions.
+		"""
+		self.snapshots.migrate()
+		self._pending = []
+		self._open_current()
+
+	def _open_current(self) -> None:
+		self._by_type = {}
+		self._ts_by_pos = {}
+		self._mapped = False
+		name = self.snapshots.current()
+		self.version = name
+		if name is None:
+			# Nothing stored yet: the index is created on the first add
+			self.vs = None
+			return
+		import faiss
+
+		snapshot = self.snapshots.snapshots / name
+		index = faiss.read_index(str(snapshot / "index.faiss"), _mmap_flags())
+		with (snapshot / "index.pkl").open("rb") as f:
+			docstore, index_to_docstore_id = pickle.load(f)
+		self.vs = _vectorstore()(self.embedding, index, docstore, index_to_docstore_id)
+		self._mapped = True
+		self._index_metadata(list(self.vs.index_to_docstore_id.keys()))
+
+	@property
+	def stale(self) -> bool:
+		"""
+		True once another writer has published a newer snapshot.
+		"""
+		return self.snapshots.current() != self.version
+
+	def rebase(self) -> None:
+		"""
+		Switch to the newest snapshot and replay unsaved additions onto it.
+		"""
+		pending = self._pending
+		self._open_current()
+		self._pending = []
+		if pending:
+			known = self.known_ids([p[0] for p in pending])
+			pending = [p for p in pending if p[0] not in known]
+		if pending:
+			self.add_embeddings(
+				[p[1] for p in pending],
+				[p[2] for p in pending],
+				[p[3] for p in pending],
+				ids=[p[0] for p in pending],
 			)
-		else:
-			self.vs = FAISS.from_texts([""], self.embedding, metadatas=[{"seed": True}])
-			# drop the seed doc
-			self.vs.docstore._dict.pop(list(self.vs.docstore._dict.keys())[0], None)
+
+	def _writable(self) -> None:
+		# a mapped index is read-only (adding to it aborts); copy it into memory
+		if self._mapped and self.vs is not None:
+			import faiss
+
+			self.vs.index = faiss.deserialize_index(faiss.serialize_index(self.vs.index))
+			self._mapped = False
+
+	def _build(
+		self,
+		dim: int,
+		docs: Sequence[Tuple[str, Document]],
+		vectors: Optional[np.ndarray] = None,
+		like: Optional[FAISS] = None,
+	) -> FAISS:
+		"""
+		A FAISS store holding exactly `docs` (docstore id, document) with their
+		already-stored `vectors`, using the distance settings of `like`.
+		"""
+		import faiss
+		from langchain_community.docstore.in_memory import InMemoryDocstore
+		from langchain_community.vectorstores.utils import DistanceStrategy
+
+		strategy = like.distance_strategy if like is not None else DistanceStrategy.EUCLIDEAN_DISTANCE
+		normalize = getattr(like, "_normalize_L2", False) if like is not None else False
+		index = faiss.IndexFlatIP(dim) if strategy == DistanceStrategy.MAX_INNER_PRODUCT else faiss.IndexFlatL2(dim)
+		if docs:
+			index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+		return _vectorstore()(
+			self.embedding,
+			index,
+			InMemoryDocstore({doc_id: doc for doc_id, doc in docs}),
+			{i: doc_id for i, (doc_id, _) in enumerate(docs)},
+			normalize_L2=normalize,
+			distance_strategy=strategy,
+		)
 
 	def save(self) -> None:
+		"""
+		Publish the store as a new snapshot, first rebasing onto any snapshot
+		another writer published since this one was loaded.
+		"""
+		with self.snapshots.lock():
+			if self.stale:
+				self.rebase()
+			self.publish()
+
+	def publish(self) -> None:
+		"""
+		Write `vs` as the next snapshot. The caller holds `snapshots.lock()`
+		and has rebased if the store was stale.
+		"""
 		if not self.vs:
 			return
-		self.vs.save_local(str(self.path))
+		vs = self.vs
+		self.version = self.snapshots.publish(lambda d: vs.save_local(str(d)))
+		self._pending = []
 
-	def add_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> None:
+	def add_texts(
+		self,
+		texts: List[str],
+		metadatas: Optional[List[Dict[str, Any]]] = None,
+		ids: Optional[List[str]] = None,
+	) -> None:
+		if not texts:
+			return
+		self.add_embeddings(texts, self.embedding.embed_documents(texts), metadatas, ids=ids)
+
+	def known_ids(self, ids: Sequence[str]) -> Set[str]:
+		"""
+		The subset of `ids` already in the docstore.
+		"""
+		if self.vs is None:
+			return set()
+		return {doc_id for doc_id in ids if isinstance(self.vs.docstore.search(doc_id), Document)}
+
+	def add_embeddings(
+		self,
+		texts: List[str],
+		vectors: List[List[float]],
+		metadatas: Optional[List[Dict[str, Any]]] = None,
+		ids: Optional[List[str]] = None,
+	) -> None:
 		if not texts:
 			return
 		if self.vs is None:
 			self.load()
+		if self.vs is None:
+			self.vs = self._build(len(vectors[0]), [])
 		if metadatas is None:
 			metadatas = [{} for _ in texts]
-		self.vs.add_texts(texts=texts, metadatas=metadatas)
+		if ids is None:
+			ids = [uuid.uuid4().hex for _ in texts]
+		self._writable()
+		start = self.vs.index.ntotal
+		self.vs.add_embeddings(text_embeddings=list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+		self._pending.extend(zip(ids, texts, vectors, metadatas))
+		self._index_metadata(range(start, self.vs.index.ntotal))
 
 	def retrieve(self, query: str, k: int = 6) -> List[Document]:
 		if self.vs is None:
 			self.load()
+		if self.vs is None or self.vs.index.ntotal == 0:
+			return []
 		return self.vs.similarity_search(query, k=k)
 
+	def _positions(self, doc_type: str, max_age_hours: Optional[float], now: float) -> np.ndarray:
+		pos_list, ts_list = self._by_type.get(doc_type, ([], []))
+		positions = np.asarray(pos_list, dtype=np.int64)
+		if max_age_hours:
+			# NaN (undated) compares False, so undated documents drop out too
+			positions = positions[np.asarray(ts_list, dtype=np.float64) >= now - max_age_hours * 3600]
+		return np.ascontiguousarray(positions)
+
+	def retrieve_filtered(
+		self,
+		query: str,
+		k_by_type: Dict[str, int],
+		half_life_hours: Optional[float] = None,
+		max_age_hours: Optional[float] = None,
+		query_vector: Optional[List[float]] = None,
+		pool_factor: int = 3,
+	) -> List[Document]:
+		"""
+		Top documents per `type` metadata value (e.g. {"summary": 3, "feedback": 3}).
+		Each type is searched with a FAISS ID selector, so filtering happens
+		inside the index. With `half_life_hours`, similarity is multiplied by
+		0.5 ** (age / half_life) (documents without a timestamp are not decayed)
+		and the best of `pool_factor * k` in-type candidates are kept.
+		`max_age_hours` excludes older (and undated) documents in the index too.
+		Results are ordered by score, which is also stored as metadata["score"].
+		"""
+		if self.vs is None:
+			self.load()
+		if self.vs is None or self.vs.index.ntotal == 0:
+			return []
+		import faiss
+		from langchain_community.vectorstores.utils import DistanceStrategy
+
+		vec = np.array([query_vector or self.embedding.embed_query(query)], dtype=np.float32)
+		if getattr(self.vs, "_normalize_L2", False):
+			faiss.normalize_L2(vec)
+		inner_product = self.vs.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT
+		now = time.time()
+
+		scored: List[Tuple[float, Document]] = []
+		for doc_type, k in k_by_type.items():
+			if k <= 0:
+				continue
+			ids = self._positions(doc_type, max_age_hours, now)
+			if ids.size == 0:
+				continue
+			fetch = min(ids.size, k * pool_factor if half_life_hours else k)
+			selector = faiss.IDSelectorBatch(ids.size, faiss.swig_ptr(ids))
+			distances, positions = self.vs.index.search(vec, fetch, params=faiss.SearchParameters(sel=selector))
+			hits: List[Tuple[float, Document]] = []
+			for dist, pos in zip(distances[0], positions[0]):
+				if pos < 0:
+					continue
+				doc = self.vs.docstore.search(self.vs.index_to_docstore_id[int(pos)])
+				if not isinstance(doc, Document):
+					continue
+				score = float(dist) if inner_product else 1.0 / (1.0 + float(dist))
+				ts = self._ts_by_pos.get(int(pos), float("nan"))
+				if half_life_hours and not math.isnan(ts):
+					score *= 0.5 ** (max(0.0, now - ts) / 3600.0 / half_life_hours)
+				hits.append((score, doc))
+			hits.sort(key=lambda h: h[0], reverse=True)
+			scored.extend(hits[:k])
+
+		scored.sort(key=lambda h: h[0], reverse=True)
+		return [
+			Document(page_content=doc.page_content, metadata={**doc.metadata, "score": round(score, 6)})
+			for score, doc in scored
+		]
+
+	def feedback_texts(self, prefix: str = "USER_FEEDBACK_LIKES:", limit: int = 20) -> List[str]:
+		"""
+		Most recently added feedback snippets starting with `prefix`, prefix stripped.
+		"""
+		if self.vs is None:
+			self.load()
+		if self.vs is None:
+			return []
+		found: List[str] = []
+		for doc_id in reversed(list(self.vs.index_to_docstore_id.values())):
+			doc = self.vs.docstore.search(doc_id)
+			if isinstance(doc, Document) and doc.page_content.startswith(prefix):
+				found.append(doc.page_content[len(prefix) :].strip())
+				if len(found) >= limit:
+					break
+		return found
+
+	def stats(self) -> Dict[str, int]:
+		"""
+		Live documents, index vectors (orphans are vectors with no document)
+		and on-disk bytes of the last save.
+		"""
+		if self.vs is None:
+			return {"documents": 0, "vectors": 0, "orphans": 0, "bytes": _dir_bytes(self.snapshots.current_path())}
+		live = sum(
+			1
+			for doc_id in self.vs.index_to_docstore_id.values()
+			if isinstance(self.vs.docstore.search(doc_id), Document)
+		)
+		vectors = int(self.vs.index.ntotal)
+		return {
+			"documents": live,
+			"vectors": vectors,
+			"orphans": vectors - live,
+			"bytes": _dir_bytes(self.snapshots.current_path()),
+		}
+
+	def _entries(self) -> List[Tuple[str, Document, np.ndarray, Optional[float]]]:
+		"""
+		(docstore id, document, stored vector, timestamp) for every live document.
+		"""
+		if self.vs is None or self.vs.index.ntotal == 0:
+			return []
+		vectors = self.vs.index.reconstruct_n(0, self.vs.index.ntotal)
+		entries = []
+		for pos, doc_id in sorted(self.vs.index_to_docstore_id.items()):
+			doc = self.vs.docstore.search(doc_id)
+			if isinstance(doc, Document):
+				entries.append((doc_id, doc, vectors[pos], parse_timestamp(doc.metadata.get("timestamp"))))
+		return entries
+
+	def _replace(self, entries: Sequence[Tuple[str, Document, np.ndarray, Optional[float]]], like: FAISS) -> None:
+		if entries:
+			vectors = np.stack([e[2] for e in entries])
+		else:
+			vectors = np.zeros((0, like.index.d), dtype=np.float32)
+		self.vs = self._build(like.index.d, [(e[0], e[1]) for e in entries], vectors, like=like)
+		self._mapped = False
+		self._by_type = {}
+		self._ts_by_pos = {}
+		self._index_metadata(range(len(entries)))
+
+	@staticmethod
+	def _rollup_plan(
+		expired: Sequence[Tuple[str, Document, np.ndarray, Optional[float]]],
+		kept: Sequence[Tuple[str, Document, np.ndarray, Optional[float]]],
+		max_items: int,
+	) -> List[Tuple[str, int, list, list]]:
+		"""
+		(text, item count, expired entries folded in, earlier roll-ups it
+		replaces) for each roll-up document `_rollup` would write.
+		"""
+		plan = []
+		for prefix in ("USER_FEEDBACK_LIKES:", "USER_FEEDBACK_DISLIKES:"):
+			fresh = [e for e in expired if e[1].page_content.startswith(prefix)]
+			if not fresh:
+				continue
+			previous = [e for e in kept if e[1].metadata.get("rollup") and e[1].page_content.startswith(prefix)]
+			items: List[str] = []
+			seen = set()
+			# newest expired feedback first, then what earlier roll-ups kept
+			ordered = sorted(fresh, key=lambda e: e[3] or 0.0, reverse=True) + previous
+			for _, doc, _, _ in ordered:
+				for item in doc.page_content[len(prefix) :].split(","):
+					item = item.strip()
+					if item and item.lower() not in seen:
+						seen.add(item.lower())
+						items.append(item)
+			plan.append((f"{prefix} {', '.join(items[:max_items])}", len(items[:max_items]), fresh, previous))
+		return plan
+
+	def _rollup(
+		self,
+		expired: Sequence[Tuple[str, Document, np.ndarray, Optional[float]]],
+		kept: List[Tuple[str, Document, np.ndarray, Optional[float]]],
+		max_items: int,
+		vectors: Optional[Dict[str, List[float]]] = None,
+	) -> int:
+		"""
+		Fold expired feedback into one undated roll-up document per prefix
+		(likes, dislikes), merged with any earlier roll-up in `kept`.
+		Roll-ups are embedded here unless `vectors` (text -> vector) is
+		given, in which case a text missing from it raises KeyError. `kept`
+		is only changed once every roll-up is built, so on an error it is
+		left as it was. Returns how many expired documents were folded in.
+		"""
+		built = []
+		for text, items, fresh, previous in self._rollup_plan(expired, kept, max_items):
+			raw = vectors[text] if vectors is not None else self.embedding.embed_documents([text])[0]
+			vector = np.asarray(raw, dtype=np.float32)
+			if getattr(self.vs, "_normalize_L2", False):
+				vector = vector / (np.linalg.norm(vector) or 1.0)
+			doc = Document(page_content=text, metadata={"type": "feedback", "rollup": True, "items": items})
+			built.append(((uuid.uuid4().hex, doc, vector, None), fresh, previous))
+		folded = 0
+		for entry, fresh, previous in built:
+			for e in previous:
+				kept.remove(e)
+			kept.append(entry)
+			folded += len(fresh)
+		return folded
+
+	def rollup_texts(
+		self,
+		retention_days: float,
+		hot_days: float,
+		rollup_max_items: int = 50,
+		now: Optional[float] = None,
+	) -> List[str]:
+		"""
+		Texts of the feedback roll-ups `compact` would write at `now`, so
+		they can be embedded ahead of it (see SharedRAGStore.compact).
+		"""
+		if self.vs is None:
+			return []
+		_, kept, _, expired, _ = self._partition(retention_days, hot_days, time.time() if now is None else now)
+		feedback = [e for e in expired if e[1].metadata.get("type") == "feedback"]
+		return [plan[0] for plan in self._rollup_plan(feedback, kept, rollup_max_items)]
+
+	def compact(
+		self,
+		retention_days: float,
+		hot_days: float,
+		rollup_feedback: bool = True,
+		rollup_max_items: int = 50,
+		now: Optional[float] = None,
+		rollup_vectors: Optional[Dict[str, List[float]]] = None,
+	) -> Dict[str, Any]:
+		"""
+		Rewrite the store as a small hot tier plus an archived cold tier.
+
+		Documents newer than `hot_days` (and undated ones) stay here; those up
+		to `retention_days` old move to the cold tier in `<path>/cold`; older
+		ones are dropped, except feedback, which is rolled up into one undated
+		document per kind when `rollup_feedback` is on. Indexes are rebuilt
+		from the stored vectors, so nothing is re-embedded (bar roll-ups) and
+		no orphaned vectors survive. Both tiers are saved. Returns before/after
+		`stats()` per tier plus what moved. With `rollup_vectors` (text ->
+		vector, for `rollup_texts`) nothing is embedded here; feedback whose
+		roll-up is missing from it is archived, as when embedding fails.
+
+		Runs on the newest snapshot under the writer lock. The cold tier is
+		only written from here, so that lock covers it too.
+		"""
+		with self.snapshots.lock():
+			if self.vs is None or self.stale:
+				self.rebase()
+			return self._compact(retention_days, hot_days, rollup_feedback, rollup_max_items, now, rollup_vectors)
+
+	def _partition(self, retention_days: float, hot_days: float, now: float) -> Tuple[
+		"RAGStore",
+		List[Tuple[str, Document, np.ndarray, Optional[float]]],
+		List[Tuple[str, Document, np.ndarray, Optional[float]]],
+		List[Tuple[str, Document, np.ndarray, Optional[float]]],
+		List[Tuple[str, Document, np.ndarray, Optional[float]]],
+	]:
+		"""
+		(cold tier, kept, to_cold, expired, cold_kept): where each document of
+		both tiers goes at `now`.
+		"""
+		cold = RAGStore(self.path / "cold", embedding=self.embedding)
+		cold.load()
+		hot_cutoff = now - hot_days * 86400
+		retention_cutoff = now - retention_days * 86400
+		kept: List[Tuple[str, Document, np.ndarray, Optional[float]]] = []
+		to_cold: List[Tuple[str, Document, np.ndarray, Optional[float]]] = []
+		expired: List[Tuple[str, Document, np.ndarray, Optional[float]]] = []
+		for entry in self._entries():
+			ts = entry[3]
+			if ts is None or ts >= hot_cutoff:
+				kept.append(entry)
+			elif ts >= retention_cutoff:
+				to_cold.append(entry)
+			else:
+				expired.append(entry)
+		cold_kept = [e for e in cold._entries() if e[3] is None or e[3] >= retention_cutoff]
+		expired.extend(e for e in cold._entries() if e[3] is not None and e[3] < retention_cutoff)
+		return cold, kept, to_cold, expired, cold_kept
+
+	def _compact(
+		self,
+		retention_days: float,
+		hot_days: float,
+		rollup_feedback: bool,
+		rollup_max_items: int,
+		now: Optional[float],
+		rollup_vectors: Optional[Dict[str, List[float]]] = None,
+	) -> Dict[str, Any]:
+		now = time.time() if now is None else now
+		cold, kept, to_cold, expired, cold_kept = self._partition(retention_days, hot_days, now)
+		before = {"hot": self.stats(), "cold": cold.stats()}
+
+		rolled_up = 0
+		if rollup_feedback and self.vs is not None:
+			feedback = [e for e in expired if e[1].metadata.get("type") == "feedback"]
+			if feedback:
+				try:
+					rolled_up = self._rollup(feedback, kept, rollup_max_items, rollup_vectors)
+				except Exception:
+					# embedding unavailable (or not done ahead): archive it for now, the next run retries
+					expired = [e for e in expired if e[1].metadata.get("type") != "feedback"]
+					cold_kept.extend(feedback)
+
+		template = self.vs or cold.vs
+		if template is not None:
+			self._replace(kept, template)
+			cold._replace(cold_kept + to_cold, template)
+			# cold first: a crash in between leaves documents in both tiers, not neither
+			cold.save()
+			self.save()
+		after = {"hot": self.stats(), "cold": cold.stats()}
+		return {
+			"before": before,
+			"after": after,
+			"moved_to_cold": len(to_cold),
+			"dropped": len(expired) - rolled_up,
+			"rolled_up": rolled_up,
+		}
+
+
+class SharedRAGStore:
+	"""
+	One RAGStore per process, loaded once and shared across requests.
+	Searches hold the read lock; adds take the write lock only for the
+	in-memory insert (embedding happens outside it). Changes are written to
+	disk by a background thread at most every `flush_interval` seconds; the
+	same thread compacts the store every RAG_COMPACT_INTERVAL_HOURS.
+	Snapshots published by other processes are picked up on the next search
+	after at most RAG_REFRESH_SECONDS.
+	"""
+
+	def __init__(self, path: Path, flush_interval: Optional[float] = None) -> None:
+		self.store = RAGStore(path)
+		self.flush_interval = flush_interval if flush_interval is not None else rag_flush_interval()
+		self.retention = get_rag_retention_settings()
+		self.refresh_interval = get_rag_snapshot_settings()["refresh_seconds"]
+		self._next_refresh = 0.0
+		self.last_compaction: Optional[Dict[str, Any]] = None
+		self._next_compact = time.monotonic() + self.retention["compact_interval_hours"] * 3600
+		self.lock = ReadWriteLock()
+		self._version = 0
+		self._flushed_version = 0
+		self._flush_lock = threading.Lock()
+		self._stop = threading.Event()
+		self._thread: Optional[threading.Thread] = None
+
+	def start(self) -> None:
+		with self.lock.write():
+			self.store.load()
+		if self._thread is None:
+			self._stop.clear()
+			self._thread = threading.Thread(target=self._flush_loop, name="rag-flush", daemon=True)
+			self._thread.start()
+
+	@property
+	def embedding(self) -> Embeddings:
+		return self.store.embedding
+
+	def refresh(self, force: bool = False) -> None:
+		"""
+		Switch to a newer snapshot if another process published one. Only the
+		CURRENT pointer is read unless it moved; then the index is mapped, not
+		read, and unsaved local additions are replayed on top.
+		"""
+		now = time.monotonic()
+		if not force and now < self._next_refresh:
+			return
+		self._next_refresh = now + self.refresh_interval
+		if not self.store.stale:
+			return
+		with self.lock.write():
+			if self.store.stale:
+				self.store.rebase()
+
+	def retrieve(self, query: str, k: int = 6) -> List[Document]:
+		self.refresh()
+		with self.lock.read():
+			return self.store.retrieve(query, k=k)
+
+	def retrieve_filtered(
+		self,
+		query: str,
+		k_by_type: Dict[str, int],
+		half_life_hours: Optional[float] = None,
+		max_age_hours: Optional[float] = None,
+	) -> List[Document]:
+		vector = self.store.embedding.embed_query(query)
+		self.refresh()
+		with self.lock.read():
+			return self.store.retrieve_filtered(
+				query,
+				k_by_type,
+				half_life_hours=half_life_hours,
+				max_age_hours=max_age_hours,
+				query_vector=vector,
+			)
+
+	async def aretrieve_filtered(
+		self,
+		query: str,
+		k_by_type: Dict[str, int],
+		half_life_hours: Optional[float] = None,
+		max_age_hours: Optional[float] = None,
+	) -> List[Document]:
+		"""
+		`retrieve_filtered` with the query embedded over the async client; the
+		search itself (which may wait on the lock) runs in a worker thread.
+		"""
+		vector = await self.store.embedding.aembed_query(query)
+
+		def search() -> List[Document]:
+			self.refresh()
+			with self.lock.read():
+				return self.store.retrieve_filtered(
+					query,
+					k_by_type,
+					half_life_hours=half_life_hours,
+					max_age_hours=max_age_hours,
+					query_vector=vector,
+				)
+
+		return await asyncio.to_thread(search)
+
+	def feedback_texts(self, prefix: str = "USER_FEEDBACK_LIKES:", limit: int = 20) -> List[str]:
+		self.refresh()
+		with self.lock.read():
+			return self.store.feedback_texts(prefix, limit)
+
+	def add_texts(
+		self,
+		texts: List[str],
+		metadatas: Optional[List[Dict[str, Any]]] = None,
+		ids: Optional[List[str]] = None,
+	) -> None:
+		"""
+		Embed and add `texts`. With `ids`, texts whose id is already stored
+		are skipped, so re-adding the same batch is harmless.
+		"""
+		texts, metadatas, ids = self._unseen(texts, metadatas, ids)
+		if not texts:
+			return
+		self._insert(texts, self.store.embedding.embed_documents(texts), metadatas, ids)
+
+	async def aadd_texts(
+		self,
+		texts: List[str],
+		metadatas: Optional[List[Dict[str, Any]]] = None,
+		ids: Optional[List[str]] = None,
+	) -> None:
+		"""
+		`add_texts` with embedding over the async client.
+		"""
+		texts, metadatas, ids = await asyncio.to_thread(self._unseen, texts, metadatas, ids)
+		if not texts:
+			return
+		vectors = await self.store.embedding.aembed_documents(texts)
+		await asyncio.to_thread(self._insert, texts, vectors, metadatas, ids)
+
+	def _unseen(
+		self,
+		texts: List[str],
+		metadatas: Optional[List[Dict[str, Any]]],
+		ids: Optional[List[str]],
+	) -> Tuple[List[str], Optional[List[Dict[str, Any]]], Optional[List[str]]]:
+		if ids is None:
+			return texts, metadatas, ids
+		with self.lock.read():
+			known = self.store.known_ids(ids)
+		keep = [i for i, doc_id in enumerate(ids) if doc_id not in known]
+		return (
+			[texts[i] for i in keep],
+			[metadatas[i] for i in keep] if metadatas is not None else None,
+			[ids[i] for i in keep],
+		)
+
+	def _insert(
+		self,
+		texts: List[str],
+		vectors: List[List[float]],
+		metadatas: Optional[List[Dict[str, Any]]],
+		ids: Optional[List[str]],
+	) -> None:
+		with self.lock.write():
+			self.store.add_embeddings(texts, vectors, metadatas, ids=ids)
+			self._version += 1
+
+	def stats(self) -> Dict[str, int]:
+		with self.lock.read():
+			return self.store.stats()
+
+	@property
+	def dirty(self) -> bool:
+		return self._version != self._flushed_version
+
+	def flush(self) -> None:
+		with self._flush_lock:
+			if not self.dirty:
+				return
+			with self.store.snapshots.lock():
+				if self.store.stale:
+					with self.lock.write():
+						self.store.rebase()
+				# Saving only reads the index, so searches can continue meanwhile
+				with self.lock.read():
+					version = self._version
+					self.store.publish()
+			self._flushed_version = version
+
+	def compact(self) -> Dict[str, Any]:
+		"""
+		Compact and save; see RAGStore.compact. Locks are taken in `flush`'s
+		order (the cross-process writer lock, then this process's write lock)
+		so searches keep running while another process holds the former.
+		Feedback roll-ups are embedded first, outside the write lock; only
+		the rebuild from stored vectors, which is quick, runs under it.
+		"""
+		retention_days = self.retention["retention_days"]
+		hot_days = self.retention["hot_days"]
+		rollup_feedback = self.retention["rollup_feedback"]
+		now = time.time()
+		with self._flush_lock:
+			with self.store.snapshots.lock():
+				if self.store.vs is None or self.store.stale:
+					with self.lock.write():
+						self.store.rebase()
+				vectors: Dict[str, List[float]] = {}
+				if rollup_feedback:
+					with self.lock.read():
+						texts = self.store.rollup_texts(retention_days, hot_days, now=now)
+					if texts:
+						try:
+							vectors = dict(zip(texts, self.store.embedding.embed_documents(texts)))
+						except Exception:
+							# no vectors: compact archives the feedback and the next run retries
+							pass
+				with self.lock.write():
+					report = self.store.compact(
+						retention_days,
+						hot_days,
+						rollup_feedback=rollup_feedback,
+						now=now,
+						rollup_vectors=vectors,
+					)
+					self._flushed_version = self._version
+		self.last_compaction = report
+		return report
+
+	def _flush_loop(self) -> None:
+		while not self._stop.wait(self.flush_interval):
+			try:
+				self.flush()
+			except Exception:
+				# keep the dirty flag; the next tick retries
+				continue
+			interval = self.retention["compact_interval_hours"] * 3600
+			if interval and time.monotonic() >= self._next_compact:
+				self._next_compact = time.monotonic() + interval
+				try:
+					self.compact()
+				except Exception:
+					continue
+
+	def close(self) -> None:
+		self._stop.set()
+		if self._thread is not None:
+			self._thread.join(timeout=5)
+			self._thread = None
+		self.flush()
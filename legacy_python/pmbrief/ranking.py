@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+	norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+	norms[norms == 0] = 1.0
+	return matrix / norms
+
+
+def _embed(embedding, texts: Sequence[str]) -> np.ndarray:
+	if not texts:
+		return np.zeros((0, 0), dtype=np.float32)
+	return _normalize(np.asarray(embedding.embed_documents(list(texts)), dtype=np.float32))
+
+
+async def _aembed(embedding, texts: Sequence[str]) -> np.ndarray:
+	if not texts:
+		return np.zeros((0, 0), dtype=np.float32)
+	return _normalize(np.asarray(await embedding.aembed_documents(list(texts)), dtype=np.float32))
+
+
+def _article_texts(articles: List[Dict]) -> List[str]:
+	return [f"{a.get('title') or ''}. {a.get('description') or ''}" for a in articles]
+
+
+def select_articles(
+	articles: List[Dict],
+	interests: List[str],
+	embedding,
+	k: int,
+	liked: Optional[List[str]] = None,
+	per_interest_quota: int = 1,
+	mmr_lambda: float = 0.7,
+	like_weight: float = 0.3,
+) -> List[Dict]:
+	"""
+	Pick `k` articles by relevance instead of recency.
+
+	Relevance is the best cosine similarity of an article's title+description
+	to any interest, plus `like_weight` times its best similarity to liked
+	feedback. Each interest first gets its `per_interest_quota` best matches,
+	so niche interests are not crowded out; the rest are filled by MMR to
+	avoid several takes on one story. Returned in selection order, each with
+	a `relevance` score.
+	"""
+	interests = [i for i in (s.strip() for s in interests) if i]
+	if len(articles) <= k or not interests:
+		return articles[:k]
+
+	doc = _embed(embedding, _article_texts(articles))
+	by_interest = doc @ _embed(embedding, interests).T
+	relevance = by_interest.max(axis=1)
+	if liked:
+		relevance = relevance + like_weight * (doc @ _embed(embedding, liked).T).max(axis=1)
+	return _choose(articles, doc, by_interest, relevance, k, per_interest_quota, mmr_lambda)
+
+
+async def aselect_articles(
+	articles: List[Dict],
+	interests: List[str],
+	embedding,
+	k: int,
+	liked: Optional[List[str]] = None,
+	per_interest_quota: int = 1,
+	mmr_lambda: float = 0.7,
+	like_weight: float = 0.3,
+) -> List[Dict]:
+	"""
+	`select_articles` with the embeddings requested over the async client.
+	"""
+	interests = [i for i in (s.strip() for s in interests) if i]
+	if len(articles) <= k or not interests:
+		return articles[:k]
+
+	doc = await _aembed(embedding, _article_texts(articles))
+	by_interest = doc @ (await _aembed(embedding, interests)).T
+	relevance = by_interest.max(axis=1)
+	if liked:
+		relevance = relevance + like_weight * (doc @ (await _aembed(embedding, liked)).T).max(axis=1)
+	return _choose(articles, doc, by_interest, relevance, k, per_interest_quota, mmr_lambda)
+
+
+def _choose(
+	articles: List[Dict],
+	doc: np.ndarray,
+	by_interest: np.ndarray,
+	relevance: np.ndarray,
+	k: int,
+	per_interest_quota: int,
+	mmr_lambda: float,
+) -> List[Dict]:
+	chosen: List[int] = []
+	taken = np.zeros(len(articles), dtype=bool)
+	# Similarity of every candidate to its nearest already-chosen article
+	nearest = np.full(len(articles), -1.0, dtype=np.float32)
+
+	def take(i: int) -> None:
+		chosen.append(i)
+		taken[i] = True
+		np.maximum(nearest, doc @ doc[i], out=nearest)
+
+	for _ in range(max(0, per_interest_quota)):
+		for j in range(by_interest.shape[1]):
+			if len(chosen) >= k:
+				break
+			column = np.where(taken, -np.inf, by_interest[:, j])
+			best = int(np.argmax(column))
+			if np.isfinite(column[best]):
+				take(best)
+
+	while len(chosen) < k:
+		penalty = np.where(nearest < 0, 0.0, nearest)
+		score = np.where(taken, -np.inf, mmr_lambda * relevance - (1.0 - mmr_lambda) * penalty)
+		best = int(np.argmax(score))
+		if not np.isfinite(score[best]):
+			break
+		take(best)
+
+	selected: List[Dict] = []
+	for i in chosen:
+		art = dict(articles[i])
+		art["relevance"] = round(float(relevance[i]), 4)
+		selected.append(art)
+	return selected
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from .config import get_generation_settings, get_scheduler_settings
+from .db import load_profiles
+from .news_fetcher import fetch_interest_articles, merge_articles
+from .pipeline import candidate_count, run_brief_pipeline
+
+
+def _parse_hhmm(value: str) -> Tuple[int, int]:
+	hour, minute = value.strip().split(":", 1)
+	return int(hour), int(minute)
+
+
+def next_deadline(profile: Dict[str, Any], after: datetime, default_time: str, default_tz: str) -> datetime:
+	"""
+	First delivery time for `profile` strictly after `after` (both UTC-aware).
+	"""
+	try:
+		hour, minute = _parse_hhmm(profile.get("delivery_time") or default_time)
+	except ValueError:
+		hour, minute = _parse_hhmm(default_time)
+	try:
+		tz = ZoneInfo(profile.get("timezone") or default_tz)
+	except Exception:
+		tz = timezone.utc
+	local = after.astimezone(tz)
+	candidate = local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+	if candidate <= local:
+		candidate = (local + timedelta(days=1)).replace(hour=hour, minute=minute, second=0, microsecond=0)
+	return candidate.astimezone(timezone.utc)
+
+
+class BriefScheduler:
+	"""
+	Generates each profile's brief ahead of its daily delivery time.
+	Profiles whose generation windows open close together are batched: their
+	interests are merged so each distinct query hits NewsAPI once, then the
+	briefs are produced on a worker pool and counted as on time or late.
+	"""
+
+	def __init__(
+		self,
+		store: Any,
+		lead_minutes: Optional[float] = None,
+		batch_minutes: Optional[float] = None,
+		workers: Optional[int] = None,
+		no_audio: bool = False,
+		load: Callable[[], List[Dict[str, Any]]] = load_profiles,
+	) -> None:
+		settings = get_scheduler_settings()
+		self.store = store
+		self.lead = timedelta(minutes=lead_minutes if lead_minutes is not None else settings["lead_minutes"])
+		self.batch = timedelta(minutes=batch_minutes if batch_minutes is not None else settings["batch_minutes"])
+		self.workers = workers or settings["workers"]
+		self.default_time = settings["default_delivery_time"]
+		self.default_tz = settings["timezone"]
+		self.poll_seconds = settings["poll_seconds"]
+		self.no_audio = no_audio
+		self.load = load
+		self.totals = {"on_time": 0, "late": 0, "failed": 0}
+		self._delivered: Dict[Any, datetime] = {}
+		self._started = datetime.now(timezone.utc)
+		self._stop = threading.Event()
+
+	def _deadline(self, profile: Dict[str, Any]) -> datetime:
+		after = self._delivered.get(profile.get("id"), self._started)
+		return next_deadline(profile, after, self.default_time, self.default_tz)
+
+	def due(self, profiles: List[Dict[str, Any]], now: datetime) -> List[Tuple[Dict[str, Any], datetime]]:
+		"""
+		Profiles whose generation window (deadline - lead) opens before now + batch.
+		"""
+		horizon = now + self.batch
+		return [
+			(p, d)
+			for p in profiles
+			if p.get("interests")
+			for d in [self._deadline(p)]
+			if d - self.lead <= horizon
+		]
+
+	def run_batch(self, batch: List[Tuple[Dict[str, Any], datetime]]) -> Dict[str, Any]:
+		settings = get_generation_settings()
+		queries: Dict[str, str] = {}
+		for profile, _ in batch:
+			for interest in profile["interests"]:
+				q = interest.strip()
+				if q:
+					queries.setdefault(q.lower(), q)
+		try:
+			fetched = fetch_interest_articles(list(queries.values()), hours=settings["lookback_hours"])
+		except Exception:
+			fetched = {}
+		by_query = {q.lower(): arts for q, arts in fetched.items()}
+
+		def produce(item: Tuple[Dict[str, Any], datetime]) -> Dict[str, Any]:
+			profile, deadline = item
+			articles = merge_articles(
+				[by_query.get(i.strip().lower()) for i in profile["interests"] if i.strip()],
+				max_articles=candidate_count(),
+			)
+			entry: Dict[str, Any] = {"profile_id": profile.get("id"), "deadline": deadline.isoformat()}
+			try:
+				result = run_brief_pipeline(
+					profile["interests"],
+					self.store,
+					no_audio=self.no_audio,
+					articles=articles,
+					profile_id=profile.get("id"),
+				)
+				finished = datetime.now(timezone.utc)
+				entry.update(
+					{
+						"summary_id": result["summary_id"],
+						"status": "on_time" if finished <= deadline else "late",
+						"slack_seconds": round((deadline - finished).total_seconds(), 1),
+					}
+				)
+			except Exception as exc:
+				entry.update({"status": "failed", "error": str(exc)})
+			return entry
+
+		with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(batch)))) as pool:
+			results = list(pool.map(produce, batch))
+
+		counts = {"on_time": 0, "late": 0, "failed": 0}
+		for (profile, deadline), entry in zip(batch, results):
+			counts[entry["status"]] += 1
+			# a failed slot is not retried; the profile moves on to tomorrow
+			self._delivered[profile.get("id")] = deadline
+		for k, v in counts.items():
+			self.totals[k] += v
+		return {
+			"profiles": len(batch),
+			"distinct_queries": len(queries),
+			**counts,
+			"results": results,
+			"totals": dict(self.totals),
+		}
+
+	def tick(self, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+		now = now or datetime.now(timezone.utc)
+		batch = self.due(self.load(), now)
+		if not batch:
+			return None
+		return self.run_batch(batch)
+
+	def seconds_until_next(self, now: Optional[datetime] = None) -> float:
+		now = now or datetime.now(timezone.utc)
+		starts = [self._deadline(p) - self.lead for p in self.load() if p.get("interests")]
+		if not starts:
+			return self.poll_seconds
+		wait = (min(starts) - now).total_seconds()
+		return max(1.0, min(wait, self.poll_seconds))
+
+	def run_forever(self, on_report: Optional[Callable[[Dict[str, Any]], None]] = None) -> None:
+		while not self._stop.is_set():
+			report = self.tick()
+			if report is not None and on_report is not None:
+				on_report(report)
+			# Sleep until the next window opens; profiles are re-read each tick
+			self._stop.wait(self.seconds_until_next())
+
+	def stop(self) -> None:
+		self._stop.set()
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+try:
+	import fcntl
+except ImportError:  # Windows
+	fcntl = None
+	import msvcrt
+
+
+CURRENT = "CURRENT"
+SNAPSHOTS = "snapshots"
+LEGACY_FILES = ("index.faiss", "index.pkl")
+
+
+def _fsync_dir(path: Path) -> None:
+	if fcntl is None:
+		# directories cannot be opened for fsync on Windows
+		return
+	fd = os.open(str(path), os.O_RDONLY)
+	try:
+		os.fsync(fd)
+	finally:
+		os.close(fd)
+
+
+def _fsync_tree(path: Path) -> None:
+	for f in path.iterdir():
+		if f.is_file():
+			with f.open("rb") as fh:
+				os.fsync(fh.fileno())
+	_fsync_dir(path)
+
+
+class SnapshotDir:
+	"""
+	Versioned, immutable copies of a store under `root`:
+
+		root/.lock               writers hold an exclusive lock on this
+		root/snapshots/v000042/  one complete save, never modified once published
+		root/CURRENT             name of the live snapshot, swapped atomically
+
+	A writer saves into a temporary directory, renames it into place and then
+	replaces CURRENT, so readers in any process see either the old snapshot
+	or the new one, never a partial save. Old snapshots are kept for a while
+	(`keep`) so readers still on them are not pulled out from under.
+	A store saved by older versions (files directly in root) is moved into
+	the first snapshot.
+	"""
+
+	def __init__(self, root: Path, keep: int = 2) -> None:
+		self.root = Path(root)
+		self.root.mkdir(parents=True, exist_ok=True)
+		self.snapshots = self.root / SNAPSHOTS
+		self.keep = max(1, keep)
+		# the file lock is per process; this makes it reentrant and per thread
+		self._thread_lock = threading.RLock()
+		self._depth = 0
+		self._fh = None
+
+	@contextmanager
+	def lock(self) -> Iterator[None]:
+		"""
+		Exclusive writer lock across threads and processes. Reentrant.
+		"""
+		with self._thread_lock:
+			if self._depth == 0:
+				fh = (self.root / ".lock").open("a+b")
+				try:
+					if fcntl is not None:
+						fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+					else:
+						fh.seek(0)
+						# LK_LOCK retries for ~10s before raising; keep waiting
+						while True:
+							try:
+								msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+								break
+							except OSError:
+								continue
+				except BaseException:
+					fh.close()
+					raise
+				self._fh = fh
+			self._depth += 1
+			try:
+				yield
+			finally:
+				self._depth -= 1
+				if self._depth == 0:
+					fh, self._fh = self._fh, None
+					try:
+						if fcntl is not None:
+							fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+						else:
+							fh.seek(0)
+							msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+					finally:
+						fh.close()
+
+	def current(self) -> Optional[str]:
+		"""
+		Name of the live snapshot, or None if nothing was published yet.
+		"""
+		try:
+			name = (self.root / CURRENT).read_text(encoding="utf-8").strip()
+		except OSError:
+			return None
+		return name or None
+
+	def current_path(self) -> Optional[Path]:
+		name = self.current()
+		return self.snapshots / name if name else None
+
+	def _versions(self) -> List[str]:
+		if not self.snapshots.exists():
+			return []
+		return sorted(p.name for p in self.snapshots.iterdir() if p.is_dir() and p.name.startswith("v"))
+
+	def _set_current(self, name: str) -> None:
+		tmp = self.root / f"{CURRENT}.tmp"
+		with tmp.open("w", encoding="utf-8") as f:
+			f.write(name)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(tmp, self.root / CURRENT)
+		_fsync_dir(self.root)
+
+	def _has_legacy(self) -> bool:
+		return (self.root / LEGACY_FILES[0]).exists()
+
+	def migrate(self) -> None:
+		"""
+		Move a pre-snapshot store (root/index.faiss, root/index.pkl) into the
+		first snapshot. A no-op once CURRENT exists.
+		"""
+		if self.current() is not None or not self._has_legacy():
+			return
+		with self.lock():
+			if self.current() is not None or not self._has_legacy():
+				return
+			self.publish(self._copy_legacy)
+
+	def _copy_legacy(self, dest: Path) -> None:
+		for name in LEGACY_FILES:
+			if (self.root / name).exists():
+				shutil.copy2(self.root / name, dest / name)
+
+	def publish(self, write: Callable[[Path], None]) -> str:
+		"""
+		Call `write(directory)` to fill a new snapshot and make it current.
+		The caller must hold `lock()`. Returns the new snapshot's name.
+		"""
+		self.snapshots.mkdir(parents=True, exist_ok=True)
+		# under the lock no other writer is mid-publish, so leftovers are dead
+		for stale in self.snapshots.glob(".tmp-*"):
+			shutil.rmtree(stale, ignore_errors=True)
+		versions = self._versions()
+		name = f"v{int(versions[-1][1:]) + 1 if versions else 1:06d}"
+		tmp = self.snapshots / f".tmp-{uuid.uuid4().hex}"
+		tmp.mkdir()
+		try:
+			write(tmp)
+			_fsync_tree(tmp)
+			os.rename(tmp, self.snapshots / name)
+		except BaseException:
+			shutil.rmtree(tmp, ignore_errors=True)
+			raise
+		_fsync_dir(self.snapshots)
+		self._set_current(name)
+		for legacy in LEGACY_FILES:
+			try:
+				(self.root / legacy).unlink()
+			except FileNotFoundError:
+				pass
+		self._prune(name)
+		return name
+
+	def _prune(self, current: str) -> None:
+		older = [v for v in self._versions() if v < current]
+		for name in older[: max(0, len(older) - self.keep)]:
+			# may fail on Windows while a reader still maps it; retried next time
+			shutil.rmtree(self.snapshots / name, ignore_errors=True)
@@ -1,13 +1,19 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import textwrap
 import uuid
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Sequence, Tuple, Union
 
-import google.generativeai as genai
+from .config import app_name, get_env_str, get_prompt_settings, model_name
+from .http_clients import gemini_base, gemini_call, gemini_headers, gemini_model_path, get_async_client
+from .metrics import external_call, prompt_tokens, timed
+from .prompt_builder import assemble_prompt
 
-from .config import app_name, get_env_str, model_name
+if TYPE_CHECKING:
+	import google.generativeai as genai
 
 
 INTRO_PROMPT = """You are the host of a concise, engaging audio morning brief called "{app_name}".
@@ -29,51 +35,136 @@ Output format:
 """
 
 
-def _format_articles(articles: List[Dict]) -> str:
-	lines: List[str] = []
-	for a in articles:
-		title = a.get("title") or ""
-		desc = a.get("description") or ""
-		src = a.get("source") or ""
-		url = a.get("url") or ""
-		lines.append(f"- {title} — {desc} (via {src}) [{url}]")
-	return "\n".join(lines)
-
-
-def generate_brief(articles: List[Dict], interests: List[str], rag_context: str, target_words: int) -> Tuple[str, str]:
-	"""
-	Returns (summary_text, summary_id)
-	"""
+def _configured_model() -> "genai.GenerativeModel":
 	api_key = get_env_str("GEMINI_API_KEY")
 	if not api_key:
 		raise RuntimeError("GEMINI_API_KEY not set")
-	genai.configure(api_key=api_key)
-
-	model = genai.GenerativeModel(model_name())
-	prompt = INTRO_PROMPT.format(app_name=app_name(), target_words=target_words)
+	# The SDK is slow to import and only the sync path uses it
+	import google.generativeai as genai
 
-	interests_str = ", ".join(interests)
-	articles_str = _format_articles(articles)
-
-	full_prompt = f"""{prompt}
+	genai.configure(api_key=api_key)
+	return genai.GenerativeModel(model_name())
 
-LISTENER INTERESTS:
-{interests_str}
 
-RAG CONTEXT (prior summaries and feedback, most relevant first):
-{rag_context}
+def build_prompt(
+	articles: List[Dict],
+	interests: List[str],
+	rag_context: Union[str, Sequence[str]],
+	target_words: int,
+) -> str:
+	"""
+	The full generation prompt, fitted to PROMPT_TOKEN_BUDGET.
+	`rag_context` is one string or the retrieved documents, most relevant first.
+	Its token breakdown is logged and recorded in pmbrief_prompt_tokens.
+	"""
+	settings = get_prompt_settings()
+	built = assemble_prompt(
+		instructions=INTRO_PROMPT.format(app_name=app_name(), target_words=target_words),
+		interests=interests,
+		articles=articles,
+		rag_context=rag_context,
+		target_words=target_words,
+		budget=settings["token_budget"],
+		article_share=settings["article_share"],
+		desc_chars=settings["desc_chars"],
+		rag_doc_tokens=settings["rag_doc_tokens"],
+	)
+	prompt_tokens(built.breakdown)
+	return built.text
+
+
+@timed("generate")
+def generate_brief(
+	articles: List[Dict],
+	interests: List[str],
+	rag_context: Union[str, Sequence[str]],
+	target_words: int,
+) -> Tuple[str, str]:
+	"""
+	Returns (summary_text, summary_id)
+	"""
+	model = _configured_model()
+	full_prompt = build_prompt(articles, interests, rag_context, target_words)
+	try:
+		resp = model.generate_content(full_prompt)
+	except Exception:
+		external_call("gemini_generate", ok=False)
+		raise
+	external_call("gemini_generate")
+	text = (resp.text or "").strip()
+	summary_id = uuid.uuid4().hex
+	return text, summary_id
 
-ARTICLES (last 24–48h):
-{articles_str}
 
-Please write ~{target_words} words total. Remember to produce 'SECTION: ' headers.
-"""
-	resp = model.generate_content(full_prompt)
-	text = (resp.text or "").strip()
+def _response_text(payload: Dict[str, Any]) -> str:
+	"""
+	Text of a Gemini REST GenerateContentResponse ("" for metadata-only chunks).
+	"""
+	parts: List[str] = []
+	for candidate in payload.get("candidates") or []:
+		for part in (candidate.get("content") or {}).get("parts") or []:
+			parts.append(part.get("text") or "")
+		# the SDK's `.text` also reads only the first candidate
+		break
+	return "".join(parts)
+
+
+def _generate_body(prompt: str) -> Dict[str, Any]:
+	return {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+
+
+@timed("generate")
+async def agenerate_brief(
+	articles: List[Dict],
+	interests: List[str],
+	rag_context: Union[str, Sequence[str]],
+	target_words: int,
+) -> Tuple[str, str]:
+	"""
+	`generate_brief` over the shared async client (Gemini REST generateContent).
+	"""
+	full_prompt = build_prompt(articles, interests, rag_context, target_words)
+	payload = await gemini_call(model_name(), "generateContent", _generate_body(full_prompt), "gemini_generate")
+	text = _response_text(payload).strip()
 	summary_id = uuid.uuid4().hex
 	return text, summary_id
 
 
+async def astream_brief(
+	articles: List[Dict],
+	interests: List[str],
+	rag_context: Union[str, Sequence[str]],
+	target_words: int,
+) -> AsyncIterator[str]:
+	"""
+	Yields the brief as text deltas while Gemini produces it, over the
+	shared async client (streamGenerateContent as SSE). The call is counted
+	once the stream ends: as an error if it failed at any point.
+	"""
+	full_prompt = build_prompt(articles, interests, rag_context, target_words)
+	client = get_async_client("gemini")
+	url = f"{gemini_base()}/{gemini_model_path(model_name())}:streamGenerateContent"
+	ok = False
+	try:
+		async with client.stream(
+			"POST", url, params={"alt": "sse"}, json=_generate_body(full_prompt), headers=gemini_headers()
+		) as resp:
+			resp.raise_for_status()
+			async for line in resp.aiter_lines():
+				if not line.startswith("data:"):
+					continue
+				delta = _response_text(json.loads(line[len("data:") :]))
+				if delta:
+					yield delta
+		ok = True
+	except (GeneratorExit, asyncio.CancelledError):
+		# the consumer stopped reading (e.g. the SSE client went away); Gemini did not fail
+		ok = True
+		raise
+	finally:
+		external_call("gemini_generate", ok=ok)
+
+
 def extract_section_titles(summary_text: str) -> List[str]:
 	titles: List[str] = []
 	for line in summary_text.splitlines():
@@ -1,23 +1,101 @@
 from __future__ import annotations
 
+import asyncio
+import io
 import json
+import math
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
 
-from gtts import gTTS
+from .audio_store import AudioStore, audio_key, get_audio_store
+from .config import ensure_dirs, get_audio_store_settings, get_env_str, get_tts_settings
+from .metrics import external_call, timed
 
-from .config import get_env_str
+
+_SECTION_RE = re.compile(r"^[ \t]*SECTION:", re.IGNORECASE | re.MULTILINE)
+_SENTENCE_END_RE = re.compile(r"[.!?][\"')\]]*\s+")
+
+
+def _cut_point(text: str, min_chars: int, max_chars: int, final: bool) -> Optional[int]:
+	"""
+	Where to split `text` so the head is a run of whole sentences of about
+	min_chars..max_chars characters; None if more text is needed first.
+	"""
+	if len(text) < min_chars and not final:
+		return None
+	if len(text) <= max_chars:
+		if final:
+			return len(text)
+		ends = [m.end() for m in _SENTENCE_END_RE.finditer(text)]
+		return ends[-1] if ends and ends[-1] >= min_chars else None
+	ends = [m.end() for m in _SENTENCE_END_RE.finditer(text, 0, max_chars + 1) if m.end() <= max_chars]
+	if ends:
+		return ends[-1]
+	# one very long sentence: break on whitespace, else hard-cut
+	space = text.rfind(" ", 0, max_chars)
+	return space + 1 if space > 0 else max_chars
+
+
+def _split_block(text: str, min_chars: int, max_chars: int, final: bool) -> Tuple[List[str], str]:
+	segments: List[str] = []
+	while text:
+		cut = _cut_point(text, min_chars, max_chars, final)
+		if not cut:
+			break
+		head, text = text[:cut].strip(), text[cut:]
+		if head:
+			segments.append(head)
+	return segments, text
+
+
+class SpeechSegmenter:
+	"""
+	Incrementally splits streamed brief text into speakable segments.
+	A "SECTION:" header always starts a new segment; otherwise whole sentences
+	are grouped until at least `min_chars` (never more than `max_chars`).
+	"""
+
+	def __init__(self, min_chars: int = 200, max_chars: int = 1500) -> None:
+		self.min_chars = min_chars
+		self.max_chars = max(min_chars, max_chars)
+		self._buf = ""
+
+	def feed(self, text: str) -> List[str]:
+		self._buf += text
+		out: List[str] = []
+		while True:
+			m = _SECTION_RE.search(self._buf, 1)
+			if m is None:
+				break
+			block, self._buf = self._buf[: m.start()], self._buf[m.start() :]
+			segments, _ = _split_block(block, self.min_chars, self.max_chars, final=True)
+			out.extend(segments)
+		segments, self._buf = _split_block(self._buf, self.min_chars, self.max_chars, final=False)
+		out.extend(segments)
+		return out
+
+	def flush(self) -> List[str]:
+		segments, _ = _split_block(self._buf, self.min_chars, self.max_chars, final=True)
+		self._buf = ""
+		return segments
 
 
 def _use_gcloud() -> bool:
 	return (get_env_str("TTS_PROVIDER", "gtts") or "gtts").lower() == "gcloud"
 
 
-def synthesize_to_mp3(text: str, out_path: Path) -> Path:
-	out_path = Path(out_path)
-	out_path.parent.mkdir(parents=True, exist_ok=True)
+_gcloud_client = None
+_gcloud_lock = threading.Lock()
 
-	if _use_gcloud():
-		try:
+
+def _get_gcloud_client():
+	global _gcloud_client
+	with _gcloud_lock:
+		if _gcloud_client is None:
 			from google.cloud import texttospeech
 			creds_json = get_env_str("GOOGLE_TTS_SERVICE_ACCOUNT_JSON")
 			if creds_json:
@@ -26,31 +104,385 @@ def synthesize_to_mp3(text: str, out_path: Path) -> Path:
 
 				info = json.loads(creds_json)
 				creds = Credentials.from_service_account_info(info)
-				client = texttospeech.TextToSpeechClient(credentials=creds)
+				_gcloud_client = texttospeech.TextToSpeechClient(credentials=creds)
 			else:
 				# Otherwise rely on GOOGLE_APPLICATION_CREDENTIALS file path
-				client = texttospeech.TextToSpeechClient()
-
-			input_text = texttospeech.SynthesisInput(text=text)
-			voice_name = get_env_str("AUDIO_VOICE", "en-US-Neural2-C")
-			voice_params = texttospeech.VoiceSelectionParams(
-				language_code="-".join(voice_name.split("-")[:2]),
-				name=voice_name,
-			)
-			audio_config = texttospeech.AudioConfig(
-				audio_encoding=texttospeech.AudioEncoding.MP3
-			)
-			response = client.synthesize_speech(
-				input=input_text, voice=voice_params, audio_config=audio_config
-			)
-			out_path.write_bytes(response.audio_content)
-			return out_path
+				_gcloud_client = texttospeech.TextToSpeechClient()
+		return _gcloud_client
+
+
+def _voice_name() -> str:
+	return get_env_str("AUDIO_VOICE", "en-US-Neural2-C") or "en-US-Neural2-C"
+
+
+def _gcloud_bytes(text: str) -> bytes:
+	from google.cloud import texttospeech
+
+	client = _get_gcloud_client()
+	input_text = texttospeech.SynthesisInput(text=text)
+	voice_name = _voice_name()
+	voice_params = texttospeech.VoiceSelectionParams(
+		language_code="-".join(voice_name.split("-")[:2]),
+		name=voice_name,
+	)
+	audio_config = texttospeech.AudioConfig(
+		audio_encoding=texttospeech.AudioEncoding.MP3
+	)
+	try:
+		response = client.synthesize_speech(
+			input=input_text, voice=voice_params, audio_config=audio_config
+		)
+	except Exception:
+		external_call("tts_gcloud", ok=False)
+		raise
+	external_call("tts_gcloud")
+	return response.audio_content
+
+
+def _gtts_bytes(text: str) -> bytes:
+	from gtts import gTTS
+
+	tts = gTTS(text=text, lang="en")
+	buf = io.BytesIO()
+	try:
+		tts.write_to_fp(buf)
+	except Exception:
+		external_call("tts_gtts", ok=False)
+		raise
+	external_call("tts_gtts")
+	return buf.getvalue()
+
+
+def _synthesize_bytes(text: str) -> bytes:
+	if _use_gcloud():
+		try:
+			return _gcloud_bytes(text)
 		except Exception:
 			# Fallback to gTTS on any error
 			pass
 
 	# gTTS fallback/default
-	tts = gTTS(text=text, lang="en")
-	tts.save(str(out_path))
+	return _gtts_bytes(text)
+
+
+def _audio_store() -> Optional[AudioStore]:
+	settings = get_audio_store_settings()
+	if not settings["enabled"]:
+		return None
+	dirs = ensure_dirs()
+	return get_audio_store(
+		Path(dirs["summaries_dir"]) / "audio_store",
+		Path(dirs["data_dir"]) / "audio_store.sqlite3",
+		settings["max_bytes"],
+	)
+
+
+def _requested_voice() -> Tuple[str, str]:
+	"""
+	(provider, voice) the configuration asks for; gTTS has a single voice.
+	"""
+	return ("gcloud", _voice_name()) if _use_gcloud() else ("gtts", "en")
+
+
+def _render(text: str, dest: Path) -> bool:
+	"""
+	Voice `text` into `dest`, reusing an identical earlier synthesis from the
+	audio store when there is one. Returns False if Cloud TTS was requested
+	but gTTS had to stand in.
+	"""
+	store = _audio_store()
+	if store is None:
+		dest.write_bytes(_synthesize_bytes(text))
+		return True
+	provider, voice = _requested_voice()
+	if provider == "gcloud":
+		try:
+			store.link_or_create(audio_key(provider, voice, text), lambda: _gcloud_bytes(text), dest)
+			return True
+		except Exception:
+			pass
+	store.link_or_create(audio_key("gtts", "en", text), lambda: _gtts_bytes(text), dest)
+	return provider == "gtts"
+
+
+def split_for_tts(text: str, max_chars: int) -> List[str]:
+	"""
+	Chunks of at most `max_chars`, split on SECTION: headers first and then
+	on sentence boundaries.
+	"""
+	segmenter = SpeechSegmenter(min_chars=max_chars, max_chars=max_chars)
+	return segmenter.feed(text) + segmenter.flush()
+
+
+def _strip_id3(data: bytes, leading: bool, trailing: bool) -> bytes:
+	if leading and len(data) >= 10 and data[:3] == b"ID3":
+		size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+		footer = 10 if data[5] & 0x10 else 0
+		data = data[10 + size + footer :]
+	if trailing and len(data) >= 128 and data[-128:-125] == b"TAG":
+		data = data[:-128]
+	return data
+
+
+def _is_info_frame(frame: bytes) -> bool:
+	# Xing/Info (LAME) or VBRI (Fraunhofer) header: a silent first frame
+	# holding the frame count and seek table of the file it starts
+	return b"Xing" in frame or b"Info" in frame or b"VBRI" in frame
+
+
+def _strip_info_frame(data: bytes) -> bytes:
+	"""
+	`data` without its Xing/Info/VBRI header frame, if the first frame
+	(after any leading ID3 tag) is one.
+	"""
+	pos = len(data) - len(_strip_id3(data, leading=True, trailing=False))
+	while pos + 4 <= len(data):
+		header = _frame_header(data, pos)
+		if header is None:
+			pos += 1
+			continue
+		end = pos + header[0]
+		return data[:pos] + data[end:] if _is_info_frame(data[pos:end]) else data
+	return data
+
+
+def concat_mp3(parts: Sequence[Path], out_path: Path) -> Path:
+	"""
+	Join MP3 files frame-wise into `out_path` without re-encoding. Only the
+	first part keeps its leading ID3 tag and only the last its trailing one.
+	Every part's Xing/Info/VBRI header frame is dropped: it describes that
+	part alone, so players would show the wrong length and seek wrongly.
+	"""
+	out_path = Path(out_path)
+	tmp_path = out_path.with_name(out_path.name + ".tmp")
+	last = len(parts) - 1
+	with tmp_path.open("wb") as out:
+		for i, part in enumerate(parts):
+			data = _strip_info_frame(Path(part).read_bytes())
+			out.write(_strip_id3(data, leading=i > 0, trailing=i < last))
+	os.replace(tmp_path, out_path)
+	return out_path
+
+
+# kbps by bitrate index, per (MPEG-1?, layer)
+_BITRATES = {
+	(True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+	(True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+	(True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+	(False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+	(False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+	(False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Hz by sample rate index, per version bits (0 = MPEG-2.5, 2 = MPEG-2, 3 = MPEG-1)
+_SAMPLE_RATES = {0: (11025, 12000, 8000), 2: (22050, 24000, 16000), 3: (44100, 48000, 32000)}
+
+
+def _frame_header(data: bytes, pos: int) -> Optional[Tuple[int, int, int]]:
+	"""
+	(frame bytes, samples, sample rate) of the MPEG audio frame header at
+	`pos`, or None if there is no valid one there.
+	"""
+	if data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+		return None
+	version = (data[pos + 1] >> 3) & 0x03
+	layer = 4 - ((data[pos + 1] >> 1) & 0x03)
+	bitrate_index = data[pos + 2] >> 4
+	rate_index = (data[pos + 2] >> 2) & 0x03
+	if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+		# reserved values, or free-format (no fixed frame size)
+		return None
+	mpeg1 = version == 3
+	bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+	sample_rate = _SAMPLE_RATES[version][rate_index]
+	padding = (data[pos + 2] >> 1) & 0x01
+	if layer == 1:
+		return (12 * bitrate // sample_rate + padding) * 4, 384, sample_rate
+	samples = 1152 if mpeg1 or layer == 2 else 576
+	return samples // 8 * bitrate // sample_rate + padding, samples, sample_rate
+
+
+def mp3_duration(data: bytes) -> float:
+	"""
+	Seconds of audio in an MP3 file, by walking its frame headers (exact for
+	CBR and VBR alike). ID3 tags, a Xing/Info header frame and stray bytes
+	between frames are skipped.
+	"""
+	data = _strip_id3(data, leading=True, trailing=True)
+	seconds = 0.0
+	pos = 0
+	first = True
+	while pos + 4 <= len(data):
+		header = _frame_header(data, pos)
+		if header is None:
+			pos += 1
+			continue
+		size, samples, sample_rate = header
+		if pos + size > len(data):
+			# truncated last frame: players drop it too
+			break
+		frame = data[pos : pos + size]
+		if not (first and _is_info_frame(frame)):
+			seconds += samples / sample_rate
+		first = False
+		pos += size
+	return seconds
+
+
+def playlist_path_for(out_path: Path) -> Path:
+	out_path = Path(out_path)
+	return out_path.with_name(f"{out_path.stem}.m3u8")
+
+
+def _write_playlist(path: Path, segments: Sequence[Tuple[str, float]], complete: bool) -> None:
+	"""
+	An HLS media playlist of MP3 segments (URI relative to the playlist,
+	seconds). Until `complete` it is an EVENT playlist without an end tag,
+	so players poll it for the segments still being voiced.
+	"""
+	target = max([math.ceil(seconds) for _, seconds in segments] + [1])
+	lines = [
+		"#EXTM3U",
+		"#EXT-X-VERSION:3",
+		f"#EXT-X-TARGETDURATION:{target}",
+		"#EXT-X-MEDIA-SEQUENCE:0",
+		f"#EXT-X-PLAYLIST-TYPE:{'VOD' if complete else 'EVENT'}",
+	]
+	for uri, seconds in segments:
+		lines += [f"#EXTINF:{seconds:.3f},", uri]
+	if complete:
+		lines.append("#EXT-X-ENDLIST")
+	tmp_path = path.with_name(path.name + ".tmp")
+	tmp_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+	os.replace(tmp_path, path)
+
+
+def write_playlist(out_path: Path, parts: Sequence[Path], complete: bool = True) -> Path:
+	"""
+	Write `<stem>.m3u8` next to `out_path`, listing `parts` (MP3 files in
+	or below its directory) as segments in order.
+	"""
+	out_path = Path(out_path)
+	playlist = playlist_path_for(out_path)
+	segments = [
+		(Path(part).relative_to(out_path.parent).as_posix(), mp3_duration(Path(part).read_bytes())) for part in parts
+	]
+	_write_playlist(playlist, segments, complete)
+	return playlist
+
+
+def _write_manifest(path: Path, manifest: Dict) -> None:
+	tmp_path = path.with_name(path.name + ".tmp")
+	tmp_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+	os.replace(tmp_path, path)
+
+
+def manifest_path_for(out_path: Path) -> Path:
+	out_path = Path(out_path)
+	return out_path.with_name(f"{out_path.stem}.manifest.json")
+
+
+@timed("synthesize")
+def synthesize_to_mp3(
+	text: str,
+	out_path: Path,
+	chunk_chars: Optional[int] = None,
+	workers: Optional[int] = None,
+	playlist: Optional[bool] = None,
+) -> Path:
+	"""
+	Long texts are split into chunks (see split_for_tts), synthesized on up to
+	`workers` threads into `<stem>_parts/`, then concatenated into `out_path`.
+	`<stem>.manifest.json` lists the chunks and is rewritten as each finishes,
+	so finished parts can be played before the whole file exists.
+	With `playlist` (default TTS_HLS_ENABLED) the chunks are also listed in
+	an HLS playlist, `<stem>.m3u8`, kept up to date the same way.
+	Each chunk, and the joined result, is looked up in the audio store
+	first, so identical text is only ever voiced once.
+	"""
+	out_path = Path(out_path)
+	out_path.parent.mkdir(parents=True, exist_ok=True)
+	settings = get_tts_settings()
+	hls = settings["hls"] if playlist is None else playlist
+	chunks = split_for_tts(text, chunk_chars or settings["chunk_chars"])
+
+	if len(chunks) <= 1:
+		_render(text, out_path)
+		if hls:
+			write_playlist(out_path, [out_path])
+		return out_path
+
+	store = _audio_store()
+	full_key = audio_key(*_requested_voice(), text)
+	# with a playlist the parts are needed too; they are store hits as well
+	if store is not None and not hls and store.link(full_key, out_path):
+		return out_path
+
+	parts_dir = out_path.with_name(f"{out_path.stem}_parts")
+	parts_dir.mkdir(parents=True, exist_ok=True)
+	manifest_path = manifest_path_for(out_path)
+	manifest: Dict = {
+		"audio": out_path.name,
+		"complete": False,
+		"chunks": [
+			{
+				"index": i,
+				"file": f"{parts_dir.name}/part_{i:03d}.mp3",
+				"chars": len(chunk),
+				"bytes": None,
+				"seconds": None,
+				"ready": False,
+			}
+			for i, chunk in enumerate(chunks)
+		],
+	}
+	manifest_lock = threading.Lock()
+	_write_manifest(manifest_path, manifest)
+
+	def write_segments(complete: bool) -> None:
+		# only the ready prefix: a playlist cannot skip a segment and add it later
+		segments: List[Tuple[str, float]] = []
+		for chunk in manifest["chunks"]:
+			if not chunk["ready"]:
+				break
+			segments.append((chunk["file"], chunk["seconds"]))
+		_write_playlist(playlist_path_for(out_path), segments, complete)
+
+	def render(i: int) -> Tuple[Path, bool]:
+		part_path = parts_dir / f"part_{i:03d}.mp3"
+		as_requested = _render(chunks[i], part_path)
+		seconds = round(mp3_duration(part_path.read_bytes()), 3)
+		with manifest_lock:
+			manifest["chunks"][i].update({"bytes": part_path.stat().st_size, "seconds": seconds, "ready": True})
+			_write_manifest(manifest_path, manifest)
+			if hls:
+				write_segments(complete=False)
+		return part_path, as_requested
+
+	max_workers = min(workers or settings["workers"], len(chunks))
+	with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts-chunk") as pool:
+		rendered = list(pool.map(render, range(len(chunks))))
+
+	concat_mp3([path for path, _ in rendered], out_path)
+	if store is not None and all(ok for _, ok in rendered):
+		store.put_file(full_key, out_path)
+	with manifest_lock:
+		manifest["complete"] = True
+		manifest["bytes"] = out_path.stat().st_size
+		_write_manifest(manifest_path, manifest)
+		if hls:
+			write_segments(complete=True)
 	return out_path
 
+
+async def asynthesize_to_mp3(
+	text: str,
+	out_path: Path,
+	chunk_chars: Optional[int] = None,
+	workers: Optional[int] = None,
+	playlist: Optional[bool] = None,
+) -> Path:
+	"""
+	`synthesize_to_mp3` for async callers. The TTS SDKs (gTTS, Cloud TTS)
+	only offer blocking calls, so the work runs in a worker thread.
+	"""
+	return await asyncio.to_thread(synthesize_to_mp3, text, out_path, chunk_chars, workers, playlist)
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import re
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Iterable, List
+from typing import Iterable, Iterator, List, Optional
 
 
 def parse_interests(raw: str) -> List[str]:
@@ -23,7 +25,59 @@ def timestamp_string() -> str:
 	return datetime.utcnow().strftime("%Y%m%d_%H%M%S")
 
 
+def brief_stem(ts: str, summary_id: str, profile_id: Optional[int] = None) -> str:
+	"""
+	File stem for a brief's text, audio, parts and playlist. `ts` only has
+	one-second resolution, so the summary_id keeps briefs finished in the
+	same second (other workers, other profiles) from sharing files.
+	"""
+	stem = f"brief_{ts}_{summary_id}"
+	return stem if profile_id is None else f"{stem}_p{profile_id}"
+
+
 def write_text(path: Path, content: str) -> None:
 	path.parent.mkdir(parents=True, exist_ok=True)
 	path.write_text(content, encoding="utf-8")
 
+
+
+class ReadWriteLock:
+	"""
+	Many concurrent readers or one writer. Waiting writers block new readers
+	so a steady stream of reads cannot starve them.
+	"""
+
+	def __init__(self) -> None:
+		self._cond = threading.Condition(threading.Lock())
+		self._readers = 0
+		self._writer = False
+		self._writers_waiting = 0
+
+	@contextmanager
+	def read(self) -> Iterator[None]:
+		with self._cond:
+			while self._writer or self._writers_waiting:
+				self._cond.wait()
+			self._readers += 1
+		try:
+			yield
+		finally:
+			with self._cond:
+				self._readers -= 1
+				if self._readers == 0:
+					self._cond.notify_all()
+
+	@contextmanager
+	def write(self) -> Iterator[None]:
+		with self._cond:
+			self._writers_waiting += 1
+			while self._writer or self._readers:
+				self._cond.wait()
+			self._writers_waiting -= 1
+			self._writer = True
+		try:
+			yield
+		finally:
+			with self._cond:
+				self._writer = False
+				self._cond.notify_all()